@@ -0,0 +1,92 @@
+'''
+The people who are still to enter the simulation.
+'''
+from collections import namedtuple
+import random
+from statistics import NormalDist
+
+# A person that has not entered the simulation yet
+Arrival = namedtuple('Arrival', 'time pid origin destination')
+
+
+class Arrivals:
+
+    '''
+    A lazy, chronological stream of arrivals.
+
+    Arrival times follow a normal distribution centred on the middle of the
+    simulation, clipped to its duration.  Rather than drawing all of them and
+    sorting, the sorted sample is drawn one element at a time: the smallest of
+    `k` uniform variables on [u, 1] is `u + (1 - u) * (1 - V ** (1 / k))`, and
+    the inverse CDF of the distribution turns it into a time.  Memory and work
+    per arrival are thus constant, whatever the population.
+
+    Half of the people enter the building, the other half leave it.
+
+    Arguments:
+        population: how many people will enter the simulation
+        duration: the duration of the simulation (seconds)
+        levels: the levels of all the floors
+        entries: the levels people can enter the building from
+        exits: the levels people can leave the building from
+        rng: the random number generator to use (default: the `random`
+            module)
+    '''
+
+    def __init__(self, population, duration, levels, entries, exits,
+                 rng=None):
+        self.rng = rng or random
+        self.population = population
+        self.remaining = population
+        self.levels = levels
+        self.entries = entries or levels
+        self.exits = exits or levels
+        self.duration = duration
+        self._distribution = None
+        if duration > 0:
+            self._distribution = NormalDist(duration / 2, duration / 6)
+        self._quantile = 0.0
+        self._next = None
+
+    def __len__(self):
+        return self.remaining
+
+    def _draw(self):
+        '''Draw the next arrival, in chronological order.'''
+        rng = self.rng
+        k = self.remaining
+        self._quantile += (1 - self._quantile) * (1 - rng.random() ** (1 / k))
+        if self._distribution is None:
+            time = 0
+        else:
+            quantile = min(max(self._quantile, 1e-12), 1 - 1e-12)
+            time = self._distribution.inv_cdf(quantile)
+            time = min(max(0, time), self.duration)
+        pid = self.population - k
+        if rng.random() < 0.5:
+            origin, destination = rng.choice(self.entries), rng.choice(
+                self.levels)
+        else:
+            origin, destination = rng.choice(self.levels), rng.choice(
+                self.exits)
+        return Arrival(time, pid, origin, destination)
+
+    def peek(self):
+        '''Return the next arrival without consuming it, None if none left.'''
+        if self._next is None and self.remaining:
+            self._next = self._draw()
+        return self._next
+
+    def pop(self):
+        '''Return and consume the next arrival.'''
+        arrival = self.peek()
+        if arrival is None:
+            raise IndexError('No more arrivals')
+        self._next = None
+        self.remaining -= 1
+        return arrival
+
+    def pop_due(self, time):
+        '''Yield and consume all the arrivals up to `time` (included).'''
+        while self.remaining and self.peek().time <= time:
+            yield self.pop()
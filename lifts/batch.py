@@ -0,0 +1,165 @@
+'''
+Run many simulations in parallel, across simulation files and seeds.
+
+Each run gets its own interface directory and its own instance of the AI
+client, and runs in fast-forward mode in a worker process.  The STATS of each
+run are streamed to the results file as soon as the run is over, one JSON
+object per line, and a summary across all runs is logged at the end.
+'''
+import json
+import shlex
+import subprocess
+from glob import glob
+from multiprocessing import Pool, cpu_count
+from statistics import mean, pstdev
+from tempfile import TemporaryDirectory
+from time import time
+
+from .common import log
+
+CLIENT_EXIT_GRACE_PERIOD = 5  # in seconds
+
+
+def parse_seeds(spec):
+    '''Return the seeds in `spec`, a range (`0-9`) or a list (`1,5,7`).
+
+    A `spec` of None means "use the seed in the simulation file".
+    '''
+    if spec is None:
+        return [None]
+    if '-' in spec:
+        first, last = spec.split('-')
+        return list(range(int(first), int(last) + 1))
+    return [int(seed) for seed in spec.split(',')]
+
+
+def expand_sim_files(patterns):
+    '''Return the simulation files matching `patterns`, in order.'''
+    sim_files = []
+    for pattern in patterns:
+        matches = sorted(glob(pattern))
+        if not matches:
+            log.warning('No simulation file matches "{}"', pattern)
+        sim_files.extend(matches)
+    return sim_files
+
+
+def run_one(job):
+    '''Run one simulation with its own client, and return its results.
+
+    Failures are reported in the results rather than raised, so that one
+    broken run does not bring down the whole batch.
+    '''
+    # Imported here so that workers set their registries up on their own
+    from .simulation import Simulation
+    client, sim_file, seed, use_cache = job
+    result = {'sim_file': sim_file, 'seed': seed, 'stats': None}
+    start_time = time()
+    with TemporaryDirectory(prefix='lifts-') as directory:
+        process = None
+        try:
+            simulation = Simulation(sim_file, directory, fast_forward=True,
+                                    rng_seed=seed, use_cache=use_cache)
+            interface = simulation.interface
+            process = subprocess.Popen(
+                shlex.split(client) + [interface.out_name, interface.in_name],
+                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+            simulation.run()
+            result['stats'] = simulation.stats()
+        except SystemExit:
+            result['error'] = 'The client never sent the READY signal'
+        except Exception as error:
+            result['error'] = '{}: {}'.format(type(error).__name__, error)
+        finally:
+            if process is not None:
+                process.terminate()
+                try:
+                    process.wait(CLIENT_EXIT_GRACE_PERIOD)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+    result['elapsed'] = time() - start_time
+    return result
+
+
+def flatten(stats, prefix=''):
+    '''Return the nested dictionaries of `stats` as a single level one.
+
+    Nested keys are joined with dots, as in `wait.mean` or
+    `lifts.main.stops`.
+    '''
+    flat = {}
+    for key, value in stats.items():
+        name = '{}{}'.format(prefix, key)
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '.'))
+        else:
+            flat[name] = value
+    return flat
+
+
+def summarise(results):
+    '''Return aggregate statistics for the numeric STATS of `results`.
+
+    Nested statistics are aggregated under their dotted names (see
+    `flatten`).
+    '''
+    succeeded = [flatten(result['stats']) for result in results
+                 if result['stats']]
+    summary = {
+        'runs': len(results),
+        'failures': len(results) - len(succeeded),
+        'stats': {},
+    }
+    keys = sorted({key for stats in succeeded for key in stats})
+    for key in keys:
+        values = [stats[key] for stats in succeeded
+                  if isinstance(stats.get(key), (int, float))]
+        if not values:
+            continue
+        summary['stats'][key] = {
+            'mean': mean(values),
+            'min': min(values),
+            'max': max(values),
+            'stdev': pstdev(values),
+        }
+    return summary
+
+
+def run_batch(client, sim_files, seeds, output, workers=None,
+              use_cache=True):
+    '''Run every simulation file with every seed, streaming the results.
+
+    Arguments:
+        client: the command line launching the AI client
+        sim_files: the simulation files to run
+        seeds: the seeds to run each simulation file with
+        output: the file where to write one JSON line per run
+        workers: the number of parallel processes (default: one per core)
+        use_cache: if False, do not use the cache of simulation files
+
+    Return the summary of the batch.
+    '''
+    jobs = [(client, sim_file, seed, use_cache)
+            for sim_file in sim_files for seed in seeds]
+    results = []
+    with open(output, 'w') as file_, Pool(workers or cpu_count()) as pool:
+        for result in pool.imap_unordered(run_one, jobs):
+            print(json.dumps(result), file=file_, flush=True)
+            if result['stats'] is None:
+                log.error('{sim_file} (seed {seed}) failed: {error}',
+                          **result)
+            results.append(result)
+    return summarise(results)
+
+
+def main(args):
+    '''Run a batch from the parsed command line `args`.'''
+    sim_files = expand_sim_files(args['<sim-file>'])
+    summary = run_batch(client=args['<client>'],
+                        sim_files=sim_files,
+                        seeds=parse_seeds(args['--seeds']),
+                        output=args['--output'],
+                        workers=int(args['--workers']),
+                        use_cache=not args['--no-cache'])
+    print(json.dumps(summary, indent=2))
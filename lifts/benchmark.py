@@ -0,0 +1,506 @@
+#! /usr/bin/env python3
+'''
+Benchmark the throughput of the simulation engine.
+
+Buildings, lifts and populations are generated along three scaling axes
+(floors, lifts and people), and each scenario is run headless in fast-forward
+mode, driven by a built-in scripted client that speaks the text protocol
+in-process.  Each scenario runs in a fresh process, so that its peak memory is
+its own.
+
+Usage:
+  lifts-benchmark [<scenario>...] [--output=<file>] [--baseline=<file>]
+                  [--tolerance=<ratio>]
+  lifts-benchmark --list
+  lifts-benchmark -h | --help
+
+Options:
+  -h --help            Show this screen.
+  --list               List the available scenarios.
+  --output=<file>      File where to write the results as JSON
+                       [default: lifts-benchmark.json].
+  --baseline=<file>    Results of a previous run, to compare against.
+  --tolerance=<ratio>  Relative change before a difference with the baseline
+                       is a regression [default: 0.1].
+
+Without `<scenario>` arguments, all scenarios are run.  The exit code is 1 if
+any regression against the baseline is found.
+'''
+import json
+import os
+import platform
+import resource
+import sys
+import tracemalloc
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict, deque
+from functools import wraps
+from multiprocessing import Pool
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import toml
+from docopt import docopt
+from simpleactors import Actor
+
+from . import common
+from .floor import Floor
+from .interface import FileInterface
+from .lift import Lift
+from .person import Person
+from .simulation import Simulation
+
+TOTAL_TICKS = 600  # in seconds
+LIFT_MODEL = {
+    'directional': True,
+    'capacity': 8,
+    'transit_time': 2,
+    'accel_time': 4,
+}
+
+
+def _scenario(floors, lifts, people, backend='actors', topology='linked'):
+    return {'floors': floors, 'lifts': lifts, 'people': people,
+            'backend': backend, 'topology': topology}
+
+SCENARIOS = OrderedDict([
+    ('floors-10', _scenario(10, 4, 1000)),
+    ('floors-100', _scenario(100, 4, 1000)),
+    ('floors-1000', _scenario(1000, 4, 1000)),
+    ('lifts-1', _scenario(50, 1, 1000)),
+    ('lifts-8', _scenario(50, 8, 1000)),
+    ('lifts-128', _scenario(50, 128, 1000)),
+    ('lifts-128-arrays', _scenario(50, 128, 1000, topology='arrays')),
+    ('people-1k', _scenario(50, 16, 1000, 'arrays')),
+    ('people-10k', _scenario(50, 16, 10000, 'arrays')),
+    ('people-100k', _scenario(50, 16, 100000, 'arrays')),
+    ('people-1m', _scenario(50, 16, 1000000, 'arrays')),
+])
+
+# Throughput metrics must not drop, memory must not grow
+HIGHER_IS_BETTER = ('turns_per_second', 'events_per_second',
+                    'commands_per_second')
+LOWER_IS_BETTER = ('peak_rss_kb', )
+FOOTPRINT_METRICS = ('bytes_per_person', 'bytes_per_lift')
+
+
+def write_scenario(directory, name, scenario):
+    '''Write the simulation files of `scenario` in `directory`.
+
+    Return the name of the master simulation file.
+    '''
+    for subdir in ('buildings', 'lifts'):
+        os.makedirs(os.path.join(directory, subdir), exist_ok=True)
+    top = scenario['floors'] - 1
+    building = {'floor': [
+        {'level': level, 'is_entry': level == 0, 'is_exit': level == 0}
+        for level in range(scenario['floors'])]}
+    with open(os.path.join(directory, 'buildings', 'generated.toml'),
+              'w') as file_:
+        toml.dump(building, file_)
+    with open(os.path.join(directory, 'lifts', 'standard.toml'),
+              'w') as file_:
+        toml.dump(LIFT_MODEL, file_)
+    sim = {
+        'id': name,
+        'topology': scenario['topology'],
+        'clocking': {'total_ticks': TOTAL_TICKS, 'ticks_per_turn': 1,
+                     'client_turn_ms': 50},
+        'building': {'model': 'generated'},
+        'lifts': [{'lid': 'L{}'.format(n), 'model': 'standard',
+                   'range': [0, top], 'location': 0, 'open_doors': False}
+                  for n in range(scenario['lifts'])],
+        'people': {'population': scenario['people'], 'seed': 'benchmark',
+                   'backend': scenario['backend']},
+    }
+    sim_fname = os.path.join(directory, '{}.toml'.format(name))
+    with open(sim_fname, 'w') as file_:
+        toml.dump(sim, file_)
+    return sim_fname
+
+
+class ScriptedController(FileInterface):
+
+    '''
+    An in-process client, driving the lifts with a collective strategy.
+
+    Rather than going through files, lines are exchanged over in-memory
+    queues, but they still are formatted and parsed as per the protocol, so
+    that the cost of the interface is part of the measurements.  Each lift
+    keeps sweeping in one direction as long as there are floor requests or
+    lit call buttons ahead of it, stopping at each of them.
+
+    Arguments:
+        directory: ignored, for compatibility with `FileInterface`
+    '''
+
+    def __init__(self, directory=None):
+        Actor.__init__(self)
+        self._inbox = deque()  # lines from the engine
+        self._outbox = deque()  # lines to the engine
+        self.lifts = {}
+        self._lit = {}  # level -> lit call directions
+        self._call_levels = []  # sorted levels with a lit call button
+
+    def cleanup(self):
+        pass
+
+    def write(self, line):
+        self._inbox.append(line)
+
+    def read(self):
+        if not self._outbox:
+            self._process_inbox()
+        if self._outbox:
+            return self._outbox.popleft()
+
+    def _send(self, *bits):
+        self._outbox.append(' '.join(map(str, bits)))
+
+    def _process_inbox(self):
+        '''Update the knowledge of the world, and play when asked to.'''
+        while self._inbox:
+            message, *bits = self._inbox.popleft().split(' ', 1)
+            if message == 'WORLD':
+                self._load_world(json.loads(bits[0]))
+                self._send('READY')
+                continue
+            bits = bits[0].split() if bits else []
+            if message == 'LIFT_CALL':
+                level = int(bits[0])
+                if level not in self._lit:
+                    self._lit[level] = set()
+                    insort(self._call_levels, level)
+                self._lit[level].add(bits[1])
+            elif message == 'FLOOR_REQUEST':
+                self.lifts[bits[0]]['stops'].add(int(bits[1]))
+            elif message == 'TRANSIT':
+                self.lifts[bits[0]]['level'] = int(bits[1])
+            elif message == 'ARRIVED':
+                lift = self.lifts[bits[0]]
+                lift['level'] = int(bits[1])
+                lift['moving'] = False
+            elif message == 'READY':
+                self._play()
+                self._send('READY')
+
+    def _load_world(self, world):
+        for description in world['lifts']:
+            self.lifts[description['lid']] = {
+                'level': description['location'],
+                'bottom': description['bottom_floor_number'],
+                'top': description['top_floor_number'],
+                'heading': 'UP',
+                'stops': set(),
+                'moving': False,
+                'open': description['open_doors'],
+            }
+
+    @staticmethod
+    def _reaches(lift, direction):
+        '''Return True if the lift can leave its floor in `direction`.'''
+        if direction == 'UP':
+            return lift['level'] < lift['top']
+        return lift['level'] > lift['bottom']
+
+    def _unlight(self, level, direction):
+        '''Forget about the call at `level` for `direction`.'''
+        lit = self._lit.get(level)
+        if lit is None:
+            return
+        lit.discard(direction)
+        if not lit:
+            del self._lit[level]
+            self._call_levels.remove(level)
+
+    def _ahead(self, lift, heading):
+        '''Return the closest level to stop at in `heading`, None if none.'''
+        here = lift['level']
+        calls = self._call_levels
+        if heading == 'UP':
+            levels = [level for level in lift['stops'] if level > here]
+            index = bisect_right(calls, here)
+            if index < len(calls) and calls[index] <= lift['top']:
+                levels.append(calls[index])
+            return min(levels, default=None)
+        levels = [level for level in lift['stops'] if level < here]
+        index = bisect_left(calls, here)
+        if index and calls[index - 1] >= lift['bottom']:
+            levels.append(calls[index - 1])
+        return max(levels, default=None)
+
+    def _next_target(self, lift):
+        '''Return the next level to go to, reversing heading if needed.'''
+        target = self._ahead(lift, lift['heading'])
+        if target is None:
+            heading = 'DOWN' if lift['heading'] == 'UP' else 'UP'
+            target = self._ahead(lift, heading)
+            if target is not None:
+                lift['heading'] = heading
+        return target
+
+    def _play(self):
+        '''Queue the commands for all the lifts, for this turn.
+
+        Call buttons are forgotten the way floors switch them off: when a
+        lift leaves in their direction after having opened there.
+        '''
+        for lid, lift in self.lifts.items():
+            if lift['moving']:
+                continue
+            here = lift['level']
+            if lift['open']:
+                target = self._next_target(lift)
+                self._send('CLOSE', lid)
+                lift['open'] = False
+                if target is not None:
+                    self._unlight(here, 'UP' if target > here else 'DOWN')
+                    self._send('GOTO', lid, target)
+                    lift['moving'] = True
+                continue
+            # Calls beyond the reach of the lift are left to other banks
+            lit = {direction for direction in self._lit.get(here, ())
+                   if self._reaches(lift, direction)}
+            if lit or here in lift['stops']:
+                if lift['heading'] in lit or not lit:
+                    intent = lift['heading']
+                else:
+                    intent, = lit
+                if not lit and self._ahead(lift, intent) is None:
+                    intent = '-'
+                else:
+                    lift['heading'] = intent
+                lift['stops'].discard(here)
+                self._send('OPEN', lid, intent)
+                lift['open'] = True
+                continue
+            target = self._next_target(lift)
+            if target is not None:
+                self._send('GOTO', lid, target)
+                lift['moving'] = True
+
+
+class Probe:
+
+    '''
+    Count and time the calls to some functions, while active.
+
+    Functions are swapped for timing wrappers, so the probe must be activated
+    before the actors get plugged.  The wrappers add their own overhead, so
+    timings are comparable between runs rather than absolute.
+
+    Arguments:
+        targets: (label, owner, attribute name) of the functions to probe
+    '''
+
+    def __init__(self, targets):
+        self.targets = targets
+        self.calls = {label: 0 for label, *_ in targets}
+        self.seconds = {label: 0.0 for label, *_ in targets}
+        self._originals = []
+
+    def _wrap(self, label, function):
+        calls, seconds = self.calls, self.seconds
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                seconds[label] += perf_counter() - start
+                calls[label] += 1
+        return wrapper
+
+    def __enter__(self):
+        for label, owner, name in self.targets:
+            original = vars(owner)[name]
+            self._originals.append((owner, name, original))
+            setattr(owner, name, self._wrap(label, original))
+        return self
+
+    def __exit__(self, *exc_info):
+        for owner, name, original in reversed(self._originals):
+            setattr(owner, name, original)
+        self._originals = []
+
+    def report(self):
+        '''Return calls and cumulative seconds, by label.'''
+        return {label: {'calls': self.calls[label],
+                        'seconds': self.seconds[label]}
+                for label in self.calls}
+
+
+def probe_targets(backend):
+    '''Return the functions worth timing for a given population backend.
+
+    Floors board people and lifts let them off: together, they do what
+    `Person.on_lift_open` used to.
+    '''
+    targets = [
+        ('dispatch', common, 'dispatch'),
+        ('Lift.consume_seconds', Lift, 'consume_seconds'),
+        ('Lift.unload', Lift, 'unload'),
+        ('Floor.lift_has_opened', Floor, 'lift_has_opened'),
+        ('FileInterface.send_message', FileInterface, 'send_message'),
+        ('FileInterface.process_line', FileInterface, 'process_line'),
+        ('ScriptedController._play', ScriptedController, '_play'),
+    ]
+    if backend == 'arrays':
+        from .population import Population
+        targets += [
+            ('Population.board', Population, 'board'),
+            ('Population.alight', Population, 'alight'),
+        ]
+    return targets
+
+
+def run_scenario(name, scenario=None):
+    '''Run a scenario in this process, and return its measurements.'''
+    scenario = scenario or SCENARIOS[name]
+    with TemporaryDirectory(prefix='lifts-benchmark-') as directory:
+        sim_fname = write_scenario(directory, name, scenario)
+        with Probe(probe_targets(scenario['backend'])) as probe:
+            start_time = perf_counter()
+            # Scenarios are written anew each time, caching them is moot
+            simulation = Simulation(sim_fname, fast_forward=True,
+                                    interface_class=ScriptedController,
+                                    use_cache=False)
+            simulation.run()
+            elapsed = perf_counter() - start_time
+    functions = probe.report()
+    events = functions.pop('dispatch')['calls']
+    parsing = functions['FileInterface.process_line']
+    result = dict(scenario, scenario=name)
+    result.update(simulation.stats())
+    result.update({
+        'elapsed': elapsed,
+        'turns_per_second': simulation.step_counter / elapsed,
+        'events': events,
+        'events_per_second': events / elapsed,
+        # Throughput of the command parser alone, READY lines included
+        'commands': parsing['calls'],
+        'commands_per_second': (parsing['calls'] / parsing['seconds']
+                                if parsing['seconds'] else 0.0),
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'functions': functions,
+    })
+    common.reset()
+    return result
+
+
+def measure_footprint(count=10000, floors=10):
+    '''Return the bytes allocated per person and per lift, on average.
+
+    Entities are created in a registry of their own, and the count includes
+    what they cost to the registry and to the floors they wait at.
+    '''
+    previous = common.active_registry
+    common.Registry().activate()
+    building = [Floor(level) for level in range(floors)]
+    for below, above in zip(building, building[1:]):
+        below.above, above.below = above, below
+    top = building[-1]
+    description = dict(LIFT_MODEL, bottom_floor_number=0,
+                       top_floor_number=floors - 1)
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        people = [Person(pid, building[pid % (floors - 1)], top)
+                  for pid in range(count)]
+        common.process_events()
+        middle = tracemalloc.get_traced_memory()[0]
+        lifts = [Lift(dict(description, lid='L{}'.format(n)), building[0])
+                 for n in range(count // 10)]
+        end = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del people, lifts
+    previous.activate()
+    return {'bytes_per_person': (middle - start) / count,
+            'bytes_per_lift': (end - middle) / (count // 10)}
+
+
+def run_isolated(name):
+    '''Run a scenario in a fresh process, and return its measurements.'''
+    with Pool(1) as pool:
+        return pool.apply(run_scenario, (name, ))
+
+
+def compare(results, baseline, tolerance, footprint=None):
+    '''Return the regressions of `results` with respect to `baseline`.'''
+    previous = {result['scenario']: result for result in baseline['results']}
+    regressions = []
+    for metric in FOOTPRINT_METRICS:
+        old = baseline.get('footprint', {}).get(metric)
+        if footprint is None or not old:
+            continue
+        change = footprint[metric] / old - 1
+        if change > tolerance:
+            regressions.append({
+                'scenario': 'footprint',
+                'metric': metric,
+                'baseline': old,
+                'current': footprint[metric],
+                'change': change,
+            })
+    for result in results:
+        old = previous.get(result['scenario'])
+        if old is None:
+            continue
+        for metric in HIGHER_IS_BETTER + LOWER_IS_BETTER:
+            if not old.get(metric):
+                continue
+            change = result[metric] / old[metric] - 1
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            if worse > tolerance:
+                regressions.append({
+                    'scenario': result['scenario'],
+                    'metric': metric,
+                    'baseline': old[metric],
+                    'current': result[metric],
+                    'change': change,
+                })
+    return regressions
+
+
+def main():
+    args = docopt(__doc__)
+    if args['--list']:
+        for name, scenario in SCENARIOS.items():
+            print('{:<16} {floors:>5} floors {lifts:>4} lifts {people:>8} '
+                  'people ({backend}, {topology})'.format(name, **scenario))
+        return
+    names = args['<scenario>'] or list(SCENARIOS)
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        sys.exit('Unknown scenarios: {}'.format(', '.join(sorted(unknown))))
+    results = []
+    for name in names:
+        result = run_isolated(name)
+        common.log.info('{scenario}: {turns_per_second:.1f} turns/s, '
+                        '{events_per_second:.0f} events/s, '
+                        '{commands_per_second:.0f} commands/s, '
+                        '{peak_rss_kb} kB', **result)
+        results.append(result)
+    with Pool(1) as pool:
+        footprint = pool.apply(measure_footprint)
+    common.log.info('footprint: {bytes_per_person:.0f} bytes/person, '
+                    '{bytes_per_lift:.0f} bytes/lift', **footprint)
+    report = {'python': platform.python_version(), 'results': results,
+              'footprint': footprint}
+    if args['--baseline']:
+        with open(args['--baseline']) as file_:
+            baseline = json.load(file_)
+        report['regressions'] = compare(results, baseline,
+                                        float(args['--tolerance']), footprint)
+    with open(args['--output'], 'w') as file_:
+        json.dump(report, file_, indent=2)
+    for regression in report.get('regressions', ()):
+        print('{scenario} {metric}: {baseline} -> {current} '
+              '({change:+.1%})'.format(**regression))
+    if report.get('regressions'):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+'''
+The binary protocol.
+
+Asked for with `READY BINARY` at hand-shake, it replaces lines with fixed-size
+records, one per message or command: no text to format or to parse.  Records
+are little-endian, made of:
+
+- the code of the message or command (uint8), its position in
+  `MESSAGE_SCHEMA` or `COMMAND_SCHEMA`
+- a direction (uint8), its position in `DIRECTIONS`
+- a lift (uint16), its position in the `lifts` of the WORLD message
+- a number (int32): a floor number, a turn number, or the size in bytes of
+  the UTF-8 text that follows the record (the JSON of STATS, the explanation
+  of an ERROR)
+
+Fields that a message or command does not use are zero.  The numbers of a
+message beyond the first follow its record: int32 for floors, float64 for
+seconds (the last floor and the seconds of TRANSITS).
+'''
+import struct
+
+from simpleactors import get_by_id
+
+from .common import Direction
+from .floor import Floor
+from .interface import (COMMAND_SCHEMA, MESSAGE_SCHEMA, MESSAGE_TO_STRING,
+                        STRING_TO_COMMAND, STRING_TO_DIRECTION,
+                        DIRECTION_TO_STRING)
+from .lift import Lift
+
+RECORD = struct.Struct('<BBHi')
+EXTRA_NUMBERS = {Floor: struct.Struct('<i'), float: struct.Struct('<d')}
+DIRECTIONS = (Direction.none, Direction.up, Direction.down)
+DIRECTION_CODES = {direction: code for code, direction in enumerate(DIRECTIONS)}
+MESSAGE_CODES = {name: code for code, (name, _) in enumerate(MESSAGE_SCHEMA)}
+
+
+class BinaryCodec:
+
+    '''
+    Encode messages and decode commands as binary records.
+
+    Arguments:
+        lift_ids: the ids of the lifts, in the order of the WORLD message
+    '''
+
+    size = RECORD.size  # of the records of commands
+
+    def __init__(self, lift_ids):
+        self.lift_ids = list(lift_ids)
+        self.lift_codes = {lid: code for code, lid in enumerate(self.lift_ids)}
+        # message -> (code, parameter types)
+        self.messages = {
+            message: (MESSAGE_CODES[name], dict(MESSAGE_SCHEMA)[name])
+            for message, name in MESSAGE_TO_STRING.items()}
+
+    def encode(self, message, entity=None, *args):
+        '''Return the record of a message, as `send_message` takes it.'''
+        code, ptypes = self.messages[message]
+        direction = lift = number = 0
+        text = b''
+        numbered = False
+        values = ((entity, ) + args) if entity is not None else args
+        for type_, value in zip(ptypes, values):
+            if type_ is Lift:
+                lift = self.lift_codes[value]
+            elif type_ is Direction:
+                if not isinstance(value, Direction):
+                    value = STRING_TO_DIRECTION[value]
+                direction = DIRECTION_CODES[value]
+            elif type_ is str:
+                text = str(value).encode('utf-8')
+                number = len(text)
+            elif numbered:
+                text += EXTRA_NUMBERS[type_].pack(value)
+            else:  # Floor numbers and turn numbers
+                number = value
+                numbered = True
+        return RECORD.pack(code, direction, lift, number) + text
+
+    def render(self, record):
+        '''Return a command record as a line of the text protocol.'''
+        code, direction, lift, number = RECORD.unpack(record)
+        if code >= len(COMMAND_SCHEMA):
+            return str(code)
+        name, ptypes = COMMAND_SCHEMA[code]
+        bits = [name]
+        for type_ in ptypes:
+            if type_ is Lift:
+                bits.append(self.lift_ids[lift] if lift < len(self.lift_ids)
+                            else '#{}'.format(lift))
+            elif type_ is Floor:
+                bits.append(str(number))
+            elif type_ is Direction:
+                bits.append(DIRECTION_TO_STRING[DIRECTIONS[direction]]
+                            if direction < len(DIRECTIONS) else '?')
+        return ' '.join(bits)
+
+    def decode(self, record):
+        '''Return the command in a record, or None if it is invalid.
+
+        The command is a list, as returned by `FileInterface.process_line`.
+        '''
+        code, direction, lift, number = RECORD.unpack(record)
+        if code >= len(COMMAND_SCHEMA):
+            return None
+        name, ptypes = COMMAND_SCHEMA[code]
+        payload = [STRING_TO_COMMAND[name]]
+        for type_ in ptypes:
+            if type_ is Lift:
+                if lift >= len(self.lift_ids):
+                    return None
+                payload.append(get_by_id(Lift, self.lift_ids[lift]))
+            elif type_ is Floor:
+                payload.append(get_by_id(Floor, number))
+            elif type_ is Direction:
+                if direction >= len(DIRECTIONS):
+                    return None
+                payload.append(DIRECTIONS[direction])
+        if None in payload:
+            return None
+        return payload
@@ -0,0 +1,82 @@
+'''
+A cache of expanded simulation descriptions.
+
+Expanding a simulation file means parsing it, the building it refers to and
+the model of each of its lifts.  The expanded description is stored with
+marshal, together with the digest of every file that went into it: as long as
+none of them changed, later loads skip TOML parsing altogether.
+'''
+import hashlib
+import marshal
+import os
+import tempfile
+
+from .common import log
+
+# Bump when the format of the entries or of the descriptions changes
+CACHE_VERSION = 1
+
+
+def cache_dir():
+    '''Return the directory of the cache.
+
+    It is `$LIFTS_CACHE_DIR` if set, `lifts` in the user cache otherwise.
+    '''
+    directory = os.environ.get('LIFTS_CACHE_DIR')
+    if directory:
+        return directory
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'lifts')
+
+
+def read(fname):
+    '''Return the content of a file, as bytes.'''
+    with open(fname, 'rb') as file_:
+        return file_.read()
+
+
+def digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def entry_fname(sim_fname, content):
+    '''Return the cache entry of a simulation file with a given content.'''
+    key = b'\0'.join((str(CACHE_VERSION).encode(), sim_fname.encode(),
+                      content))
+    return os.path.join(cache_dir(), '{}.marshal'.format(digest(key)))
+
+
+def store(fname, digests, description):
+    '''Atomically write a cache entry, giving up silently on failure.'''
+    try:
+        data = marshal.dumps((digests, description))
+        directory = os.path.dirname(fname)
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as tmp:
+            tmp.write(data)
+        os.replace(tmp.name, fname)
+    except (OSError, ValueError) as error:
+        log.debug('Could not cache the simulation: {}', error)
+
+
+def load(sim_fname, expand):
+    '''Return the expanded description of `sim_fname`, cached if possible.
+
+    Arguments:
+        sim_fname: the absolute path of the simulation file
+        expand: a callable taking `sim_fname` and returning its expanded
+            description, and a dictionary with the digest of every file it
+            read, by absolute path
+    '''
+    fname = entry_fname(sim_fname, read(sim_fname))
+    try:
+        with open(fname, 'rb') as file_:
+            digests, description = marshal.load(file_)
+        if all(digest(read(dep)) == hexdigest
+               for dep, hexdigest in digests.items()):
+            return description
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+    description, digests = expand(sim_fname)
+    store(fname, digests, description)
+    return description
@@ -1,23 +1,338 @@
+from collections import defaultdict, deque, namedtuple
 from enum import Enum
+from time import perf_counter
 
-from simpleactors import Actor
+import simpleactors
+from simpleactors import KILL
 import logbook
 
 # ENUMERATORS
-Direction = Enum('Dirs', 'up down none')
+# The qualname is what makes directions picklable
+Direction = Enum('Dirs', 'up down none', qualname='Direction')
 Event = Enum('Event', 'call_button floor_button')
 LiftStatus = Enum('LiftStatus', 'moving open closed')
 Command = Enum('Command', 'ready goto open close')
 Message = Enum(
     'Message',
-    'world turn ready lift_call floor_request transit arrived error end stats')
+    'world turn ready lift_call floor_request transit arrived error end stats '
+    'transits')
 
 log = logbook.Logger('Lifts')
 
+# ROUTING
+# A message addressed to a specific entity (a lift, a floor...) rather than
+# broadcast to every actor listening for it.
+Targeted = namedtuple('Targeted', 'message target')
+# message -> target -> set of callbacks
+global_routes = {}
+# When profiling is enabled, the HandlerStats collecting timings
+handler_stats = None
 
-class LiftsActor(Actor):
 
-    '''An abstract base class for all actors in the lift simulation.'''
+def on_target(message):
+    '''Decorator registering a method for `message` addressed to the actor.'''
+    def decorator(function):
+        try:
+            function._target_messages.append(message)
+        except AttributeError:
+            function._target_messages = [message]
+        return function
+    return decorator
+
+
+def subscribe(message, target, callback):
+    '''Have `callback` receive `message` when addressed to `target`.'''
+    global_routes.setdefault(message, {}).setdefault(target, set()).add(
+        callback)
+
+
+def unsubscribe(message, target, callback):
+    '''Stop `callback` from receiving `message` addressed to `target`.'''
+    by_target = global_routes.get(message, {})
+    callbacks = by_target.get(target)
+    if callbacks is None:
+        return
+    callbacks.discard(callback)
+    if not callbacks:
+        del by_target[target]
+
+
+def post(message, target, *args, **kwargs):
+    '''Queue `message` for `target` on behalf of a non-actor (e.g. the sim).'''
+    event = (Targeted(message, target), None, args, kwargs)
+    simpleactors.global_event_queue.append(event)
+
+
+def broadcast(message, *args, **kwargs):
+    '''Queue `message` for all its listeners on behalf of a non-actor.'''
+    simpleactors.global_event_queue.append((message, None, args, kwargs))
+
+
+def kill(actor):
+    '''Remove an actor from all the registries.'''
+    actor.unplug()
+    simpleactors.global_actors.discard(actor)
+    kind = getattr(actor, 'registered_as', None) or actor.__class__
+    by_id = simpleactors.global_actors_by_id[kind]
+    if by_id.get(actor.id) is actor:
+        del by_id[actor.id]
+
+
+def dispatch(event):
+    '''Deliver a single queued event to the callbacks concerned by it.
+
+    Targeted messages are looked up in the routing index, so that they only
+    reach the actors subscribed for their target, whatever the population.
+    Any other message is broadcast to all actors listening for it.
+    '''
+    message, _, args, kwargs = event
+    if message is KILL:
+        kill(*args)
+        return
+    if isinstance(message, Targeted):
+        name = message.message
+        by_target = global_routes.get(name, {})
+        callbacks = by_target.get(message.target, ())
+    else:
+        name = message
+        callbacks = simpleactors.global_callbacks.get(message, ())
+    # Callbacks may (un)subscribe while the message is being delivered
+    if handler_stats is None:
+        for callback in tuple(callbacks):
+            callback(*args, **kwargs)
+        return
+    start = perf_counter()
+    for callback in tuple(callbacks):
+        begin = perf_counter()
+        callback(*args, **kwargs)
+        handler_stats.record(handler_stats.by_handler,
+                             HandlerStats.handler_name(callback),
+                             perf_counter() - begin)
+    handler_stats.record(handler_stats.by_message, name,
+                         perf_counter() - start)
+
+
+def process_events():
+    '''Dispatch queued events until the queue is exhausted.'''
+    queue = simpleactors.global_event_queue
+    while queue:
+        dispatch(queue.popleft())
+
+
+def reset():
+    '''Reset simpleactors global registries, the routing index, profiling.'''
+    simpleactors.reset()
+    global_routes.clear()
+    disable_profiling()
+
+
+class Registry:
+
+    '''
+    Everything that makes a world of actors: actors (also by id), the event
+    queue, the callbacks, the routing index and the profiling of handlers.
+
+    simpleactors keeps its registries in module globals.  Activating a
+    registry rebinds them (and their counterparts here), so that several
+    simulations can live in the same process, as long as only the active one
+    runs.  A registry can be pickled with all its actors.
+    '''
+
+    def __init__(self):
+        self.actors = set()
+        self.actors_by_id = defaultdict(dict)
+        self.event_queue = deque()
+        self.callbacks = defaultdict(set)
+        self.routes = {}
+        self.handler_stats = None
+
+    @classmethod
+    def current(cls):
+        '''Return a registry wrapping the currently bound globals.'''
+        registry = cls.__new__(cls)
+        registry.actors = simpleactors.global_actors
+        registry.actors_by_id = simpleactors.global_actors_by_id
+        registry.event_queue = simpleactors.global_event_queue
+        registry.callbacks = simpleactors.global_callbacks
+        registry.routes = global_routes
+        registry.handler_stats = handler_stats
+        return registry
+
+    def activate(self):
+        '''Bind the globals to this registry.'''
+        global active_registry, global_routes, handler_stats
+        simpleactors.global_actors = self.actors
+        simpleactors.global_actors_by_id = self.actors_by_id
+        simpleactors.global_event_queue = self.event_queue
+        simpleactors.global_callbacks = self.callbacks
+        global_routes = self.routes
+        handler_stats = self.handler_stats
+        active_registry = self
+
+# The registry in use, all actors live in it
+active_registry = Registry.current()
+
+
+class HandlerStats:
+
+    '''
+    Call counts and cumulative time spent handling events.
+
+    Timings are kept both per message and per handler, handlers of all the
+    instances of a class being counted together.  Handlers never
+    dispatch events themselves (they queue them), so times are exclusive.
+    '''
+
+    def __init__(self):
+        self.by_message = {}
+        self.by_handler = {}
+
+    @staticmethod
+    def record(table, key, seconds):
+        '''Add a call lasting `seconds` to `key` in `table`.'''
+        try:
+            entry = table[key]
+        except KeyError:
+            entry = table[key] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+
+    @staticmethod
+    def handler_name(callback):
+        '''Return the qualified name of the function behind `callback`.'''
+        function = getattr(callback, 'func', callback)  # Unwrap partials
+        return getattr(function, '__qualname__', repr(function))
+
+    def report(self):
+        '''Return the timings as a JSON-serialisable dictionary.'''
+        return {
+            name: {key: {'calls': calls, 'seconds': seconds}
+                   for key, (calls, seconds) in table.items()}
+            for name, table in (('messages', self.by_message),
+                                ('handlers', self.by_handler))
+        }
+
+
+def enable_profiling():
+    '''Start timing event handlers, and return the HandlerStats in use.'''
+    global handler_stats
+    handler_stats = active_registry.handler_stats = HandlerStats()
+    return handler_stats
+
+
+def disable_profiling():
+    '''Stop timing event handlers.'''
+    global handler_stats
+    handler_stats = active_registry.handler_stats = None
+
+
+class LiftsActor:
+
+    '''
+    An abstract base class for all actors in the lift simulation.
+
+    They behave as the actors of simpleactors, and live in the same registries,
+    but they are slotted: large simulations have many of them, and their
+    attributes are not stored in a dictionary each.  Subclasses list theirs in
+    `__slots__`.  They must also have a `numeric_location`, which is checked
+    once, when they are defined.
+    '''
+
+    __slots__ = ('id', '_plugged')
+
+    # The class to register instances under, if not their own (so that they
+    # can be looked up by id as instances of their base class)
+    registered_as = None
+    # Messages marked with `on` in a base class that instances do not listen
+    # to (because something else handles them on their behalf)
+    ignored_messages = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.numeric_location is LiftsActor.numeric_location:
+            raise NotImplementedError('Actors must have a numeric_location')
+
+    def __init__(self, uid=None, auto_plug=True):
+        self.id = id(self) if uid is None else uid
+        kind = self.registered_as or self.__class__
+        by_id = simpleactors.global_actors_by_id[kind]
+        if self.id in by_id:
+            msg = 'A "{}" instance with id "{}" has been already created.'
+            raise ValueError(msg.format(self.__class__, self.id))
+        simpleactors.global_actors.add(self)
+        by_id[self.id] = self
+        self._plugged = False
+        if auto_plug:
+            self.plug()
+
+    @classmethod
+    def _callbacks(cls):
+        '''Return (message, method name) pairs marked with `on`.
+
+        Messages in `ignored_messages` are left out.
+        '''
+        try:
+            return cls.__dict__['_callbacks_cache']
+        except KeyError:
+            pass
+        pairs = []
+        for name in dir(cls):
+            function = getattr(cls, name, None)
+            for message in getattr(function, '_callback_messages', ()):
+                if message not in cls.ignored_messages:
+                    pairs.append((message, name))
+        cls._callbacks_cache = pairs
+        return pairs
+
+    @classmethod
+    def _targeted_callbacks(cls):
+        '''Return (message, method name) pairs marked with `on_target`.'''
+        try:
+            return cls.__dict__['_target_callbacks_cache']
+        except KeyError:
+            pass
+        pairs = []
+        for name in dir(cls):
+            function = getattr(cls, name, None)
+            for message in getattr(function, '_target_messages', ()):
+                pairs.append((message, name))
+        cls._target_callbacks_cache = pairs
+        return pairs
+
+    @property
+    def is_plugged(self):
+        '''Return True if the actor is listening for messages.'''
+        return self._plugged
+
+    def plug(self):
+        '''Add the actor's methods to the callback registry and routes.'''
+        if self._plugged:
+            return
+        callbacks = simpleactors.global_callbacks
+        for message, name in self._callbacks():
+            callbacks[message].add(getattr(self, name))
+        for message, name in self._targeted_callbacks():
+            subscribe(message, self, getattr(self, name))
+        self._plugged = True
+
+    def unplug(self):
+        '''Remove the actor's methods from the callback registry and routes.'''
+        if not self._plugged:
+            return
+        callbacks = simpleactors.global_callbacks
+        for message, name in self._callbacks():
+            callbacks[message].discard(getattr(self, name))
+        for message, name in self._targeted_callbacks():
+            unsubscribe(message, self, getattr(self, name))
+        self._plugged = False
+
+    def emit(self, message, *args, **kwargs):
+        '''Queue an event.'''
+        simpleactors.global_event_queue.append((message, self, args, kwargs))
+
+    def emit_to(self, target, message, *args, **kwargs):
+        '''Emit an event that will only reach the actors concerned by target.'''
+        self.emit(Targeted(message, target), *args, **kwargs)
 
     @property
     def numeric_location(self):
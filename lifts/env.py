@@ -0,0 +1,215 @@
+'''
+An in-process API for controllers, in the style of reinforcement learning
+environments.
+
+Rather than exchanging lines with a client process, the controller calls
+`reset` to start an episode, then `step` once per turn with its commands, and
+gets the messages of the turn and the state of the world back as Python
+values: nothing is formatted or parsed, and the simulation runs on the virtual
+clock of the fast-forward mode.
+
+    env = Environment('basic.toml')
+    observation, info = env.reset(seed=42)
+    while True:
+        commands = [(Command.goto, 'main', 3)]
+        observation, reward, terminated, truncated, info = env.step(commands)
+        if terminated or truncated:
+            break
+
+Commands are tuples of a `Command` and its parameters, as in the text
+protocol: lifts by id (or `Lift`), floors by number (or `Floor`), directions as
+`Direction` values (or their names in the protocol).
+'''
+import marshal
+
+from simpleactors import Actor
+
+from .common import Direction, Message
+from .floor import Floor
+from .interface import (FileInterface, COMMANDS, STRING_TO_COMMAND,
+                        STRING_TO_DIRECTION)
+from .lift import Lift
+from .simulation import Simulation
+
+COMMAND_TO_STRING = {command: name for name, command in
+                     STRING_TO_COMMAND.items()}
+
+
+class DirectInterface(FileInterface):
+
+    '''
+    A player interface for controllers living in the engine process.
+
+    Messages are kept as tuples of a `Message` and its parameters, as sent by
+    the engine, until the controller collects them.
+
+    Arguments:
+        directory: ignored, for compatibility with `FileInterface`
+    '''
+
+    def __init__(self, directory=None):
+        Actor.__init__(self)
+        self.events = []
+
+    def cleanup(self):
+        pass
+
+    def read(self):
+        return None
+
+    def send_message(self, message, entity=None, *args):
+        if entity is not None:
+            args = (entity, ) + args
+        self.events.append((message, ) + args)
+
+    def collect(self):
+        '''Return the messages sent since the last call, and forget them.'''
+        events, self.events = self.events, []
+        return events
+
+    def process_command(self, command):
+        '''Validate a command and return its payload, None for failures.
+
+        The payload is a list, as returned by `FileInterface.process_line`.
+        '''
+        command, *args = command
+        ptypes = COMMANDS.get(COMMAND_TO_STRING.get(command))
+        if ptypes is None or len(args) != len(ptypes):
+            msg = 'Invalid command {}'.format((command, ) + tuple(args))
+            self.send_message(Message.error, msg)
+            return
+        payload = [command]
+        for arg, type_ in zip(args, ptypes):
+            if type_ is Lift and not isinstance(arg, Lift):
+                arg = self.command_parser().lift(str(arg))
+            elif type_ is Floor and not isinstance(arg, Floor):
+                arg = self.command_parser().floor(str(arg))
+            elif type_ is Direction and not isinstance(arg, Direction):
+                arg = STRING_TO_DIRECTION.get(str(arg).upper())
+            payload.append(arg)
+        if None in payload:
+            msg = 'Invalid parameters for {}'.format((command, ) + tuple(args))
+            self.send_message(Message.error, msg)
+            return
+        return payload
+
+
+def observe(simulation):
+    '''Return the state of the world, as a dictionary.
+
+    It holds the turn and the clock, the state of each lift by id, and the lit
+    call buttons of each floor by number (floors without any are left out).
+    '''
+    lifts = {}
+    for lid, lift in simulation.lifts.items():
+        destination = lift.destination
+        lifts[lid] = {
+            'location': lift.location.level,
+            'destination': None if destination is None else destination.level,
+            'direction': lift.direction,
+            'open_doors': lift.open_doors,
+            'load': lift.load,
+            'capacity': lift.capacity,
+        }
+    calls = {level: frozenset(floor.requested_directions)
+             for level, floor in simulation.floors.items()
+             if floor.requested_directions}
+    return {'turn': simulation.step_counter, 'time': simulation.clock,
+            'lifts': lifts, 'calls': calls}
+
+
+class Environment:
+
+    '''
+    Episodes of a simulation, played one turn at a time by the caller.
+
+    The simulation file is expanded only once, and each episode gets its own
+    copy of the description.
+
+    Arguments:
+        sim_file: the master TOML file describing the simulation
+        use_cache: if False, parse the simulation file even if a cached
+            expansion of it is available
+        description: if not None, the expanded description of the
+            simulation, used instead of `sim_file`
+    '''
+
+    def __init__(self, sim_file, use_cache=True, description=None):
+        if description is None:
+            description = Simulation.load_description(sim_file, use_cache)
+        self._description = marshal.dumps(description)
+        self.simulation = None
+        self._engine = None
+
+    def reset(self, seed=None):
+        '''Start a new episode, and return its first observation and info.
+
+        If `seed` is not None, it overrides the seed in the simulation file.
+        The info holds the description of the world, as in the WORLD
+        message, and the messages of the first turn.
+        '''
+        self.simulation = Simulation(
+            None, description=marshal.loads(self._description),
+            fast_forward=True, rng_seed=seed,
+            interface_class=DirectInterface)
+        self._engine = self.simulation.fast_forward_engine()
+        # The first turn is played without the controller
+        next(self._engine)
+        info = {'world': self.simulation.world(),
+                'events': self.simulation.interface.collect()}
+        return observe(self.simulation), info
+
+    def play(self, commands):
+        '''Play a turn with `commands`, return True if the episode is over.
+
+        The commands are validated as by `step`, but no observation is made.
+        '''
+        if self._engine is None:
+            raise RuntimeError('The episode is over, call reset()')
+        self.simulation.registry.activate()
+        interface = self.simulation.interface
+        payloads = []
+        for command in commands:
+            payload = interface.process_command(command)
+            if payload is not None:
+                payloads.append(payload)
+        try:
+            self._engine.send(payloads)
+        except StopIteration:
+            self._engine = None
+            return True
+        return False
+
+    def step(self, commands):
+        '''Play a turn with `commands`, and run the world until the next one.
+
+        Return the observation, the reward, whether everybody has been
+        delivered, whether the time limit was hit, and the info, which holds
+        the messages of the turn (and the statistics, once the episode is
+        over).  The reward is minus the people in the building: over an
+        episode, rewards add up to minus the turns they spent in it.
+        '''
+        over = self.play(commands)
+        simulation = self.simulation
+        info = {'events': simulation.interface.collect()}
+        terminated = over and simulation.done
+        truncated = over and not terminated
+        if over:
+            info['stats'] = simulation.stats()
+        return (observe(simulation), -simulation.in_building, terminated,
+                truncated, info)
+
+    def run(self, controller, seed=None):
+        '''Play a whole episode with `controller`, return its statistics.
+
+        The controller is called every turn with the messages of the turn and
+        the observation, and returns the commands to play.
+        '''
+        observation, info = self.reset(seed)
+        events = info['events']
+        while True:
+            commands = controller(events, observation)
+            observation, _, terminated, truncated, info = self.step(commands)
+            if terminated or truncated:
+                return info['stats']
+            events = info['events']
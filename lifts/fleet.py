@@ -0,0 +1,176 @@
+'''
+The lifts of a building, with their state stored as a struct of NumPy arrays.
+
+Floors are indices into the arrays (counting from the bottom floor), and the
+position, destination, carried seconds, doors and load of every lift are
+columns.  Each turn, all the lifts travelling are moved by a single vectorised
+update, following the same rules as `Lift.consume_seconds`; the lifts are
+still actors, whose attributes read and write their row in the arrays, so that
+commands, floors and people deal with them as usual.  This trades some speed
+on individual lifts for bulk updates and queries of hundreds of them.
+'''
+import numpy as np
+from simpleactors import Actor, on
+
+from .lift import Lift, TIME_EPSILON
+
+NO_DESTINATION = -1
+
+
+def _column(name, cast):
+    '''Return a property storing an attribute in a column of the fleet.'''
+
+    def getter(self):
+        return cast(getattr(self.fleet, name).item(self.index))
+
+    def setter(self, value):
+        getattr(self.fleet, name)[self.index] = value
+    return property(getter, setter)
+
+
+def _floor_column(name):
+    '''Return a property storing a floor as an index in a column.'''
+
+    def getter(self):
+        index = getattr(self.fleet, name).item(self.index)
+        return None if index == NO_DESTINATION else self.fleet.floors[index]
+
+    def setter(self, floor):
+        index = NO_DESTINATION if floor is None else self.fleet.index_of(floor)
+        getattr(self.fleet, name)[self.index] = index
+    return property(getter, setter)
+
+
+class ArrayLift(Lift):
+
+    '''
+    A lift whose state lives in a row of the arrays of a `Fleet`.
+
+    Arguments:
+        fleet: the fleet the lift belongs to
+        index: the row of the lift in the arrays of the fleet
+        description, location, open_doors: as per `Lift`
+    '''
+
+    __slots__ = ('fleet', 'index')
+
+    registered_as = Lift
+    # The fleet moves all its lifts at once, at each `turn.start`
+    ignored_messages = frozenset(['turn.start'])
+
+    # Attributes kept in the arrays, and pickled with the fleet
+    COLUMNS = ('location', 'destination', '_carry_seconds', 'open_doors',
+               'load')
+
+    location = _floor_column('position')
+    destination = _floor_column('destination')
+    _carry_seconds = _column('carry', float)
+    open_doors = _column('open_doors', bool)
+    load = _column('load', int)
+
+    def __init__(self, fleet, index, description, location, open_doors=False):
+        self.fleet = fleet
+        self.index = index
+        super().__init__(description, location, open_doors)
+
+    def __getstate__(self):
+        slots = {}
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                if name in self.COLUMNS or not hasattr(self, name):
+                    continue
+                slots[name] = getattr(self, name)
+        return None, slots
+
+    def floor_at(self, number):
+        '''Return the floor numbered `number`.'''
+        return self.fleet.floors[number - self.fleet.bottom]
+
+
+class Fleet(Actor):
+
+    '''
+    All the lifts of a simulation, as parallel arrays.
+
+    Arguments:
+        floors: a dictionary of the floors of the building, by level, which
+            must be consecutive
+        size: the number of lifts that will be added to the fleet
+    '''
+
+    def __init__(self, floors, size):
+        self.bottom = min(floors)
+        self.floors = [floors[level] for level in sorted(floors)]
+        self.lifts = []
+        self.position = np.zeros(size, dtype=np.int32)
+        self.destination = np.full(size, NO_DESTINATION, dtype=np.int32)
+        self.carry = np.zeros(size)
+        self.open_doors = np.zeros(size, dtype=bool)
+        self.load = np.zeros(size, dtype=np.int32)
+        self.transit_time = np.zeros(size)
+        self.accel_time = np.zeros(size)
+        super().__init__()
+
+    def __len__(self):
+        return len(self.lifts)
+
+    def index_of(self, floor):
+        '''Return the index of a floor in the arrays.'''
+        return floor.numeric_location - self.bottom
+
+    def add(self, description, location, open_doors=False):
+        '''Create a lift in the next free row, and return it.'''
+        index = len(self.lifts)
+        self.transit_time[index] = description['transit_time']
+        self.accel_time[index] = description['accel_time']
+        lift = ArrayLift(self, index, description, location, open_doors)
+        self.lifts.append(lift)
+        return lift
+
+    def move(self, seconds):
+        '''Move all the lifts travelling by `seconds` (a value per lift).
+
+        Positions and carried seconds are updated at once.  Return a list of
+        (lift, hops, arriving) for each lift that transited or is arriving,
+        in the order of the fleet: the transits and the arrivals still have to
+        be announced (see `announce`).
+        '''
+        travelling = np.flatnonzero(self.destination != NO_DESTINATION)
+        if not len(travelling):
+            return []
+        carry = self.carry[travelling] + np.broadcast_to(
+            seconds, self.carry.shape)[travelling]
+        here = self.position[travelling]
+        there = self.destination[travelling]
+        distance = np.abs(there - here)
+        # As per Lift.consume_seconds: the last floor before the destination
+        # is where the lift starts to stop
+        hops = np.minimum(
+            (carry + TIME_EPSILON) // self.transit_time[travelling],
+            distance - 1).astype(np.int32)
+        carry -= hops * self.transit_time[travelling]
+        self.carry[travelling] = carry
+        self.position[travelling] = here + np.sign(there - here) * hops
+        arriving = (hops == distance - 1) & \
+            (carry + TIME_EPSILON >= self.accel_time[travelling])
+        changed = np.flatnonzero((hops > 0) | arriving)
+        return list(zip([self.lifts[n] for n in travelling[changed].tolist()],
+                        hops[changed].tolist(), arriving[changed].tolist()))
+
+    def announce(self, lift, hops, arriving):
+        '''Emit the transit and the arrival of a lift that has moved.'''
+        if hops == 1:
+            lift.emit('lift.transit', lift, floor=lift.location)
+        elif hops:
+            here = lift.location.numeric_location
+            step = 1 if lift.destination.numeric_location > here else -1
+            lift.emit('lift.transit', lift, floor=lift.location,
+                      start=lift.floor_at(here - step * (hops - 1)))
+        if arriving:
+            lift.arrive()
+
+    @on('turn.start')
+    def take_turn(self, duration):
+        '''Move all the lifts for the turn.'''
+        for move in self.move(duration):
+            self.announce(*move)
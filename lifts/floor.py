@@ -1,12 +1,16 @@
-from simpleactors import on
+from collections import deque
+from itertools import count
 
-from .common import LiftsActor, Event
+from .common import LiftsActor, Event, Direction, on_target
 
 
 class Floor(LiftsActor):
 
     '''A floor in the simulation.
 
+    People waiting for a lift queue up by the direction they want to go, in
+    the order they pressed the button.
+
     Arguments:
         level: the level of the floor
         is_exit: True if the floor is an exit point of the building
@@ -14,13 +18,19 @@ class Floor(LiftsActor):
         directional: True if the button on the floor is directional
     '''
 
+    __slots__ = ('level', 'is_exit', 'is_entry', 'requested_directions',
+                 'waiting', '_tickets', 'above', 'below')
+
     def __init__(self, level, is_exit=False, is_entry=False):
-        super().__init__()
-        self.id = level
+        super().__init__(uid=level)
         self.level = level
         self.is_exit = is_exit
         self.is_entry = is_entry
         self.requested_directions = set()
+        # direction -> deque of (ticket, person), tickets keep global FIFO
+        # order when a lift accepts people going either way
+        self.waiting = {Direction.up: deque(), Direction.down: deque()}
+        self._tickets = count()
         # Since these are going to do other Floor instances, they will be set
         # up at a different time, by an external routine
         self.above = self.below = None
@@ -34,15 +44,40 @@ class Floor(LiftsActor):
         # proprety instead, so...
         return self.level
 
-    @on('person.lift.call')
-    def push_button(self, person, direction):
-        if person.location != self:
-            return
+    def _next_in_line(self, direction):
+        '''Return the queue whose head is next to board for `direction`.'''
+        if direction is not Direction.none:
+            queue = self.waiting[direction]
+            return queue if queue else None
+        queues = [queue for queue in self.waiting.values() if queue]
+        if not queues:
+            return None
+        return min(queues, key=lambda queue: queue[0][0])
+
+    def press_button(self, direction):
+        '''Light the call button for `direction`, if not lit already.'''
         if direction not in self.requested_directions:
             self.requested_directions.add(direction)
+            self.emit('floor.call', self, direction)
+
+    @on_target('person.lift.call')
+    def push_button(self, person, direction):
+        self.waiting[direction].append((next(self._tickets), person))
+        self.press_button(direction)
+
+    @on_target('lift.open')
+    def lift_has_opened(self, lift):
+        '''Board waiting people, first come first served.'''
+        while True:
+            queue = self._next_in_line(lift.direction)
+            if queue is None:
+                return
+            person = queue[0][1]
+            if not person._should_get_on(lift):
+                return
+            queue.popleft()
+            person.board(lift)
 
-    @on('lift.close')
+    @on_target('lift.close')
     def lift_has_closed(self, lift):
-        if lift.location is not self:
-            return
         self.requested_directions.discard(lift.direction)
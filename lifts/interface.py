@@ -2,33 +2,227 @@
 The interface of lifts.
 '''
 import os
+from collections import deque
+from functools import partial
+from time import time, sleep
 
-from simpleactors import on, Actor, get_by_id
+import simpleactors
+from simpleactors import on, Actor
 
 from .common import Message, Command, Direction
 from .lift import Lift
 from .floor import Floor
 
-COMMANDS = {
-    'READY': (),
-    'GOTO': (Lift, Floor),  # lid, floor number
-    'OPEN': (Lift, Direction),  # lid, intention
-    'CLOSE': (Lift, ),  # lid
-}
-MESSAGE_STRINGS = (
-    'WORLD',
-    'TURN',
-    'READY',
-    'LIFT_CALL',
-    'FLOOR_REQUEST',
-    'TRANSIT',
-    'ARRIVED',
-    'ERROR',
-    'END',
-    'STATS',
+# The parameters of each command and message.  Their position in the tables
+# is also their code in the binary protocol: only ever append to them.
+COMMAND_SCHEMA = (
+    ('READY', ()),
+    ('GOTO', (Lift, Floor)),  # lid, floor number
+    ('OPEN', (Lift, Direction)),  # lid, intention
+    ('CLOSE', (Lift, )),  # lid
+)
+MESSAGE_SCHEMA = (
+    ('WORLD', (str, )),  # JSON object
+    ('TURN', (int, )),  # turn number
+    ('READY', ()),
+    ('LIFT_CALL', (Floor, Direction)),  # floor number, direction
+    ('FLOOR_REQUEST', (Lift, Floor)),  # lid, floor number
+    ('TRANSIT', (Lift, Floor)),  # lid, floor number
+    ('ARRIVED', (Lift, Floor)),  # lid, floor number
+    ('ERROR', (str, )),  # explanation
+    ('END', ()),
+    ('STATS', (str, )),  # JSON object
+    # lid, first and last floor numbers, seconds
+    ('TRANSITS', (Lift, Floor, Floor, float)),
 )
+COMMANDS = dict(COMMAND_SCHEMA)
+MESSAGE_STRINGS = tuple(name for name, _ in MESSAGE_SCHEMA)
 MESSAGE_TO_STRING = {getattr(Message, m.lower()): m for m in MESSAGE_STRINGS}
 STRING_TO_COMMAND = {c: getattr(Command, c.lower()) for c in COMMANDS}
+DIRECTION_TO_STRING = {
+    Direction.up: 'UP',
+    Direction.down: 'DOWN',
+    Direction.none: '-',
+}
+# Directions are also accepted by name (e.g. `NONE`)
+STRING_TO_DIRECTION = {d.name.upper(): d for d in Direction}
+STRING_TO_DIRECTION.update({s: d for d, s in DIRECTION_TO_STRING.items()})
+ERROR_STRINGS = {
+    'error.destination.out_of_boundaries': 'Destination out of lift shaft',
+    'error.destination.conflicting_direction': 'Destination behind the lift',
+    'error.goto.doors_are_open': 'Cannot move with open doors',
+    'error.goto.already_there': 'Lift already at destination',
+    'error.open.still_moving': 'Cannot open doors while moving',
+    'error.open.already_open': 'Doors already open',
+    'error.close.already_closed': 'Doors already closed',
+}
+POLL_INTERVAL = 0.001  # in seconds
+# Options of the protocol, which clients ask for at hand-shake (e.g. `READY
+# FRAMED`): in framed mode, blocks of lines are preceded by `FRAME <size in
+# bytes>`, in binary mode records replace lines (see the `binary` module), in
+# coalescing mode the floors a lift transits through at once are reported by a
+# single TRANSITS, instead of a TRANSIT each
+PROTOCOL_OPTIONS = {'FRAMED': 'start_framing', 'BINARY': 'start_binary',
+                    'COALESCE': 'start_coalescing'}
+# Messages reporting events, which clients may do without, and the events and
+# handlers relaying them
+SUBSCRIBABLE = {
+    'LIFT_CALL': ('floor.call', 'on_floor_call'),
+    'FLOOR_REQUEST': ('lift.floor_request', 'on_floor_request'),
+    'TRANSIT': ('lift.transit', 'on_transit'),
+    'ARRIVED': ('lift.arrive', 'on_arrive'),
+}
+# Options taking a list of values (e.g. `READY SUBSCRIBE=LIFT_CALL,ARRIVED
+# LIFTS=main`): the messages the client wants, and the lifts it wants messages
+# about (all of them by default).  Values other than lift ids must be in the
+# set given, if any.
+PROTOCOL_SETTINGS = {
+    'SUBSCRIBE': ('subscribe', SUBSCRIBABLE),
+    'LIFTS': ('filter_lifts', None),
+}
+FRAME = 'FRAME'
+
+
+def format_message(message, entity=None, *args):
+    '''Return a message as a line of the text protocol.'''
+    bits = [MESSAGE_TO_STRING[message]]
+    if entity is not None:
+        bits.append(entity)
+    bits += args
+    return ' '.join(map(str, bits))
+
+
+def asks_for_binary(line):
+    '''Return True if a line is a READY asking for the binary protocol.'''
+    bits = line.upper().split()
+    return bits[:1] == ['READY'] and 'BINARY' in bits[1:]
+
+
+def parse_options(bits):
+    '''Return the protocol options of a READY line, None if any is invalid.
+
+    Options are returned as (method name, arguments) pairs.
+    '''
+    calls = []
+    for bit in bits:
+        name, equal, value = bit.partition('=')
+        name = name.upper()
+        if not equal and name in PROTOCOL_OPTIONS:
+            calls.append((PROTOCOL_OPTIONS[name], ()))
+            continue
+        if not value or name not in PROTOCOL_SETTINGS:
+            return None
+        method, allowed = PROTOCOL_SETTINGS[name]
+        values = tuple(value.split(','))
+        if allowed is not None:
+            values = tuple(value.upper() for value in values)
+            if not all(value in allowed for value in values):
+                return None
+        calls.append((method, values))
+    return calls
+
+
+def block_size(line):
+    '''Return the size of the block a line announces, None if it does not.'''
+    if not line.startswith(FRAME + ' '):
+        return None
+    try:
+        return int(line[len(FRAME) + 1:])
+    except ValueError:
+        return None
+
+
+class CommandParser:
+
+    '''
+    Parse the lines of the text protocol to commands.
+
+    The dispatch table is built once from `COMMANDS`, with a converter per
+    parameter.  Lifts and floors are resolved through dictionaries keyed by
+    the very strings clients send, built from the `lifts` and `floors` of the
+    world: the parser of a world cannot be used for another one.
+
+    Arguments:
+        lifts: the lifts of the world
+        floors: the floors of the world
+    '''
+
+    def __init__(self, lifts, floors):
+        converters = {Lift: self.lift, Floor: self.floor,
+                      Direction: self.direction}
+        self.commands = {}
+        for name, ptypes in COMMANDS.items():
+            entry = (STRING_TO_COMMAND[name],
+                     tuple(converters[type_] for type_ in ptypes))
+            self.commands[name] = self.commands[name.lower()] = entry
+        self._directions = dict(STRING_TO_DIRECTION)
+        self._directions.update(
+            {name.lower(): dir_ for name, dir_ in STRING_TO_DIRECTION.items()})
+        self._lifts = {str(lift.id): lift for lift in lifts}
+        self._floors = {str(floor.level): floor for floor in floors}
+
+    def lift(self, bit):
+        '''Return the lift named `bit`, None if there is none.'''
+        return self._lifts.get(bit)
+
+    def floor(self, bit):
+        '''Return the floor numbered `bit`, None if there is none.'''
+        floor = self._floors.get(bit)
+        if floor is None:
+            # Numbers not written the usual way (e.g. `+3` or `03`)
+            try:
+                floor = self._floors.get(str(int(bit)))
+            except ValueError:
+                return None
+        return floor
+
+    def direction(self, bit):
+        '''Return the direction named `bit`, None if there is none.'''
+        direction = self._directions.get(bit)
+        if direction is None:
+            direction = STRING_TO_DIRECTION.get(bit.upper())
+        return direction
+
+    def parse(self, bits, line):
+        '''Return the payload of the split `line`, raise ValueError if invalid.
+
+        The payload is a list: the command, then its parameters.
+        '''
+        if not bits:
+            raise ValueError('Empty line')
+        entry = self.commands.get(bits[0])
+        if entry is None:
+            name = bits[0].upper()
+            entry = self.commands.get(name)
+            if entry is None:
+                raise ValueError('Unknown command "{}"'.format(name))
+        command, converters = entry
+        if len(bits) - 1 != len(converters):
+            raise ValueError(
+                'Wrong number of parameters for "{}"'.format(line))
+        payload = [command]
+        for convert, bit in zip(converters, bits[1:]):
+            value = convert(bit)
+            if value is None:
+                raise ValueError('Invalid parameters for "{}"'.format(line))
+            payload.append(value)
+        return payload
+
+    def parse_block(self, block):
+        '''Return the lines of a command block, each with its payload.
+
+        Lines that are not valid commands come with the ValueError raised
+        parsing them instead.
+        '''
+        parsed = []
+        for line in block.splitlines():
+            line = line.strip()
+            try:
+                payload = self.parse(line.split(), line)
+            except ValueError as error:
+                payload = error
+            parsed.append((line, payload))
+        return parsed
 
 
 class FileInterface(Actor):
@@ -40,6 +234,23 @@ class FileInterface(Actor):
         directory: the directory where to create the input/output files
     '''
     msg_components = ('command', 'lift', 'floor')
+    # If set, the journal recording every line sent and received
+    journal = None
+    # In framed and binary modes, the messages of a turn are sent all at once
+    framed = False
+    codec = None  # The binary codec, in binary mode
+    # In coalescing mode, the floors a lift transits through in a row are
+    # reported at once
+    coalesce = False
+    # The messages the client subscribed to, and the lifts it wants messages
+    # about (None for all of them)
+    subscriptions = None
+    lift_filter = None
+    # Options can only be negotiated until the client has sent READY
+    handshaken = False
+    _frame = ()
+    _block = ()  # The lines of a command block still to be read
+    _parser = None
 
     def __init__(self, directory):
         super().__init__()
@@ -53,6 +264,37 @@ class FileInterface(Actor):
         self.fin = open(self.in_name, 'r')
         self.fout = open(self.out_name, 'w')
 
+    def plug(self):
+        '''Add the actor's methods and error reporters to the registry.'''
+        if self.is_plugged:
+            return
+        super().plug()
+        self._reporters = {}
+        for message, text in ERROR_STRINGS.items():
+            reporter = partial(self.send_message, Message.error, text)
+            self._reporters[message] = reporter
+            simpleactors.global_callbacks[message].add(reporter)
+        self._mute()
+
+    def _mute(self):
+        '''Relay only the events the client has subscribed to.'''
+        if self.subscriptions is None:
+            return
+        callbacks = simpleactors.global_callbacks
+        for name, (event, handler) in SUBSCRIBABLE.items():
+            if name in self.subscriptions:
+                callbacks[event].add(getattr(self, handler))
+            else:
+                callbacks[event].discard(getattr(self, handler))
+
+    def unplug(self):
+        '''Remove the actor's methods and error reporters from the registry.'''
+        if not self.is_plugged:
+            return
+        super().unplug()
+        for message, reporter in self._reporters.items():
+            simpleactors.global_callbacks[message].discard(reporter)
+
     def cleanup(self):
         for fname in (self.in_name, self.out_name):
             try:
@@ -61,55 +303,180 @@ class FileInterface(Actor):
                 pass
 
     def read(self):
+        if self._block:
+            return self._block.popleft()
         bookmark = self.fin.tell()
+        if self.codec is not None:
+            record = self.fin.read(self.codec.size)
+            if len(record) == self.codec.size:
+                return record
+            self.fin.seek(bookmark)
+            return None
         line = self.fin.readline()
-        if line:
+        if not line:
+            self.fin.seek(bookmark)
+            return None
+        size = block_size(line)
+        if size is None:
             return line.strip()  # Takes care of empty lines
-        self.fin.seek(bookmark)
+        block = self.fin.read(size)
+        if len(block) < size:  # Not completely written yet
+            self.fin.seek(bookmark)
+            return None
+        self.unpack_block(block)
+        return self.read()
+
+    def unpack_block(self, block):
+        '''Parse a command block, and queue its lines to be read one by one.
+
+        The lines are queued with their payload (see `process_line`).
+        '''
+        self._block = deque(self.command_parser().parse_block(block))
 
     def write(self, line):
         print(line.strip(), file=self.fout, flush=True)
 
-    def process_line(self, line):
-        '''Parse and validate a received line, return None for failures.'''
-        bits = line.split()
-        # Empty line
-        if not bits:
-            self.send_message(Message.error, 'Empty line')
-            return
-        # Unknown command
-        command = bits.pop(0).upper()
-        if command not in COMMANDS:
-            msg = 'Unknown command "{}"'.format(command)
-            self.send_message(Message.error, msg)
+    def write_bytes(self, data):
+        self.fout.write(data)
+        self.fout.flush()
+
+    def start_framing(self):
+        '''Send the messages of each turn as a single frame, from now on.'''
+        self.framed = True
+        self._frame = []
+
+    def start_coalescing(self):
+        '''Report consecutive transits with a single TRANSITS, from now on.'''
+        self.coalesce = True
+
+    def subscribe(self, *names):
+        '''Only relay the events of the messages `names`, from now on.'''
+        self.subscriptions = frozenset(names)
+        if self.is_plugged:
+            self._mute()
+
+    def filter_lifts(self, *lift_ids):
+        '''Only relay the events of the lifts `lift_ids`, from now on.
+
+        Ids are those clients send, matched with the lifts of the world as in
+        commands: the unknown ones are reported with an ERROR, and ignored.
+        '''
+        parser = self.command_parser()
+        lifts = [parser.lift(str(lid)) for lid in lift_ids]
+        unknown = [str(lid) for lid, lift in zip(lift_ids, lifts)
+                   if lift is None]
+        if unknown:
+            self.send_message(Message.error,
+                              'Unknown lifts: {}'.format(', '.join(unknown)))
+        self.lift_filter = frozenset(lift.id for lift in lifts
+                                     if lift is not None)
+
+    def start_binary(self):
+        '''Exchange binary records rather than lines, from now on.'''
+        from .binary import BinaryCodec
+        self.codec = BinaryCodec(simpleactors.global_actors_by_id[Lift])
+        self._frame = []
+        self.open_binary()
+
+    def open_binary(self):
+        '''Get ready to read and write bytes rather than text.'''
+        # Text files know their position in bytes, as long as they are not
+        # in the middle of a multi-byte character
+        position = self.fin.tell()
+        self.fin.close()
+        self.fin = open(self.in_name, 'rb')
+        self.fin.seek(position)
+        self.fout.close()
+        self.fout = open(self.out_name, 'ab')
+
+    def flush(self):
+        '''Send the messages of the current frame, if any.'''
+        if not self._frame:
             return
-        # Wrong number of parameters
-        ptypes = COMMANDS[command]
-        if len(bits) != len(ptypes):
-            msg = 'Wrong number of parameters for "{}"'.format(line)
-            self.send_message(Message.error, msg)
+        if self.codec is not None:
+            data = b''.join(self._frame)
+            self._frame = []
+            self.write_bytes(data)
             return
-        # Parse the parameters to objects
-        new_bits = []
-        for bit, type_ in zip(bits, ptypes):
-            if type_ in (Floor, Lift):
-                if type_ is Floor:
-                    try:
-                        bit = int(bit)
-                    except ValueError:
-                        bit = None
-                new_bits.append(get_by_id(type_, bit))
-            if type_ is Direction:
-                try:
-                    new_bits.append(getattr(Direction, bit.lower()))
-                except AttributeError:
-                    new_bits.append(None)
-        # Wrong types of parameters
-        if None in new_bits:
-            msg = 'Invalid parameters for "{}"'.format(line)
+        payload = '\n'.join(self._frame) + '\n'
+        self._frame = []
+        self.write('{} {}\n{}'.format(FRAME, len(payload.encode('utf-8')),
+                                     payload))
+
+    def wait(self, timeout):
+        '''Wait at most `timeout` seconds for lines from the client.
+
+        Regular files cannot be waited on: they are polled.
+        '''
+        sleep(max(min(timeout, POLL_INTERVAL), 0))
+
+    def close(self):
+        '''Release the resources used to talk to the client.'''
+        self.fin.close()
+        self.fout.close()
+
+    def command_parser(self):
+        '''Return the parser of the lines received, built when first needed.
+
+        The world is complete by then: clients only send commands once they
+        got its description.
+        '''
+        if self._parser is None:
+            actors = simpleactors.global_actors_by_id
+            self._parser = CommandParser(actors[Lift].values(),
+                                         actors[Floor].values())
+        return self._parser
+
+    def process_line(self, line):
+        '''Parse and validate a received line, return None for failures.
+
+        The lines of command blocks come parsed already, as (line, payload)
+        pairs (see `CommandParser.parse_block`).
+        '''
+        if isinstance(line, bytes):
+            return self.process_record(line)
+        if isinstance(line, tuple):
+            line, payload = line
+        else:
+            try:
+                payload = self.command_parser().parse(line.split(), line)
+            except ValueError as error:
+                payload = error
+        if self.journal is not None:
+            self.journal.command(line)
+        if isinstance(payload, ValueError):
+            bits = line.split()
+            # Negotiation of the options of the protocol, at hand-shake only
+            if len(bits) > 1 and bits[0].upper() == 'READY':
+                options = parse_options(bits[1:])
+                if options is not None:
+                    return self.negotiate(options)
+            self.send_message(Message.error, str(payload))
+            return None
+        if payload[0] is Command.ready:
+            self.handshaken = True
+        return payload
+
+    def negotiate(self, options):
+        '''Apply the protocol `options` of a READY, if it is the first one.'''
+        if self.handshaken:
+            self.send_message(Message.error,
+                              'Options can only be set with the first READY')
+            return [Command.ready]
+        for method, args in options:
+            getattr(self, method)(*args)
+        self.handshaken = True
+        return [Command.ready]
+
+    def process_record(self, record):
+        '''Decode and validate a received record, return None for failures.'''
+        if self.journal is not None:
+            self.journal.command(self.codec.render(record))
+        payload = self.codec.decode(record)
+        if payload is None:
+            msg = 'Invalid record "{}"'.format(self.codec.render(record))
             self.send_message(Message.error, msg)
-            return
-        return [STRING_TO_COMMAND[command]] + new_bits
+        return payload
 
     def get_commands(self):
         while True:
@@ -121,9 +488,85 @@ class FileInterface(Actor):
                 continue
             yield payload
 
-    def send_message(self, message, entity, *args):
-        bits = [MESSAGE_TO_STRING[message]]
-        if entity:
-            bits.append(entity)
-        bits += args
-        self.write(' '.join(map(str, bits)))
+    def get_turn_commands(self, timeout):
+        '''Return the commands of a turn, as soon as the client sends READY.
+
+        If the client does not conclude its turn within `timeout` seconds,
+        whatever has been received so far is returned.
+        '''
+        commands = []
+        deadline = time() + timeout
+        while True:
+            line = self.read()
+            if line is None:  # end of file
+                remaining = deadline - time()
+                if remaining < 0:
+                    break
+                self.wait(remaining)
+                continue
+            payload = self.process_line(line)
+            if payload is None:  # invalid line
+                continue
+            if payload[0] is Command.ready:
+                break
+            commands.append(payload)
+        return commands
+
+    def send_message(self, message, entity=None, *args):
+        if self.codec is not None:
+            if self.journal is not None:
+                self.journal.message(format_message(message, entity, *args))
+            self._frame.append(self.codec.encode(message, entity, *args))
+            if message is Message.ready:
+                self.flush()
+            return
+        line = format_message(message, entity, *args)
+        if self.journal is not None:
+            self.journal.message(line)
+        if not self.framed:
+            self.write(line)
+            return
+        self._frame.append(line)
+        if message is Message.ready:
+            self.flush()
+
+    @on('floor.call')
+    def on_floor_call(self, floor, direction):
+        '''Relay a call button being pressed.'''
+        self.send_message(Message.lift_call, floor.level,
+                          DIRECTION_TO_STRING[direction])
+
+    @on('lift.floor_request')
+    def on_floor_request(self, lift, floor):
+        '''Relay a floor button being pressed inside a lift.'''
+        if self.lift_filter is not None and lift.id not in self.lift_filter:
+            return
+        self.send_message(Message.floor_request, lift.id, floor.level)
+
+    @on('lift.transit')
+    def on_transit(self, lift, floor, start=None):
+        '''Relay a lift transiting through floors, one TRANSIT per floor.
+
+        Clients in coalescing mode get a single TRANSITS instead, with the
+        first and the last floors transited, and the seconds it took.
+        '''
+        if self.lift_filter is not None and lift.id not in self.lift_filter:
+            return
+        if self.coalesce:
+            first = floor if start is None else start
+            seconds = (abs(floor.level - first.level) + 1) * lift.transit_time
+            self.send_message(Message.transits, lift.id, first.level,
+                              floor.level, seconds)
+            return
+        if start is not None:
+            step = 1 if floor.level > start.level else -1
+            for level in range(start.level, floor.level, step):
+                self.send_message(Message.transit, lift.id, level)
+        self.send_message(Message.transit, lift.id, floor.level)
+
+    @on('lift.arrive')
+    def on_arrive(self, lift, floor):
+        '''Relay a lift arriving at its destination.'''
+        if self.lift_filter is not None and lift.id not in self.lift_filter:
+            return
+        self.send_message(Message.arrived, lift.id, floor.level)
@@ -0,0 +1,267 @@
+'''
+A binary journal of the conversation between the engine and a client.
+
+The journal starts with a header holding everything needed to rebuild the
+simulation (its expanded description and the state of its RNG), followed by
+every message sent by the engine and every line received from the client, in
+the order they happened.  Replaying a journal feeds the recorded client lines
+back to the engine, without the client and without waiting, and checks that
+the engine still says what it said.
+
+File layout: `MAGIC`, a flags byte, then a stream (zlib-compressed if the
+`COMPRESSED` flag is set) of records, each made of a kind byte, the length of
+the payload as a little-endian uint32 and the payload.  The payload of the
+header is marshalled, the one of messages and commands is UTF-8 text.
+'''
+import json
+import marshal
+import struct
+import zlib
+from collections import deque
+from itertools import zip_longest
+
+from simpleactors import Actor
+
+from .common import log
+from .interface import FileInterface
+
+MAGIC = b'LIFTSJ\x01'
+COMPRESSED = 0x01
+HEADER, MESSAGE, COMMAND = b'H', b'M', b'C'
+RECORD = struct.Struct('<cI')
+# Compressed data is flushed to disk every so many turns, so that the journal
+# of a crashed simulation can still be replayed up to that point
+FLUSH_EVERY = 64  # turns
+READ_SIZE = 1 << 16
+
+
+class JournalWriter:
+
+    '''
+    Write a journal file.
+
+    Arguments:
+        fname: the name of the journal file
+        header: the data needed to rebuild the simulation
+        compress: if True, compress the records with zlib
+    '''
+
+    def __init__(self, fname, header, compress=True):
+        self.file = open(fname, 'wb')
+        self.file.write(MAGIC + bytes([COMPRESSED if compress else 0]))
+        self._compressor = zlib.compressobj() if compress else None
+        self._turns = 0
+        self._write(HEADER, marshal.dumps(header))
+
+    def _write(self, kind, payload):
+        data = RECORD.pack(kind, len(payload)) + payload
+        if self._compressor is not None:
+            data = self._compressor.compress(data)
+        self.file.write(data)
+
+    def message(self, line):
+        '''Record a line sent by the engine.'''
+        self._write(MESSAGE, line.encode('utf-8'))
+        if line.startswith('TURN '):
+            self._turns += 1
+            if not self._turns % FLUSH_EVERY:
+                self.flush()
+
+    def command(self, line):
+        '''Record a line received from the client.'''
+        self._write(COMMAND, line.encode('utf-8'))
+
+    def flush(self):
+        if self._compressor is not None:
+            self.file.write(self._compressor.flush(zlib.Z_SYNC_FLUSH))
+        self.file.flush()
+
+    def close(self):
+        if self.file.closed:
+            return
+        if self._compressor is not None:
+            self.file.write(self._compressor.flush())
+        self.file.close()
+
+
+def _chunks(file_, decompressor):
+    '''Yield the (decompressed) content of a file, a chunk at a time.'''
+    while True:
+        data = file_.read(READ_SIZE)
+        if not data:
+            break
+        yield decompressor.decompress(data) if decompressor else data
+    if decompressor:
+        yield decompressor.flush()
+
+
+def read_journal(fname):
+    '''Return the header of a journal and an iterator on its records.
+
+    Records are (kind, line) pairs, kind being `MESSAGE` or `COMMAND`.  A
+    truncated journal yields the records that were completely written.
+    '''
+    file_ = open(fname, 'rb')
+    if file_.read(len(MAGIC)) != MAGIC:
+        file_.close()
+        raise ValueError('{} is not a lifts journal'.format(fname))
+    flags = file_.read(1)[0]
+    decompressor = zlib.decompressobj() if flags & COMPRESSED else None
+    chunks = _chunks(file_, decompressor)
+    buffer = bytearray()
+
+    def next_record():
+        while len(buffer) >= RECORD.size:
+            kind, size = RECORD.unpack_from(buffer)
+            end = RECORD.size + size
+            if len(buffer) >= end:
+                payload = bytes(buffer[RECORD.size:end])
+                del buffer[:end]
+                return kind, payload
+            break
+        for chunk in chunks:
+            buffer.extend(chunk)
+            return next_record()
+        return None
+
+    def records():
+        try:
+            while True:
+                record = next_record()
+                if record is None:
+                    return
+                yield record[0], record[1].decode('utf-8')
+        finally:
+            file_.close()
+
+    header = next_record()
+    if header is None or header[0] != HEADER:
+        file_.close()
+        raise ValueError('{} has no header'.format(fname))
+    return marshal.loads(header[1]), records()
+
+
+def by_turn(records):
+    '''Return the commands and messages of the journal, turn by turn.
+
+    Turn 0 is the hand-shake, before the first TURN message.
+    '''
+    commands, messages = [deque()], [[]]
+    for kind, line in records:
+        if kind == COMMAND:
+            commands[-1].append(line)
+            continue
+        if line.startswith('TURN '):
+            commands.append(deque())
+            messages.append([])
+        messages[-1].append(line)
+    return commands, messages
+
+
+class ReplayInterface(FileInterface):
+
+    '''
+    An in-process interface, playing back the client lines of a journal.
+
+    Lines are given to the engine during the same turn they were received in
+    the recorded run, and the lines the engine sends are kept, turn by turn,
+    for comparison.
+
+    Arguments:
+        commands: the client lines, turn by turn
+    '''
+
+    def __init__(self, commands):
+        Actor.__init__(self)
+        self.commands = commands
+        self.messages = [[]]
+        # The hand-shake ends with the first READY: what follows it belongs
+        # to the first turn, and must not be read while checking the client
+        self._handshaken = False
+        self._hold = False
+
+    def cleanup(self):
+        pass
+
+    @property
+    def turn(self):
+        return len(self.messages) - 1
+
+    def write(self, line):
+        if line.startswith('TURN '):
+            self.messages.append([])
+        self.messages[-1].append(line)
+
+    def read(self):
+        if self._hold:
+            self._hold = False
+            return None
+        if self.turn >= len(self.commands) or not self.commands[self.turn]:
+            return None
+        line = self.commands[self.turn].popleft()
+        if not self._handshaken and line.strip().upper() == 'READY':
+            self._handshaken = self._hold = True
+        return line
+
+    def start_framing(self):
+        # Messages are compared line by line: they are never framed
+        pass
+
+    def start_binary(self):
+        # Nor encoded, the journal holding the client lines in text
+        pass
+
+    def get_turn_commands(self, timeout):
+        # Whatever the client sent is there already: never wait
+        return super().get_turn_commands(0)
+
+
+def _comparable(line):
+    '''Return a line without what legitimately changes between runs.'''
+    if line.startswith('STATS '):
+        stats = json.loads(line[len('STATS '):])
+        stats.pop('profile', None)  # Timings
+        return stats
+    return line
+
+
+def first_divergence(expected, actual):
+    '''Return (turn, expected line, actual line) of the first difference.
+
+    Messages are lists of lines, turn by turn.  A missing line is None.
+    Return None if the messages are the same.
+    '''
+    turns = max(len(expected), len(actual))
+    expected = expected + [[]] * (turns - len(expected))
+    actual = actual + [[]] * (turns - len(actual))
+    for turn, (old, new) in enumerate(zip(expected, actual)):
+        for old_line, new_line in zip_longest(old, new):
+            if old_line is None or new_line is None or \
+                    _comparable(old_line) != _comparable(new_line):
+                return turn, old_line, new_line
+
+
+def replay(fname):
+    '''Replay a journal, and return the simulation and the first divergence.
+
+    The simulation runs at full speed: real time runs are not paced, and
+    the client lines are all there already.  The divergence, if any, is a
+    (turn, recorded line, replayed line) triple.
+    '''
+    # Imported here, as the simulation records journals
+    from .simulation import Simulation
+    header, records = read_journal(fname)
+    commands, messages = by_turn(records)
+    simulation = Simulation(
+        None, description=header['description'],
+        fast_forward=header['fast_forward'],
+        interface_class=lambda directory: ReplayInterface(commands),
+        stats_every=header['stats_every'])
+    simulation.rng.setstate(header['rng_state'])
+    simulation.paced = False
+    simulation.run()
+    divergence = first_divergence(messages, simulation.interface.messages)
+    if divergence is not None:
+        log.warning('Replay diverges at turn {}: {!r} became {!r}',
+                    *divergence)
+    return simulation, divergence
@@ -1,6 +1,8 @@
 from simpleactors import on
 
-from .common import LiftsActor, Direction
+from .common import LiftsActor, Direction, on_target
+
+TIME_EPSILON = 1e-9  # in seconds
 
 
 class Lift(LiftsActor):
@@ -20,10 +22,14 @@ class Lift(LiftsActor):
         floor (Floor): floor where the lift currently is
     '''
 
+    __slots__ = ('capacity', 'transit_time', 'accel_time',
+                 'bottom_floor_number', 'top_floor_number', 'location',
+                 'destination', 'passengers', 'load', 'open_doors', 'intent',
+                 '_carry_seconds', '_shaft')
+
     def __init__(self, description, location, open_doors=False):
-        super().__init__()
+        super().__init__(uid=description['lid'])
         # Lift description
-        self.id = description['lid']
         self.capacity = description['capacity']
         self.transit_time = description['transit_time']
         self.accel_time = description['accel_time']
@@ -50,11 +56,14 @@ class Lift(LiftsActor):
         # Lift status
         self.location = location
         self.destination = None
-        self.passengers = set()
+        # destination floor -> people heading there, in boarding order
+        self.passengers = {}
+        self.load = 0
         self.open_doors = open_doors
         self.intent = None
         # Movement tracking
         self._carry_seconds = 0
+        self._shaft = None  # The floors the lift can reach, once first needed
 
     def __str__(self):
         return 'Lift: {}'.format(self.id)
@@ -77,7 +86,7 @@ class Lift(LiftsActor):
     @property
     def full(self):
         '''Ruturn True if the lift has reached maximum capacity.'''
-        return len(self.passengers) == self.capacity
+        return self.load >= self.capacity
 
     @property
     def is_moving(self):
@@ -95,11 +104,9 @@ class Lift(LiftsActor):
             return Direction.up
         return Direction.down
 
-    @on('command.goto')
-    def goto(self, lift, destination):
+    @on_target('command.goto')
+    def goto(self, destination):
         '''Process the `goto` command.'''
-        if self is not lift:
-            return
         # Refuse to go over the top or below bottom
         dest_num = destination.numeric_location
         if not self.bottom_floor_number <= dest_num <= self.top_floor_number:
@@ -117,17 +124,17 @@ class Lift(LiftsActor):
         # Refuse to move with open doors
         if self.open_doors:
             self.emit('error.goto.doors_are_open')
+            return
         # Error if lift already still at destination
         if self.location == destination and self.direction is Direction.none:
             self.emit('error.goto.already_there')
+            return
         # If you made it till here... update the destination!
         self.destination = destination
 
-    @on('command.open')
-    def open(self, lift, intent=None):
+    @on_target('command.open')
+    def open(self, intent=None):
         '''Process the `open` command.'''
-        if self is not lift:
-            return
         if self.is_moving:
             self.emit('error.open.still_moving')
             return
@@ -136,26 +143,62 @@ class Lift(LiftsActor):
             return
         self.open_doors = True
         self.intent = intent  # This is the "promised" direction of travel
-        self.emit('lift.open')
-
-    @on('command.close')
-    def close(self, lift):
+        # Passengers get the chance to step off before people board
+        self.emit_to(self, 'lift.open')
+        self.emit_to(self.location, 'lift.open', self)
+
+    def add_passenger(self, person):
+        '''Take a person onboard.'''
+        if person.destination not in self.passengers:
+            self.emit('lift.floor_request', self, floor=person.destination)
+        self.passengers.setdefault(person.destination, []).append(person)
+        self.load += 1
+
+    @on_target('lift.open')
+    def unload(self):
+        '''Let off the passengers that should, one destination at a time.
+
+        People sharing a destination share the decision too, so only who
+        actually steps off costs anything.
+        '''
+        for destination in list(self.passengers):
+            group = self.passengers[destination]
+            if not group[0]._should_get_off(self):
+                continue
+            del self.passengers[destination]
+            self.load -= len(group)
+            for person in group:
+                person.alight(self)
+
+    @on_target('command.close')
+    def close(self):
         '''Process the `close doors` command.'''
-        if self is not lift:
-            return
         if self.open_doors is False:
             self.emit('error.close.already_closed')
             return
         self.open_doors = False
         self.intent = None  # Reset any promise of direction
-        self.emit('lift.close')
+        self.emit_to(self.location, 'lift.close', self)
 
     def arrive(self):
         '''Update lift status on arrival to destination.'''
-        self.emit('lift.arrive', floor=self.destination)
+        self.emit('lift.arrive', self, floor=self.destination)
+        self.location = self.destination
         self._carry_seconds = 0
         self.destination = None
 
+    @property
+    def seconds_to_next_stage(self):
+        '''Return the seconds before the lift transits or arrives at a floor.
+
+        None is returned for a lift that is not travelling.
+        '''
+        if self.destination is None:
+            return None
+        decel = self.destination in (self.location.above, self.location.below)
+        threshold = self.accel_time if decel else self.transit_time
+        return max(threshold - self._carry_seconds, 0)
+
     @on('turn.start')
     def take_turn(self, duration):
         '''Process a `turn.start` signal.'''
@@ -164,20 +207,44 @@ class Lift(LiftsActor):
         self._carry_seconds += duration
         self.consume_seconds()
 
+    def floor_at(self, number):
+        '''Return the floor numbered `number`, within the shaft of the lift.'''
+        if self._shaft is None:
+            # The floors the lift can reach, from the bottom one
+            floor = self.location
+            while floor.numeric_location > self.bottom_floor_number:
+                floor = floor.below
+            shaft = []
+            while floor is not None and \
+                    floor.numeric_location <= self.top_floor_number:
+                shaft.append(floor)
+                floor = floor.above
+            self._shaft = shaft
+        return self._shaft[number - self.bottom_floor_number]
+
     def consume_seconds(self):
-        '''Perform all actions for a turn of `duration` seconds.'''
-        destination = self.destination
-        while self._carry_seconds > self.transit_time:
-            decel = destination in (self.location.above, self.location.below)
-            # The lift is about to stop
-            if decel:
-                if self._carry_seconds > self.accel_time:
-                    self.arrive()
-                break
-            # The lift is just moving
-            self._carry_seconds -= self.transit_time
-            if self.direction is Direction.down:
-                self.location = self.location.below
+        '''Move the lift by as many floors as the seconds carried allow.
+
+        The floors transited are not walked one by one, but computed at once:
+        a single `lift.transit` is emitted for the floor reached, telling the
+        first floor transited as `start` when there are more than one.
+        '''
+        here = self.location.numeric_location
+        distance = abs(self.destination.numeric_location - here)
+        # Seconds are compared with some slack, so that summing the exact
+        # delay to the next stage is guaranteed to reach it.  The last floor
+        # before the destination is where the lift starts to stop.
+        hops = int((self._carry_seconds + TIME_EPSILON) // self.transit_time)
+        hops = min(hops, distance - 1)
+        if hops > 0:
+            step = -1 if self.direction is Direction.down else 1
+            self._carry_seconds -= hops * self.transit_time
+            self.location = self.floor_at(here + step * hops)
+            if hops == 1:
+                self.emit('lift.transit', self, floor=self.location)
             else:
-                self.location = self.location.above
-            self.emit('lift.transit', floor=self.location)
+                self.emit('lift.transit', self, floor=self.location,
+                          start=self.floor_at(here + step))
+        if hops == distance - 1 and \
+                self._carry_seconds + TIME_EPSILON >= self.accel_time:
+            self.arrive()
@@ -1,4 +1,4 @@
-from simpleactors import on, KILL
+from simpleactors import KILL
 
 from .common import Direction, LiftsActor
 
@@ -11,17 +11,19 @@ class Person(LiftsActor):
     destroyed as soon as the person reaches it's destination
 
     Arguments:
-        pid: a human-friendly identifier for the person (string)
+        pid: the number of the person, in order of arrival
         location: the current position of the person (normally a floor, but
             could as well be a lift, although it makes no sense)
         destination: the final destination of the person (floor)
     '''
 
+    __slots__ = ('location', 'destination')
+
     def __init__(self, pid, location, destination):
-        super().__init__()
-        self.id = pid
+        super().__init__(uid=pid)
         self.location = location
         self.destination = destination
+        self.emit('person.enter', self)
         if self.location == self.destination:
             self.arrive()
         else:
@@ -54,29 +56,27 @@ class Person(LiftsActor):
             return True
         return False
 
-    @on('lift.open')
-    def on_lift_open(self, message, lift):
-        '''Take action if a lift opens neraby.'''
-        if self.location == lift:
-            if self._should_get_off(lift):
-                self.emit('person.lift.off', lift)
-                self.location = lift.location
-                lift.passengers.remove(self)
-                if self.location != self.destination:
-                    self.call_lift()
-            if lift.location == self.destination:
-                self.arrive()
-        if self.location == lift.location:
-            if self._should_get_on(lift):
-                lift.passengers.add(self)
-                self.location = lift
-                self.emit('person.lift.on', lift)
+    def board(self, lift):
+        '''Step into a lift.'''
+        lift.add_passenger(self)
+        self.location = lift
+        self.emit('person.lift.on', self, lift)
+
+    def alight(self, lift):
+        '''Step off a lift, at the floor where it currently is.'''
+        self.emit('person.lift.off', self, lift)
+        self.location = lift.location
+        if self.location == self.destination:
+            self.arrive()
+        else:
+            self.call_lift()
 
     def call_lift(self):
         '''Call a lift at the present floor.'''
-        self.emit('person.lift.call', direction=self.compass)
+        self.emit_to(self.location, 'person.lift.call', self,
+                     direction=self.compass)
 
     def arrive(self):
         '''Update status upon arrival.'''
-        self.emit('person.arrived')
+        self.emit('person.arrived', self)
         self.emit(KILL, self)
@@ -0,0 +1,213 @@
+'''
+A population stored as a struct of NumPy arrays.
+
+Rather than having one actor per person, each attribute of the population is
+a column, and all the people concerned by a lift opening are processed in a
+single vectorised pass, following the same rules as `Person`.  This trades the
+flexibility of individual actors for the ability to simulate millions of
+people.
+'''
+from functools import partial
+
+import numpy as np
+from simpleactors import Actor
+
+from .common import Direction, post, subscribe, unsubscribe
+
+# The possible states of a person
+PENDING, WAITING, RIDING, ARRIVED = range(4)
+DIRECTION_TO_SIGN = {Direction.up: 1, Direction.down: -1, Direction.none: 0}
+SIGN_TO_DIRECTION = {sign: dir_ for dir_, sign in DIRECTION_TO_SIGN.items()}
+# The columns of the population: name, type and value of a free row
+COLUMNS = (('location', np.int32, 0), ('destination', np.int32, 0),
+           ('state', np.int8, PENDING), ('spawn_time', float, np.nan),
+           ('board_time', float, np.nan), ('alight_time', float, np.nan))
+# The most rows allocated before anybody has entered
+INITIAL_ROWS = 1024
+
+
+class Population(Actor):
+
+    '''
+    All the people in a simulation, as parallel arrays.
+
+    The `location` of a person is the level of the floor it is at, or the
+    index of the lift it is riding, depending on its `state`.  Times are NaN
+    until the event they track happens; `alight_time` is the last time a
+    person stepped off a lift.
+
+    People take a row when they enter, and give it back when they arrive: the
+    arrays grow with the largest crowd in the building at once, rather than
+    with the whole population.
+
+    Arguments:
+        floors: a dictionary of the floors of the building, by level
+        lifts: the lifts of the building
+        size: the number of people that will enter the simulation
+        clock: a callable returning the current simulation time
+    '''
+
+    def __init__(self, floors, lifts, size, clock):
+        self.floors = floors
+        self.lifts = list(lifts)
+        self._lift_index = {lift: n for n, lift in enumerate(self.lifts)}
+        self.clock = clock
+        self.size = size
+        rows = max(min(size, INITIAL_ROWS), 1)
+        for name, dtype, free in COLUMNS:
+            setattr(self, name, np.full(rows, free, dtype=dtype))
+        self.spawned = 0
+        self.arrived = 0
+        self._free = []  # Rows given back by people who arrived
+        self._used = 0  # Rows ever taken
+        # Indices of the people waiting at each floor (in calling order) and
+        # riding each lift
+        self._waiting = {level: [] for level in floors}
+        self._riders = [[] for _ in self.lifts]
+        self._routes = [('lift.open', floor, self.board)
+                        for floor in floors.values()]
+        self._routes += [('lift.open', lift, partial(self.alight, n))
+                         for n, lift in enumerate(self.lifts)]
+        self._routes.append(('population.call', self, self._call))
+        super().__init__()
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def in_building(self):
+        '''Return the number of people who entered and are not arrived.'''
+        return self.spawned - self.arrived
+
+    def queue_length(self, level):
+        '''Return the number of people waiting at a floor.'''
+        return len(self._waiting[level])
+
+    def plug(self):
+        '''Listen to lifts opening at any floor.'''
+        if self.is_plugged:
+            return
+        super().plug()
+        for route in self._routes:
+            subscribe(*route)
+
+    def unplug(self):
+        '''Stop listening to lifts opening.'''
+        if not self.is_plugged:
+            return
+        super().unplug()
+        for route in self._routes:
+            unsubscribe(*route)
+
+    def _call(self, indices, level):
+        '''Queue people at a floor, and have them call a lift.'''
+        self.state[indices] = WAITING
+        self.location[indices] = level
+        self._waiting[level].extend(indices.tolist())
+        signs = np.unique(np.sign(self.destination[indices] - level))
+        for sign in signs.tolist():
+            self.floors[level].press_button(SIGN_TO_DIRECTION[sign])
+
+    def _arrive(self, indices):
+        '''Mark people as arrived at their destination, free their rows.'''
+        self.state[indices] = ARRIVED
+        self.arrived += len(indices)
+        self.emit('people.arrived', self.clock() - self.spawn_time[indices])
+        self._free.extend(indices.tolist())
+
+    def _take_row(self):
+        '''Return a free row, doubling the arrays if they are all in use.'''
+        if self._free:
+            return self._free.pop()
+        index = self._used
+        self._used += 1
+        rows = len(self.state)
+        if index == rows:
+            for name, dtype, free in COLUMNS:
+                column = np.full(2 * rows, free, dtype=dtype)
+                column[:rows] = getattr(self, name)
+                setattr(self, name, column)
+        return index
+
+    def spawn(self, arrival):
+        '''Have a person enter the simulation, in a free row.'''
+        index = self._take_row()
+        self.spawned += 1
+        self.location[index] = arrival.origin
+        self.destination[index] = arrival.destination
+        self.spawn_time[index] = self.clock()
+        self.board_time[index] = self.alight_time[index] = np.nan
+        indices = np.array([index])
+        if self.location[index] == self.destination[index]:
+            self._arrive(indices)
+        else:
+            self._call(indices, int(self.location[index]))
+
+    def board(self, lift):
+        '''Board the people waiting where `lift` opened, if going its way.'''
+        level = lift.location.numeric_location
+        if not self._waiting[level] or lift.full:
+            return
+        waiting = np.array(self._waiting[level])
+        compass = np.sign(self.destination[waiting] - level)
+        lift_sign = DIRECTION_TO_SIGN[lift.direction]
+        if lift_sign:
+            eligible = compass == lift_sign
+        else:
+            eligible = np.ones(len(waiting), dtype=bool)
+        # Who is eligible boards in calling order, as long as there is room
+        eligible &= np.cumsum(eligible) <= lift.capacity - lift.load
+        boarding = waiting[eligible]
+        if not len(boarding):
+            return
+        self._waiting[level] = waiting[~eligible].tolist()
+        n = self._lift_index[lift]
+        requested = set(self.destination[self._riders[n]].tolist())
+        self.state[boarding] = RIDING
+        self.location[boarding] = n
+        self.board_time[boarding] = self.clock()
+        self._riders[n].extend(boarding.tolist())
+        lift.load += len(boarding)
+        # People wait since they entered or last stepped off a lift
+        waiting_since = np.fmax(self.spawn_time[boarding],
+                                self.alight_time[boarding])
+        self.emit('people.lift.on', lift, self.clock() - waiting_since)
+        for destination in np.unique(self.destination[boarding]).tolist():
+            if destination not in requested:
+                self.emit('lift.floor_request', lift,
+                          floor=self.floors[destination])
+
+    def alight(self, n):
+        '''Let off the people riding the n-th lift that should step off.'''
+        if not self._riders[n]:
+            return
+        lift = self.lifts[n]
+        level = lift.location.numeric_location
+        riders = np.array(self._riders[n])
+        compass = np.sign(self.destination[riders] - level)
+        lift_sign = DIRECTION_TO_SIGN[lift.direction]
+        off = (compass == 0) | (compass != lift_sign)
+        if lift.at_bottom:
+            off |= compass == -1
+        if lift.at_top:
+            off |= compass == 1
+        if not off.any():
+            return
+        self._riders[n] = riders[~off].tolist()
+        leaving = riders[off]
+        # As in a lift, people step off one destination at a time, from the
+        # destination requested first
+        _, first, group = np.unique(self.destination[leaving],
+                                    return_index=True, return_inverse=True)
+        leaving = leaving[np.argsort(first[group], kind='stable')]
+        lift.load -= len(leaving)
+        self.alight_time[leaving] = self.clock()
+        self.emit('people.lift.off', lift,
+                  self.alight_time[leaving] - self.board_time[leaving])
+        at_destination = self.destination[leaving] == level
+        self._arrive(leaving[at_destination])
+        transfers = leaving[~at_destination]
+        if len(transfers):
+            # As people do, they call again once the lift opening has been
+            # boarded: they do not board it again
+            post('population.call', self, transfers, level)
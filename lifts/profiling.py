@@ -0,0 +1,82 @@
+'''
+Profiling of whole simulation runs.
+
+A profiled run writes two files: the cProfile statistics (`<prefix>.pstats`,
+to be explored with `pstats` or snakeviz) and the collapsed stacks sampled
+during the run (`<prefix>.folded`, one `frame;frame;frame count` line per
+distinct stack, as expected by flamegraph.pl or speedscope).
+'''
+import cProfile
+import os
+import sys
+import threading
+from collections import Counter
+
+SAMPLING_INTERVAL = 0.001  # in seconds
+
+
+class StackSampler:
+
+    '''
+    Sample the stack of a thread at regular intervals, in the background.
+
+    Arguments:
+        thread_id: the thread to sample (default: the calling thread)
+        interval: the seconds between two samples
+    '''
+
+    def __init__(self, thread_id=None, interval=SAMPLING_INTERVAL):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples = Counter()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._thread.join()
+
+    @staticmethod
+    def collapse(frame):
+        '''Return the stack of `frame` as `outermost;...;innermost`.'''
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append('{}:{}'.format(
+                os.path.basename(code.co_filename),
+                getattr(code, 'co_qualname', code.co_name)))
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[self.collapse(frame)] += 1
+
+    def write(self, fname):
+        '''Write the samples in the collapsed stacks format.'''
+        with open(fname, 'w') as file_:
+            for stack, count in self.samples.most_common():
+                print(stack, count, file=file_)
+
+
+def run_profiled(simulation, prefix, checkpoint_at=None):
+    '''Run `simulation`, writing its profile in files named after `prefix`.
+
+    `checkpoint_at` is passed on to `Simulation.run`.
+    '''
+    profiler = cProfile.Profile()
+    sampler = StackSampler()
+    sampler.start()
+    profiler.enable()
+    try:
+        simulation.run(checkpoint_at)
+    finally:
+        profiler.disable()
+        sampler.stop()
+        profiler.dump_stats('{}.pstats'.format(prefix))
+        sampler.write('{}.folded'.format(prefix))
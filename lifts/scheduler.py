@@ -0,0 +1,48 @@
+'''
+A priority queue of timestamped events, driving a virtual clock.
+'''
+from enum import Enum
+from heapq import heappush, heappop
+from itertools import count
+
+# Events due at the same time are processed in this order
+Stage = Enum('Stage', 'lift spawn turn')
+
+
+class Scheduler:
+
+    '''
+    Keep events ordered by time, and advance the clock as they are popped.
+
+    Events scheduled for the same time are processed by `Stage`, then in the
+    order they were scheduled, so that runs are reproducible.
+
+    Arguments:
+        now: the initial time of the clock (seconds)
+    '''
+
+    def __init__(self, now=0):
+        self.now = now
+        self._queue = []
+        self._sequence = count()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def schedule(self, time, stage, payload=None):
+        '''Schedule an event of kind `stage` at `time`.'''
+        if time < self.now:
+            msg = 'Cannot schedule events in the past ({} < {})'
+            raise ValueError(msg.format(time, self.now))
+        heappush(self._queue,
+                 (time, stage.value, next(self._sequence), stage, payload))
+
+    def peek(self):
+        '''Return the time of the next event, None if there are no events.'''
+        return self._queue[0][0] if self._queue else None
+
+    def pop(self):
+        '''Advance the clock to the next event, and return (stage, payload).'''
+        time, _, _, stage, payload = heappop(self._queue)
+        self.now = time
+        return stage, payload
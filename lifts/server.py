@@ -0,0 +1,276 @@
+'''
+A server hosting many simulations in a single process.
+
+Each client connecting to the server gets a simulation of its own, and talks
+to it over its connection with the usual text protocol.  Simulations run as
+asyncio tasks: they only ever wait for their own client, and the time they
+spend waiting is used by the others.
+'''
+import asyncio
+import marshal
+import os
+from collections import deque
+
+from . import common
+from .common import Command, log
+from .binary import RECORD
+from .interface import FileInterface, block_size, asks_for_binary
+from .simulation import Simulation, CLIENT_BOOT_GRACE_PERIOD
+
+
+class AsyncInterface(FileInterface):
+
+    '''
+    A player interface over an asyncio stream connection.
+
+    Lines are collected by `pump` as they come in, and are read without ever
+    blocking.  Lines sent are buffered, and actually written when the
+    simulation awaits `drain`.
+
+    Arguments:
+        reader: the stream of the lines from the client
+        writer: the stream of the lines to the client
+    '''
+
+    def __init__(self, reader, writer):
+        super(FileInterface, self).__init__()
+        self.reader = reader
+        self.writer = writer
+        # Interfaces are created by their simulation, while its actors are
+        # the active ones
+        self.registry = common.active_registry
+        self._lines = deque()
+        self._arrived = asyncio.Event()
+        self._eof = False
+
+    def cleanup(self):
+        pass
+
+    async def pump(self):
+        '''Collect the lines sent by the client, until it disconnects.'''
+        try:
+            await self._pump_lines()
+            # Binary records follow the request for them
+            while True:
+                record = await self.reader.readexactly(RECORD.size)
+                self._lines.append(record)
+                self._arrived.set()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        self._eof = True
+        self._arrived.set()
+
+    async def _pump_lines(self):
+        '''Collect lines, until the client asks for the binary protocol.'''
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                raise ConnectionError('The client disconnected')
+            line = line.decode('utf-8')
+            size = block_size(line)
+            if size is None:
+                self._lines.append(line.strip())
+            else:
+                block = await self.reader.readexactly(size)
+                self._lines.extend(
+                    line.strip() for line in block.decode('utf-8').splitlines())
+            self._arrived.set()
+            if asks_for_binary(line):
+                return
+
+    def read(self):
+        if self._lines:
+            return self._lines.popleft()
+
+    def write(self, line):
+        self.write_bytes(line.strip().encode('utf-8') + b'\n')
+
+    def write_bytes(self, data):
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+    def open_binary(self):
+        # Connections are binary already
+        pass
+
+    async def drain(self):
+        '''Wait until the lines sent can be buffered again.'''
+        try:
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+
+    async def _wait(self, deadline):
+        '''Wait for a line until `deadline`, return False if none came.'''
+        loop = asyncio.get_running_loop()
+        self._arrived.clear()
+        if self._eof or deadline < loop.time():
+            return False
+        try:
+            await asyncio.wait_for(self._arrived.wait(),
+                                   deadline - loop.time())
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            # Other simulations may have run in the meantime
+            self.registry.activate()
+        return True
+
+    async def handshake(self, timeout):
+        '''Return True if the client sent READY within `timeout` seconds.'''
+        self.registry.activate()
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            line = self.read()
+            if line is None:
+                if not await self._wait(deadline):
+                    return False
+                continue
+            payload = self.process_line(line)
+            if payload is not None and payload[0] is Command.ready:
+                return True
+
+    async def get_turn_commands_async(self, timeout):
+        '''Return the commands of a turn, as soon as the client sends READY.
+
+        If the client does not conclude its turn within `timeout` seconds,
+        whatever has been received so far is returned.
+        '''
+        self.registry.activate()
+        commands = []
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            line = self.read()
+            if line is None:
+                if not await self._wait(deadline):
+                    break
+                continue
+            payload = self.process_line(line)
+            if payload is None:  # invalid line
+                continue
+            if payload[0] is Command.ready:
+                break
+            commands.append(payload)
+        return commands
+
+    def close(self):
+        self.writer.close()
+
+
+async def run_simulation(simulation):
+    '''Run a simulation with an `AsyncInterface`, and return its STATS.
+
+    Return None if the client never sent the READY signal.
+    '''
+    loop = asyncio.get_running_loop()
+    interface = simulation.interface
+    simulation.begin()
+    if not await interface.handshake(CLIENT_BOOT_GRACE_PERIOD):
+        log.error('The client never sent the READY signal.')
+        return None
+    # Commands sent along with READY are played in the first turn
+    simulation.opening_commands = list(interface.get_commands())
+    start_time = loop.time()
+    if simulation.fast_forward:
+        engine = simulation.fast_forward_engine()
+        commands = None
+        while True:
+            try:
+                engine.send(commands)
+            except StopIteration:
+                break
+            await interface.drain()
+            commands = await interface.get_turn_commands_async(
+                simulation.turn_timeout)
+    else:
+        turns = 0
+        while not simulation.done:
+            if simulation.overdue:
+                log.error('Hard time limit hit')
+                break
+            simulation.step()
+            await interface.drain()
+            turns += 1
+            intended_end = start_time + simulation.turn_timeout * turns
+            await asyncio.sleep(max(intended_end - loop.time(), 0))
+    simulation.finish(loop.time() - start_time)
+    await interface.drain()
+    return simulation.stats()
+
+
+class SimulationServer:
+
+    '''
+    Start a simulation for each client connecting.
+
+    The simulation file is expanded only once, and each simulation gets its
+    own copy of the description.
+
+    Arguments:
+        sim_file: the master TOML file describing the simulations
+        fast_forward: if True, run the simulations on a virtual clock
+        use_cache: if False, parse the simulation file even if a cached
+            expansion of it is available
+    '''
+
+    def __init__(self, sim_file, fast_forward=False, use_cache=True):
+        description = Simulation.load_description(sim_file, use_cache)
+        self._description = marshal.dumps(description)
+        self.fast_forward = fast_forward
+        self.running = 0
+        self.finished = 0
+
+    async def handle(self, reader, writer):
+        '''Run a simulation for the client on the other end of a connection.'''
+        interface = None
+        self.running += 1
+        try:
+            simulation = Simulation(
+                None, description=marshal.loads(self._description),
+                fast_forward=self.fast_forward,
+                interface_class=lambda directory: AsyncInterface(reader,
+                                                                 writer))
+            interface = simulation.interface
+            pump = asyncio.ensure_future(interface.pump())
+            try:
+                stats = await run_simulation(simulation)
+            finally:
+                pump.cancel()
+            if stats is not None:
+                log.info('Simulation over, {} delivered in {} turns',
+                         stats['delivered'], stats['turns'])
+        except Exception:
+            log.exception('The simulation failed')
+        finally:
+            self.running -= 1
+            self.finished += 1
+            if interface is not None:
+                interface.close()
+            else:
+                writer.close()
+
+    async def start(self, path):
+        '''Start listening on the Unix domain socket `path`.'''
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return await asyncio.start_unix_server(self.handle, path)
+
+    async def serve(self, path):
+        '''Serve clients on the Unix domain socket `path`, forever.'''
+        server = await self.start(path)
+        log.info('Serving simulations on {}', path)
+        async with server:
+            await server.serve_forever()
+
+
+def main(args):
+    '''Serve simulations from the parsed command line `args`.'''
+    server = SimulationServer(args['<sim-file>'][0],
+                              fast_forward=args['--fast-forward'],
+                              use_cache=not args['--no-cache'])
+    try:
+        asyncio.run(server.serve(args['--socket']))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,451 @@
+'''
+A building split in zones, each simulated by a worker process of its own.
+
+Tall towers are served by banks of lifts (low-rise, mid-rise, high-rise...)
+that only share the sky lobbies where people change lift.  Lifts whose ranges
+overlap by more than a floor make a zone, and each zone is simulated turn by
+turn in its own process, with the lifts of the zone and every floor of the
+building.  The coordinator talks to the client as a single simulation would:
+
+- commands are parsed once, and sent to the zone of the lift they concern
+- people enter the zone that takes them closest to their destination, and are
+  headed for the sky lobby on the way, if their destination is beyond it
+- people reaching a sky lobby are handed over to the next zone, where they
+  enter at the start of the next turn, still counting their journey from when
+  they first entered the building
+- the messages of each zone are sent to the client in the order of the zones
+  (from the bottom one), between the TURN and the READY of the coordinator
+
+People are always actors in the zones.  Journals, checkpoints and the shared
+state are not available in sharded runs.
+'''
+import json
+from collections import namedtuple
+from multiprocessing import Pipe, Process
+from random import Random
+from time import time, sleep
+
+from simpleactors import on
+
+from .arrivals import Arrival, Arrivals
+from .common import Command, Message, Registry, broadcast, log, process_events
+from .env import DirectInterface
+from .floor import Floor
+from .interface import FileInterface
+from .lift import Lift
+from .person import Person
+from .simulation import (Simulation, CLIENT_BOOT_GRACE_PERIOD, HANDSHAKE_WAIT,
+                         POST_END_GRACE_PERIOD, interface_class_from)
+from .stats import RunningStats, StatsCollector
+
+# A bank of lifts and the floors they span, the lifts by id
+Zone = namedtuple('Zone', 'bottom top lifts')
+# Messages of the zones the coordinator sends itself
+OWN_MESSAGES = {Message.turn, Message.ready, Message.stats}
+
+
+def partition(description):
+    '''Return the zones of a simulation, from the bottom one.
+
+    Every floor must be served, and consecutive zones must share a floor.
+    '''
+    lifts = sorted(description['lifts'], key=lambda lift: (
+        lift['bottom_floor_number'], lift['top_floor_number']))
+    zones = []
+    for lift in lifts:
+        bottom, top = lift['bottom_floor_number'], lift['top_floor_number']
+        if zones and bottom < zones[-1].top:
+            last = zones[-1]
+            zones[-1] = Zone(last.bottom, max(last.top, top),
+                             last.lifts + (lift['lid'], ))
+        else:
+            zones.append(Zone(bottom, top, (lift['lid'], )))
+    levels = [floor['level'] for floor in description['building']]
+    if min(levels) < zones[0].bottom or max(levels) > zones[-1].top:
+        raise ValueError('Some floors are served by no lift')
+    for below, above in zip(zones, zones[1:]):
+        if below.top != above.bottom:
+            raise ValueError('No lift connects floors {} and {}'.format(
+                below.top, above.bottom))
+    return zones
+
+
+def zone_for(zones, origin, destination):
+    '''Return the index of the zone to enter at `origin`.
+
+    It is the first one reaching `destination`, if any, or the one going
+    furthest towards it.
+    '''
+    candidates = [n for n, zone in enumerate(zones)
+                  if zone.bottom <= origin <= zone.top]
+    for n in candidates:
+        if zones[n].bottom <= destination <= zones[n].top:
+            return n
+    if destination > origin:
+        return max(candidates, key=lambda n: zones[n].top)
+    return min(candidates, key=lambda n: zones[n].bottom)
+
+
+class ZoneCollector(StatsCollector):
+
+    '''
+    The statistics of a zone, where some people are just passing through.
+
+    People heading beyond the zone do not arrive at the sky lobby, they are
+    collected as transfers.  The journey of people coming from another zone
+    counts from when they entered the building.
+    '''
+
+    def __init__(self, clock):
+        super().__init__(clock)
+        self.beyond = {}  # pid -> destination out of the zone
+        self.entered_at = {}  # pid -> time of entering the building
+        self.transfers = []
+
+    @on('person.enter')
+    def on_person_enter(self, person):
+        super().on_person_enter(person)
+        if person.id in self.entered_at:
+            self._entered[person] = self.entered_at.pop(person.id)
+
+    @on('person.arrived')
+    def on_person_arrived(self, person):
+        destination = self.beyond.pop(person.id, None)
+        if destination is None:
+            super().on_person_arrived(person)
+            return
+        self.transfers.append(Arrival(self._entered.pop(person), person.id,
+                                      person.location.level, destination))
+        del self._since[person]
+
+
+class ZoneSimulation(Simulation):
+
+    '''
+    The simulation of a zone, played one turn at a time by the coordinator.
+
+    Arguments:
+        description: the expanded description of the simulation of the
+            whole building
+        zone: the zone to simulate
+    '''
+
+    collector_class = ZoneCollector
+
+    def __init__(self, description, zone):
+        self.zone = zone
+        description = dict(description, lifts=[
+            lift for lift in description['lifts'] if lift['lid'] in zone.lifts])
+        # People only enter when the coordinator says so, and as actors
+        description['people'] = dict(description['people'], population=0,
+                                     backend='actors')
+        super().__init__(None, description=description,
+                         interface_class=DirectInterface)
+        self._options = None
+
+    def spawn(self, arrival):
+        '''Have a person enter the zone, heading for its sky lobby if need be.
+
+        The destination of people going beyond the zone is the last floor of
+        the zone on their way.
+        '''
+        destination = min(max(arrival.destination, self.zone.bottom),
+                          self.zone.top)
+        if destination != arrival.destination:
+            self.collector.beyond[arrival.pid] = arrival.destination
+        Person(arrival.pid, self.floors[arrival.origin],
+               self.floors[destination])
+
+    def set_options(self, options):
+        '''Relay events the way the client of the coordinator wants.'''
+        if options == self._options:
+            return
+        self._options = options
+        coalesce, subscriptions, lift_filter = options
+        interface = self.interface
+        if coalesce:
+            interface.start_coalescing()
+        if subscriptions is not None:
+            interface.subscribe(*subscriptions)
+        # Lift ids were checked by the coordinator, which knows all the lifts
+        if lift_filter is not None:
+            interface.lift_filter = lift_filter
+
+    def play(self, commands, arrivals, transfers, options):
+        '''Play a turn, as `step` would, with the commands of the client.
+
+        Commands name lifts by id and floors by level.  People coming from
+        another zone enter before those entering the building.  Return the
+        messages of the turn (but TURN and READY), the people leaving the zone
+        and the number of people in it.
+        '''
+        self.registry.activate()
+        self.set_options(options)
+        self.start_turn([
+            [command, self.lifts[lid]] + [
+                self.floors[arg] if isinstance(arg, int) else arg
+                for arg in args]
+            for command, lid, *args in commands])
+        self.clock += self.turn_duration
+        for arrival in transfers:
+            self.collector.entered_at[arrival.pid] = arrival.time
+            self.spawn(arrival)
+        for arrival in arrivals:
+            self.spawn(arrival)
+        broadcast('turn.start', self.turn_duration)
+        process_events()
+        events = [event for event in self.interface.collect()
+                  if event[0] not in OWN_MESSAGES]
+        transfers, self.collector.transfers = self.collector.transfers, []
+        return events, transfers, self.in_building
+
+    def statistics(self):
+        '''Return the running statistics of the zone, to be merged.'''
+        collector = self.collector
+        return collector.wait, collector.ride, collector.journey, \
+            collector.lifts
+
+
+def run_zone(connection, description, zone):
+    '''Simulate a zone, as requested over `connection`, until told to stop.
+
+    Requests are the name of a method of the simulation of the zone and its
+    arguments, and the result is sent back.
+    '''
+    simulation = ZoneSimulation(description, zone)
+    while True:
+        method, *args = connection.recv()
+        if method == 'stop':
+            break
+        connection.send(getattr(simulation, method)(*args))
+    connection.close()
+
+
+class ShardedSimulation:
+
+    '''
+    A simulation split by zone, each zone running in a worker process.
+
+    Arguments:
+        sim_file: the master TOML file describing the simulation
+        interface_dir: the directory where to create the interface files
+        fast_forward: if True, end each turn as soon as the client has sent
+            READY, rather than pacing turns on the wall clock (zones are
+            stepped one turn at a time either way)
+        rng_seed: if not None, override the seed in the simulation file
+        interface_class: the class of the interface, instantiated with
+            `interface_dir`
+        stats_every: if not None, send a snapshot of the statistics every so
+            many turns
+        use_cache: if False, parse the simulation files even if a cached
+            expansion of them is available
+        description: if not None, the expanded description of the
+            simulation, used instead of `sim_file`
+    '''
+
+    def __init__(self, sim_file, interface_dir='/tmp/lifts',
+                 fast_forward=False, rng_seed=None, interface_class=None,
+                 stats_every=None, use_cache=True, description=None):
+        if description is None:
+            description = Simulation.load_description(sim_file, use_cache)
+        self.description = description
+        if rng_seed is not None:
+            description['people']['seed'] = rng_seed
+        self.zones = partition(description)
+        self._zone_of = {lid: n for n, zone in enumerate(self.zones)
+                         for lid in zone.lifts}
+        self.fast_forward = fast_forward
+        self.stats_every = stats_every
+        clocking = description['clocking']
+        self.duration = clocking['total_ticks']
+        self.turn_duration = clocking['ticks_per_turn']
+        self.turn_timeout = clocking['client_turn_ms'] / 1000
+        self.clock = 0
+        self.step_counter = 0
+        # Workers are started first, so that they do not inherit the
+        # connection with the client
+        self.workers = []
+        for zone in self.zones:
+            connection, child = Pipe()
+            process = Process(target=run_zone, args=(child, description, zone),
+                              daemon=True)
+            process.start()
+            self.workers.append((process, connection))
+        # The lifts and floors of the coordinator are only there for the
+        # commands to be parsed
+        self.registry = Registry()
+        self.registry.activate()
+        self.interface = (interface_class or FileInterface)(interface_dir)
+        self.floors = {floor['level']: Floor(**floor)
+                       for floor in description['building']}
+        for lift in description['lifts']:
+            Lift(lift, self.floors[lift['location']], lift['open_doors'])
+        self._init_people()
+
+    def _init_people(self):
+        '''Plan when and where people will enter the building.
+
+        The plan is the same as in a simulation of the whole building.
+        '''
+        people = self.description['people']
+        rng = Random()
+        try:
+            rng.seed(people['seed'])
+        except KeyError:
+            log.debug('No seed provided, the simulation is not reproducible')
+        levels = sorted(self.floors)
+        entries = [l for l in levels if self.floors[l].is_entry]
+        exits = [l for l in levels if self.floors[l].is_exit]
+        self.pending = Arrivals(people['population'], self.duration, levels,
+                                entries, exits, rng)
+        # People on their way to each zone, and in each zone
+        self.transfers = [[] for _ in self.zones]
+        self.in_zones = [0] * len(self.zones)
+
+    @property
+    def in_building(self):
+        '''Return the number of people in the building right now.'''
+        return sum(self.in_zones) + sum(map(len, self.transfers))
+
+    @property
+    def done(self):
+        '''Return True when everybody has reached their destination.'''
+        return not self.pending and not self.in_building
+
+    @property
+    def overdue(self):
+        '''Return True if the simulation has exceeded its time limit.'''
+        return self.clock > self.duration + POST_END_GRACE_PERIOD
+
+    def _request(self, method, *args):
+        '''Have every zone run a method, return the results in zone order.
+
+        All the requests are sent before any result is waited for, so that
+        the zones work in parallel.
+        '''
+        for _, connection in self.workers:
+            connection.send((method, ) + args)
+        return [connection.recv() for _, connection in self.workers]
+
+    def step(self, commands):
+        '''Run a single turn of every zone, with the `commands` of the client.
+
+        The messages of the zones are sent to the client in zone order.
+        '''
+        self.registry.activate()
+        by_zone = [[] for _ in self.zones]
+        for command, *args in commands:
+            if command is Command.ready:
+                continue
+            lift, *args = args
+            by_zone[self._zone_of[lift.id]].append(
+                (command, lift.id) + tuple(
+                    arg.level if isinstance(arg, Floor) else arg
+                    for arg in args))
+        self.step_counter += 1
+        self.clock += self.turn_duration
+        arrivals = [[] for _ in self.zones]
+        for arrival in self.pending.pop_due(self.clock):
+            arrivals[zone_for(self.zones, arrival.origin,
+                              arrival.destination)].append(arrival)
+        interface = self.interface
+        options = (interface.coalesce, interface.subscriptions,
+                   interface.lift_filter)
+        for (_, connection), *request in zip(self.workers, by_zone, arrivals,
+                                             self.transfers):
+            connection.send(('play', ) + tuple(request) + (options, ))
+        self.transfers = [[] for _ in self.zones]
+        interface.send_message(Message.turn, self.step_counter)
+        for n, (_, connection) in enumerate(self.workers):
+            events, transfers, self.in_zones[n] = connection.recv()
+            for event in events:
+                interface.send_message(*event)
+            for arrival in transfers:
+                self.transfers[zone_for(self.zones, arrival.origin,
+                                        arrival.destination)].append(arrival)
+        if self.stats_every and not self.step_counter % self.stats_every:
+            interface.send_message(Message.stats, json.dumps(self.stats()))
+        interface.send_message(Message.ready)
+
+    def world(self):
+        '''Return the description of the world, as sent to the client.'''
+        keys = ('id', 'clocking', 'building', 'lifts')
+        return {key: self.description[key] for key in keys}
+
+    def stats(self):
+        '''Return the statistics of the whole building.'''
+        population = self.description['people']['population']
+        stats = {
+            'turns': self.step_counter,
+            'simulated_seconds': self.clock,
+            'population': population,
+            'delivered': population - len(self.pending) - self.in_building,
+            'zones': [[zone.bottom, zone.top] for zone in self.zones],
+        }
+        merged = [RunningStats() for _ in range(3)]
+        lifts = {}
+        for *running, zone_lifts in self._request('statistics'):
+            for total, part in zip(merged, running):
+                total.merge(part)
+            lifts.update(zone_lifts)
+        for key, total in zip(('wait', 'ride', 'journey'), merged):
+            stats[key] = total.report()
+        stats['lifts'] = lifts
+        return stats
+
+    def run(self):
+        '''Run the simulation, until everybody is delivered or time is up.'''
+        self.registry.activate()
+        self.interface.send_message(Message.world, json.dumps(self.world()))
+        log.debug('Waiting for the AI client to signal their readiness.')
+        deadline = time() + CLIENT_BOOT_GRACE_PERIOD
+        while not any(payload[0] is Command.ready
+                      for payload in self.interface.get_commands()):
+            if time() > deadline:
+                log.critical('The client never sent the READY signal.')
+                exit(1)
+            self.interface.wait(HANDSHAKE_WAIT)
+        log.info('Simulation started, in {} zones', len(self.zones))
+        start_time = time()
+        # Commands sent along with READY are played in the first turn
+        commands = list(self.interface.get_commands())
+        while not self.done:
+            if self.overdue:
+                log.error('Hard time limit hit')
+                break
+            self.step(commands)
+            if self.fast_forward:
+                commands = self.interface.get_turn_commands(self.turn_timeout)
+                continue
+            intended_end = start_time + self.turn_timeout * self.step_counter
+            sleep(max(intended_end - time(), 0))
+            commands = list(self.interface.get_commands())
+        self.interface.send_message(Message.end)
+        self.interface.send_message(Message.stats, json.dumps(self.stats()))
+        self.interface.flush()
+        log.info('Simulation ended, total duration: {:.3f} seconds',
+                 time() - start_time)
+
+    def close(self):
+        '''Stop the workers of the zones.'''
+        for process, connection in self.workers:
+            connection.send(('stop', ))
+            connection.close()
+            process.join()
+        self.workers = []
+
+
+def main(args):
+    '''Run a sharded simulation, as per the command line `args`.'''
+    simulation = ShardedSimulation(
+        args['<sim-file>'][0],
+        interface_dir=args['<file-interface-dir>'] or '/tmp/lifts',
+        interface_class=interface_class_from(args),
+        fast_forward=args['--fast-forward'],
+        stats_every=int(args['--stats-every'] or 0),
+        use_cache=not args['--no-cache'])
+    try:
+        simulation.run()
+    finally:
+        simulation.close()
+        simulation.interface.close()
@@ -0,0 +1,157 @@
+'''
+A view of the state of the world, in shared memory.
+
+The engine publishes the state of every lift and floor to a memory-mapped
+file at the end of each turn, just before READY.  Clients on the same host can
+map the file and read the whole world at once, rather than tracking it from
+the messages.
+
+The block is little-endian, and made of a header, one record per lift (in the
+order of the WORLD message) and one record per floor (from the bottom one):
+
+- header: magic (8 bytes), number of lifts (uint32), number of floors
+  (uint32), sequence (uint64), turn (uint64)
+- lift: floor number (int32), destination (int32, `NO_DESTINATION` if none),
+  direction (uint8, 0 for none, 1 for up, 2 for down), open doors (uint8),
+  load and capacity (uint16 each), 2 bytes of padding
+- floor: floor number (int32), up and down call buttons lit (uint8 each), 2
+  bytes of padding
+
+The sequence is odd while the engine writes: readers copy the block, and
+retry if the sequence was odd or changed meanwhile (see `StateView`).
+'''
+import mmap
+import os
+import struct
+from time import sleep
+
+from .binary import DIRECTION_CODES
+from .common import Direction
+
+MAGIC = b'LIFTSST1'
+HEADER = struct.Struct('<8sIIQQ')
+SEQUENCE_OFFSET = 16
+SEQUENCE = struct.Struct('<Q')
+LIFT = struct.Struct('<iiBBHH2x')
+FLOOR = struct.Struct('<iBB2x')
+NO_DESTINATION = -2 ** 31
+# Readers back off from 0 (yielding the CPU) to this many seconds between
+# attempts, and give up after this many
+SNAPSHOT_MAX_BACKOFF = 0.001
+SNAPSHOT_ATTEMPTS = 2000
+
+
+def block_size(lifts, floors):
+    '''Return the size of the block of a world.'''
+    return HEADER.size + lifts * LIFT.size + floors * FLOOR.size
+
+
+class StateBlock:
+
+    '''
+    The writer of the shared state block.
+
+    Arguments:
+        fname: the file to map
+        lifts: the lifts, in the order of the WORLD message
+        floors: the floors, from the bottom one
+    '''
+
+    def __init__(self, fname, lifts, floors):
+        self.fname = fname
+        self.lifts = list(lifts)
+        self.floors = list(floors)
+        size = block_size(len(self.lifts), len(self.floors))
+        with open(fname, 'wb') as file_:
+            file_.truncate(size)
+        self._file = open(fname, 'r+b')
+        self.map = mmap.mmap(self._file.fileno(), size)
+        self.sequence = 0
+        HEADER.pack_into(self.map, 0, MAGIC, len(self.lifts),
+                         len(self.floors), self.sequence, 0)
+
+    def publish(self, turn):
+        '''Write the current state of the world.'''
+        block = self.map
+        self.sequence += 1  # Odd: being written
+        SEQUENCE.pack_into(block, SEQUENCE_OFFSET, self.sequence)
+        HEADER.pack_into(block, 0, MAGIC, len(self.lifts), len(self.floors),
+                         self.sequence, turn)
+        offset = HEADER.size
+        for lift in self.lifts:
+            destination = lift.destination
+            LIFT.pack_into(
+                block, offset, lift.location.level,
+                NO_DESTINATION if destination is None else destination.level,
+                DIRECTION_CODES[lift.direction], lift.open_doors, lift.load,
+                lift.capacity)
+            offset += LIFT.size
+        for floor in self.floors:
+            calls = floor.requested_directions
+            FLOOR.pack_into(block, offset, floor.level,
+                            Direction.up in calls, Direction.down in calls)
+            offset += FLOOR.size
+        self.sequence += 1  # Even: consistent
+        SEQUENCE.pack_into(block, SEQUENCE_OFFSET, self.sequence)
+
+    def close(self):
+        self.map.close()
+        self._file.close()
+
+
+class StateView:
+
+    '''
+    A reader of the shared state block.
+
+    Arguments:
+        fname: the file the engine maps
+    '''
+
+    def __init__(self, fname):
+        size = os.path.getsize(fname)
+        with open(fname, 'rb') as file_:
+            self.map = mmap.mmap(file_.fileno(), size, access=mmap.ACCESS_READ)
+        magic, self.lift_count, self.floor_count, _, _ = \
+            HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError('{} is not a state block'.format(fname))
+
+    @property
+    def sequence(self):
+        return SEQUENCE.unpack_from(self.map, SEQUENCE_OFFSET)[0]
+
+    def snapshot(self):
+        '''Return a consistent copy of the state, as a dictionary.
+
+        While the engine writes, the reader waits ever longer before trying
+        again, and raises TimeoutError if the engine never finishes.
+        '''
+        backoff = 0
+        for _ in range(SNAPSHOT_ATTEMPTS):
+            before = self.sequence
+            if not before % 2:
+                data = self.map[:]
+                if self.sequence == before:
+                    break
+            sleep(backoff)
+            backoff = min(2 * backoff or 1e-6, SNAPSHOT_MAX_BACKOFF)
+        else:
+            raise TimeoutError('The engine never finished writing the state')
+        _, lift_count, floor_count, _, turn = HEADER.unpack_from(data)
+        lifts = [dict(zip(('location', 'destination', 'direction',
+                           'open_doors', 'load', 'capacity'), fields))
+                 for fields in LIFT.iter_unpack(
+                     data[HEADER.size:HEADER.size + lift_count * LIFT.size])]
+        for lift in lifts:
+            if lift['destination'] == NO_DESTINATION:
+                lift['destination'] = None
+            lift['open_doors'] = bool(lift['open_doors'])
+        start = HEADER.size + lift_count * LIFT.size
+        floors = [{'level': level, 'up': bool(up), 'down': bool(down)}
+                  for level, up, down in FLOOR.iter_unpack(data[start:])]
+        return {'sequence': before, 'turn': turn, 'lifts': lifts,
+                'floors': floors}
+
+    def close(self):
+        self.map.close()
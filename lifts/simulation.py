@@ -3,74 +3,245 @@
 A Lift simulator.
 
 Usage:
-  lifts <sim-file> [<file-interface-dir>]
+  lifts batch <client> <sim-file>... [--seeds=<seeds>] [--workers=<n>]
+                                     [--output=<file>] [--no-cache]
+  lifts restore <checkpoint> [<file-interface-dir>] [--transport=<kind>]
+                [--client=<command>]
+  lifts replay <journal>
+  lifts serve <sim-file> [--socket=<path>] [--fast-forward] [--no-cache]
+  lifts shard <sim-file> [<file-interface-dir>] [--fast-forward]
+              [--stats-every=<turns>] [--no-cache] [--transport=<kind>]
+              [--client=<command>]
+  lifts <sim-file> [<file-interface-dir>] [--fast-forward]
+        [--profile=<prefix>] [--stats-every=<turns>] [--no-cache]
+        [--checkpoint=<file> --checkpoint-turn=<turn>]
+        [--journal=<file>] [--raw-journal] [--shared-state=<file>]
+        [--transport=<kind>] [--client=<command>]
   lifts -h | --help
   lifts --version
 
 Options:
-  -h --help     Show this screen.
-  --version     Show version.
+  -h --help           Show this screen.
+  --version           Show version.
+  --fast-forward      Run on a virtual clock: never sleep, but jump to the
+                      next event as soon as the client has concluded its turn.
+  --profile=<prefix>  Time every event handler (reported in STATS), and write
+                      the cProfile statistics to `<prefix>.pstats` and the
+                      sampled stacks to `<prefix>.folded`, for flame graphs.
+  --stats-every=<turns>  Also send the STATS so far every so many turns.
+  --no-cache          Parse the simulation files, even if they have been
+                      parsed before and have not changed since.
+  --checkpoint=<file>  Save the complete state of the simulation to a file
+                      once the turn `--checkpoint-turn` has been played.
+  --checkpoint-turn=<turn>  The turn after which to save the checkpoint.
+  --journal=<file>    Record every message and every client line to a file,
+                      to replay the run later.
+  --raw-journal       Do not compress the journal.
+  --shared-state=<file>  Publish the state of the lifts and floors to a
+                      memory-mapped file at the end of every turn.
+  --transport=<kind>  How to talk to the client: `file`, `fifo` (named pipes),
+                      `socket` (Unix domain socket) or `stdio` (standard
+                      streams of the `--client` process) [default: file].
+  --client=<command>  The command line of the client, for `stdio`.
+  --socket=<path>     The Unix domain socket where to serve simulations
+                      [default: /tmp/lifts.sock].
+  --seeds=<seeds>     Seeds to run each sim file with, as a range (`0-9`) or a
+                      list (`1,5,7`).  Defaults to the seed in the sim file.
+  --workers=<n>       Number of simulations to run in parallel [default: 0],
+                      0 meaning one per CPU core.
+  --output=<file>     File where to stream the STATS of each run, one JSON
+                      object per line [default: lifts-batch.jsonl].
+
+The `restore` mode continues a simulation from a checkpoint, possibly with
+another client.  The `replay` mode runs a journal again at full speed, without
+the client, prints its STATS and fails if the engine now behaves differently.
+The `serve` mode runs a simulation for each client connecting to `--socket`,
+all in the same process.  The `shard` mode splits the building in zones served
+by separate banks of lifts, and simulates each zone in a process of its own.
+
+In batch mode, `<client>` is the command line of the AI client, that will be
+launched for each run with the two interface files as arguments.  Sim files can
+be glob patterns.
 '''
 
 import os
+import json
+import pickle
+import shlex
+import zlib
+from functools import partial
+from itertools import chain
 from time import time, sleep
-from random import choice, gauss, seed
+from random import Random
 
 import toml
 from docopt import docopt
-from simpleactors import Director
+from simpleactors import Actor
 
 from .person import Person
 from .floor import Floor
 from .lift import Lift
 from .interface import FileInterface
-from .common import Command, Message
+from .journal import JournalWriter
+from .shared import StateBlock
+from .transports import TRANSPORTS, ProcessInterface
+from .scheduler import Scheduler, Stage
+from .arrivals import Arrivals
+from . import cache
+from .stats import StatsCollector
+from .common import (Command, Message, Registry, log, post, broadcast,
+                     process_events, kill, enable_profiling)
 
 
 POST_END_GRACE_PERIOD = 60  # in seconds
 CLIENT_BOOT_GRACE_PERIOD = 10  # in seconds
+HANDSHAKE_WAIT = 0.5  # in seconds
 
 
 class Simulation:
 
-    def __init__(self, sim_file, interface_dir='/tmp/lifts'):
-        self._load_sim_file(sim_file)
-        from pprint import pprint; pprint(self.description)
-        FileInterface(interface_dir)
+    '''
+    A building, its lifts and the people using them.
+
+    The simulation can run in real time, sleeping so that each turn lasts
+    `client_turn_ms`, or fast-forward on a virtual clock, processing one
+    timestamped event after the other without ever sleeping.
+
+    Arguments:
+        sim_file: the master TOML file describing the simulation
+        interface_dir: the directory where to create the interface files
+        fast_forward: if True, do not pace the simulation on the wall clock
+        rng_seed: if not None, override the seed in the simulation file
+        interface_class: the class of the interface, instantiated with
+            `interface_dir` (e.g. an in-process client)
+        profile: if True, time every event handler, and add the timings to
+            the statistics
+        stats_every: if not None, send a snapshot of the statistics every so
+            many turns
+        use_cache: if False, parse the simulation files even if a cached
+            expansion of them is available
+        description: if not None, the expanded description of the
+            simulation, used instead of `sim_file`
+        journal: if not None, the file where to record the journal of the
+            run, to replay it later
+        compress_journal: if False, do not compress the journal
+        shared_state: if not None, the file where to publish the state of
+            the world at the end of every turn (see `lifts.shared`)
+    '''
+
+    # When False, real time runs do not sleep between turns (e.g. replays)
+    paced = True
+    # The actor keeping the statistics
+    collector_class = StatsCollector
+
+    def __init__(self, sim_file, interface_dir='/tmp/lifts',
+                 fast_forward=False, rng_seed=None,
+                 interface_class=None, profile=False, stats_every=None,
+                 use_cache=True, description=None, journal=None,
+                 compress_journal=True, shared_state=None):
+        # Each simulation has its own actors, and an RNG it is the only user of
+        self.registry = Registry()
+        self.registry.activate()
+        self.rng = Random()
+        self.handler_stats = enable_profiling() if profile else None
+        self.stats_every = stats_every
+        self.use_cache = use_cache
+        if description is None:
+            description = self._load_sim_file(sim_file)
+        self.description = description
+        if rng_seed is not None:
+            self.description['people']['seed'] = rng_seed
+        # If provided, initialise the random seed
+        try:
+            self.rng.seed(self.description['people']['seed'])
+        except KeyError:
+            log.debug('No seed provided, the simulation is not reproducible')
+        self.fast_forward = fast_forward
+        self.interface = (interface_class or FileInterface)(interface_dir)
+        self._init_clocking()
+        self.collector = self.collector_class(self.now)
         self._init_floors()
-        exit(0)
         self._init_lifts()
         self._init_people()
+        self.journal = None
+        if journal is not None:
+            self._init_journal(journal, compress_journal)
+        self.shared_state = None
+        if shared_state is not None:
+            self.shared_state = StateBlock(
+                shared_state, self.lifts.values(),
+                [self.floors[level] for level in sorted(self.floors)])
 
     def _load_sim_file(self, sim_file):
-        '''Load, parse and expand the simulation file.'''
+        '''Return the expanded simulation file, from the cache if possible.'''
+        return self.load_description(sim_file, self.use_cache)
+
+    @staticmethod
+    def load_description(sim_file, use_cache=True):
+        '''Return the expanded description of a simulation file.
+
+        If `use_cache` is True, the description comes from the cache as long
+        as none of the files it was expanded from changed.
+        '''
         sim_fname = os.path.realpath(sim_file)
-        # Load the master file
+        if use_cache:
+            return cache.load(sim_fname, Simulation._expand_sim_file)
+        description, _ = Simulation._expand_sim_file(sim_fname)
+        return description
+
+    @staticmethod
+    def _expand_sim_file(sim_fname):
+        '''Parse and expand the simulation file.
+
+        Return the expanded description, and the digest of each file read.
+        '''
         path, _ = os.path.split(sim_fname)
-        with open(sim_fname) as file_:
-            sim = toml.load(file_)
+        digests = {}
+        parsed = {}
+
+        def parse(fname):
+            '''Parse a TOML file, only once however many times needed.'''
+            if fname not in parsed:
+                data = cache.read(fname)
+                digests[fname] = cache.digest(data)
+                parsed[fname] = toml.loads(data.decode('utf-8'))
+            return parsed[fname]
+        # Load the master file
+        sim = parse(sim_fname)
         # Expand the building
         building_fname = '{}.toml'.format(sim['building']['model'])
-        with open(os.path.join(path, 'buildings', building_fname)) as file_:
-            sim['building'] = toml.load(file_)['floor']
+        building = parse(os.path.join(path, 'buildings', building_fname))
+        sim['building'] = building['floor']
         # Expand the lifts
         processed_lifts = []
         for lift in sim['lifts']:
             fname = '{}.toml'.format(lift['model'])
-            with open(os.path.join(path, 'lifts', fname)) as file_:
-                exp = toml.load(file_)
+            exp = dict(parse(os.path.join(path, 'lifts', fname)))
+            exp['lid'] = lift['lid']
             exp['bottom_floor_number'], exp['top_floor_number'] = lift['range']
             exp['location'] = lift['location']
             exp['open_doors'] = lift['open_doors']
             processed_lifts.append(exp)
         sim['lifts'] = processed_lifts
-        # If provided, initialise the random seed
-        try:
-            seed(sim['people']['seed'])
-        except KeyError:
-            print('no seed')
-            pass
-        self.description = sim
+        return sim, digests
+
+    def _init_clocking(self):
+        '''Set the time constants of the simulation.
+
+        A tick is a simulated second.
+        '''
+        clocking = self.description['clocking']
+        self.duration = clocking['total_ticks']
+        self.turn_duration = clocking['ticks_per_turn']
+        self.turn_timeout = clocking['client_turn_ms'] / 1000
+        self.clock = 0
+        self.step_counter = 0
+        # Commands the client sent along with its first READY
+        self.opening_commands = []
+        # The state of a fast-forward run, set up when it starts
+        self.scheduler = None
+        self._lift_clocks = {}
+        self._lift_versions = {}
 
     def _init_floors(self):
         '''A utility function that will generate all the simulation floors.'''
@@ -83,83 +254,480 @@ class Simulation:
                 instance.below = by_level[level - 1]
             if level < max_level:
                 instance.above = by_level[level + 1]
+        self.floors = by_level
 
     def _init_lifts(self):
-        '''Set and return the initial state for all lifts.'''
+        '''Set and return the initial state for all lifts.
+
+        With the `arrays` topology, the state of the lifts is kept in the
+        arrays of a `Fleet`, which moves them all at once (this requires
+        NumPy).
+        '''
         self.lifts = {}
-        for description in self.description['lifts']:
-            floor = choice(list(self.floors.values()))
-            lift = Lift(self, description, LiftStatus.open, floor)
-            self.lifts[lift.name] = lift
+        descriptions = self.description['lifts']
+        self.fleet = None
+        if self.description.get('topology', 'linked') == 'arrays':
+            from .fleet import Fleet
+            self.fleet = Fleet(self.floors, len(descriptions))
+        for description in descriptions:
+            floor = self.floors[description['location']]
+            if self.fleet is None:
+                lift = Lift(description, floor, description['open_doors'])
+            else:
+                lift = self.fleet.add(description, floor,
+                                      description['open_doors'])
+            self.lifts[lift.id] = lift
 
     def _init_people(self):
-        '''Set and return the initial state for all people.'''
-        self.people = []
-        duration = self.description['simulation']['duration_min']
-        for pid in range(self.description['simulation']['population']):
-            event_time = max(0, gauss(duration / 2, duration / 6))
-            pid_string = '#{0:05d}'.format(pid)
-            destination = choice(list(self.floors.values()))
-            self.people.append(Person(self, pid_string, PersonStatus.idle,
-                                      None, destination, event_time))
+        '''Plan when and where people will enter the simulation.
 
-    def step(self):
-        '''Run a single step of the simulation.'''
+        People are only planned: they become live entities when their time
+        comes, and are dropped as soon as they reach their destination.  With
+        the `arrays` backend, people are not actors but rows in the arrays of
+        a `Population` (this requires NumPy).
+        '''
+        population = self.description['people']['population']
+        levels = sorted(self.floors)
+        entries = [l for l in levels if self.floors[l].is_entry]
+        exits = [l for l in levels if self.floors[l].is_exit]
+        self.pending = Arrivals(population, self.duration, levels, entries,
+                                exits, self.rng)
+        self.population = None
+        if self.description['people'].get('backend', 'actors') == 'arrays':
+            from .population import Population
+            self.population = Population(self.floors, self.lifts.values(),
+                                         population, self.now)
+
+    def _init_journal(self, fname, compress):
+        '''Start recording the journal of the run.
+
+        The header holds what it takes to build the same simulation again,
+        in the same state.
+        '''
+        header = {
+            'description': self.description,
+            'fast_forward': self.fast_forward,
+            'stats_every': self.stats_every,
+            'rng_state': self.rng.getstate(),
+        }
+        self.journal = JournalWriter(fname, header, compress)
+        self.interface.journal = self.journal
+
+    def __getstate__(self):
+        # The interface is bound to files and to a client, and the journal to
+        # a file, as is the shared state: restoring a checkpoint attaches a
+        # new interface, and none of the others
+        state = self.__dict__.copy()
+        del state['interface']
+        state['journal'] = None
+        state['shared_state'] = None
+        return state
+
+    def now(self):
+        '''Return the current simulation time.'''
+        return self.clock
+
+    @property
+    def in_building(self):
+        '''Return the number of people in the simulation right now.'''
+        if self.population is not None:
+            return self.population.in_building
+        return len(self.registry.actors_by_id[Person])
+
+    def queue_length(self, level):
+        '''Return the number of people waiting at a floor.'''
+        if self.population is not None:
+            return self.population.queue_length(level)
+        return sum(map(len, self.floors[level].waiting.values()))
+
+    @property
+    def done(self):
+        '''Return True when everybody has reached their destination.'''
+        return not self.pending and not self.in_building
+
+    @property
+    def overdue(self):
+        '''Return True if the simulation has exceeded its time limit.'''
+        return self.clock > self.duration + POST_END_GRACE_PERIOD
+
+    def spawn(self, arrival):
+        '''Have a person enter the simulation.'''
+        if self.population is not None:
+            self.population.spawn(arrival)
+            return
+        Person(arrival.pid, self.floors[arrival.origin],
+               self.floors[arrival.destination])
+
+    def route(self, command, lift=None, *args):
+        '''Deliver a client command to the only lift it concerns.'''
+        if command is Command.ready:
+            return
+        post('command.{}'.format(command.name), lift, *args)
+
+    def start_turn(self, commands):
+        '''Execute the client `commands` and announce a new turn.'''
+        if self.opening_commands:
+            commands = chain(self.opening_commands, commands)
+            self.opening_commands = []
+        for command, *args in commands:
+            self.route(command, *args)
         self.step_counter += 1
-        self.route(Message.turn, None, self.step_counter)
-        elapsed = time() - self.start_time
-        log.debug('Step {} ({:.3f} s)', self.step_counter, elapsed)
-        for command, entity, floor in self.interface.get_commands():
-            self.route(command, entity, floor)
-        for person in self.people:
-            person.step(elapsed)
-        intended_duration = self.start_time + GRANULARITY * self.step_counter
-        sleep_duration = max(intended_duration - time(), 0)
-        sleep(sleep_duration)
+        self.interface.send_message(Message.turn, self.step_counter)
+        process_events()
+        if self.stats_every and not self.step_counter % self.stats_every:
+            self.interface.send_message(Message.stats,
+                                        json.dumps(self.stats()))
+
+    def step(self):
+        '''Run a single turn of the simulation, in real time.'''
+        self.registry.activate()
+        self.start_turn(self.interface.get_commands())
+        self.clock += self.turn_duration
+        for arrival in self.pending.pop_due(self.clock):
+            self.spawn(arrival)
+        broadcast('turn.start', self.turn_duration)
+        process_events()
+        self.end_turn()
+
+    def end_turn(self):
+        '''Publish the state of the world, and tell the client to play.'''
+        if self.shared_state is not None:
+            self.shared_state.publish(self.step_counter)
+        self.interface.send_message(Message.ready)
 
     def check_client_is_ready(self):
-        '''Return True if the client AI is ready to play.'''
+        '''Return True if the client AI is ready to play.
+
+        Commands sent after READY, in the same write, are kept for the first
+        turn.
+        '''
         start_waiting_time = time()
         while time() < start_waiting_time + CLIENT_BOOT_GRACE_PERIOD:
-            if False:  # Change with real test
+            if any(payload[0] is Command.ready
+                   for payload in self.interface.get_commands()):
+                self.opening_commands = list(self.interface.get_commands())
                 yield True
+                return
             yield False
 
-    def run(self):
-        '''Run the simulation.'''
+    def world(self):
+        '''Return the description of the world, as sent to the client.'''
+        keys = ('id', 'clocking', 'building', 'lifts')
+        return {key: self.description[key] for key in keys}
+
+    def stats(self):
+        '''Return the statistics of the simulation.'''
+        population = self.description['people']['population']
+        stats = {
+            'turns': self.step_counter,
+            'simulated_seconds': self.clock,
+            'population': population,
+            'delivered': population - len(self.pending) - self.in_building,
+        }
+        stats.update(self.collector.report())
+        if self.handler_stats is not None:
+            stats['profile'] = self.handler_stats.report()
+        return stats
+
+    def checkpoint(self):
+        '''Return the complete state of the simulation, as compressed bytes.
+
+        The checkpoint holds everything but the interface: all the actors and
+        their pending events, the random number generator, the clock and the
+        turn counter, and the planned events of a fast-forward run.
+        '''
+        self.registry.activate()
+        interface = self.interface
+        # Interfaces which are actors have to be taken out of the registry
+        is_actor = isinstance(interface, Actor)
+        if is_actor:
+            kill(interface)
+        try:
+            data = pickle.dumps(self, pickle.HIGHEST_PROTOCOL)
+        finally:
+            if is_actor:
+                self.registry.actors.add(interface)
+                by_id = self.registry.actors_by_id[interface.__class__]
+                by_id[interface.id] = interface
+                interface.plug()
+        return zlib.compress(data)
+
+    def save_checkpoint(self, fname):
+        '''Write a checkpoint of the simulation to a file.'''
+        with open(fname, 'wb') as file_:
+            file_.write(self.checkpoint())
+
+    @staticmethod
+    def from_checkpoint(data, interface_dir='/tmp/lifts',
+                        interface_class=None):
+        '''Return the simulation saved in the `data` of a checkpoint.
+
+        The simulation gets a new interface, as per `interface_dir` and
+        `interface_class`, and becomes the active one.
+        '''
+        simulation = pickle.loads(zlib.decompress(data))
+        simulation.registry.activate()
+        simulation.interface = (interface_class or FileInterface)(
+            interface_dir)
+        return simulation
+
+    @classmethod
+    def load_checkpoint(cls, fname, interface_dir='/tmp/lifts',
+                        interface_class=None):
+        '''Return the simulation saved in a checkpoint file.'''
+        with open(fname, 'rb') as file_:
+            return cls.from_checkpoint(file_.read(), interface_dir,
+                                       interface_class)
+
+    def fork(self, interface_dir, interface_class=None):
+        '''Return an independent copy of the simulation, as it is now.
+
+        The copy lives in the same process, with its own actors, and becomes
+        the active simulation.  By default it has an interface of the same
+        class as this simulation.
+        '''
+        interface_class = interface_class or self.interface.__class__
+        return self.from_checkpoint(self.checkpoint(), interface_dir,
+                                    interface_class)
+
+    def run(self, checkpoint_at=None):
+        '''Run the simulation.
+
+        Arguments:
+            checkpoint_at: if not None, a (turn, file name) pair telling when
+                to save a checkpoint, and where
+        '''
+        self.begin()
         log.debug('Waiting for the AI client to signal their readiness.')
         checker = self.check_client_is_ready()
         try:
             while not next(checker):
-                sleep(0.5)
+                self.interface.wait(HANDSHAKE_WAIT)
         except StopIteration:
             log.critical('The client never sent the READY signal.')
             exit(1)
         log.info('Simulation started')
-        # Set time limits and utility functions
-        duration = self.description['simulation']['duration_min']
-        self.start_time = time()
-        hard_limit = self.start_time + duration + POST_END_GRACE_PERIOD
-        overdue = lambda: time() > hard_limit
-        done = lambda: all(p.status == PersonStatus.done for p in self.people)
-        # Run the main loop
-        while not done():
-            if overdue():
+        start_time = time()
+        if self.fast_forward:
+            if checkpoint_at is not None:
+                turn, fname = checkpoint_at
+                self.run_fast_forward(turns=turn - self.step_counter)
+                self.save_checkpoint(fname)
+            self.run_fast_forward()
+        else:
+            self.run_real_time(start_time, checkpoint_at)
+        self.finish(time() - start_time)
+
+    def begin(self):
+        '''Send the description of the world to the client.'''
+        self.registry.activate()
+        self.interface.send_message(Message.world, json.dumps(self.world()))
+
+    def finish(self, elapsed):
+        '''Send the final statistics, after `elapsed` seconds of running.'''
+        self.registry.activate()
+        self.interface.send_message(Message.end)
+        self.interface.send_message(Message.stats, json.dumps(self.stats()))
+        self.interface.flush()
+        if self.journal is not None:
+            self.journal.close()
+        if self.shared_state is not None:
+            self.shared_state.close()
+        log.info('Simulation ended, total duration: {:.3f} seconds', elapsed)
+
+    def run_real_time(self, start_time, checkpoint_at=None):
+        '''Run turns at the pace of `client_turn_ms` each.'''
+        first_turn = self.step_counter
+        while not self.done:
+            if self.overdue:
                 log.error('Hard time limit hit')
                 break
             self.step()
-        # Post-simulation operations
-        elapsed = time() - self.start_time
-        self.route(Message.ended)
-        log.info('Simulation ended, total duration: {:.3f} seconds', elapsed)
+            if checkpoint_at is not None and \
+                    checkpoint_at[0] == self.step_counter:
+                self.save_checkpoint(checkpoint_at[1])
+            if not self.paced:
+                continue
+            turns = self.step_counter - first_turn
+            intended_end = start_time + self.turn_timeout * turns
+            sleep(max(intended_end - time(), 0))
+
+    def _init_fast_forward(self):
+        '''Plan the first events of a fast-forward run.'''
+        self.scheduler = Scheduler(now=self.clock)
+        # Only the next arrival is ever in the queue
+        if self.pending:
+            self.scheduler.schedule(self.pending.peek().time, Stage.spawn)
+        self.scheduler.schedule(self.clock, Stage.turn)
+        self._lift_clocks = {lift: self.clock for lift in self.lifts.values()}
+        self._lift_versions = {lift: 0 for lift in self.lifts.values()}
+
+    def _advance(self, lift):
+        '''Bring the lift position up to date with the clock.'''
+        lift.take_turn(self.clock - self._lift_clocks[lift])
+        self._lift_clocks[lift] = self.clock
+        process_events()
+
+    def _advance_fleet(self):
+        '''Bring all the lifts up to date with the clock.
+
+        The lifts are moved at once, then their moves are processed one lift
+        after the other, as `_advance` would.
+        '''
+        fleet = self.fleet
+        elapsed = [self.clock - self._lift_clocks[lift] for lift in
+                   fleet.lifts]
+        moves = {move[0]: move for move in fleet.move(elapsed)}
+        for lift in fleet.lifts:
+            if lift in moves:
+                fleet.announce(*moves[lift])
+            self._lift_clocks[lift] = self.clock
+            process_events()
+
+    def _reschedule(self, lift):
+        '''Schedule the next stage of the lift, forgetting previous ones.'''
+        self._lift_versions[lift] += 1
+        delay = lift.seconds_to_next_stage
+        if delay is not None:
+            payload = (lift, self._lift_versions[lift])
+            self.scheduler.schedule(self.clock + delay, Stage.lift, payload)
+
+    def run_fast_forward(self, turns=None):
+        '''Run as a discrete-event simulation on a virtual clock.
+
+        Spawns, lifts reaching their next floor and the client turn deadlines
+        are all events in a priority queue.  The clock jumps from one event to
+        the next, and a turn ends as soon as the client has sent READY.
+
+        If `turns` is not None, return as soon as that many more turns have
+        been played: a later call resumes the run where it was left.
+        '''
+        engine = self.fast_forward_engine(turns)
+        commands = None
+        try:
+            while True:
+                engine.send(commands)
+                commands = self.interface.get_turn_commands(self.turn_timeout)
+        except StopIteration:
+            pass
+
+    def fast_forward_engine(self, turns=None):
+        '''Return a generator running the simulation on a virtual clock.
+
+        The generator stops each time the client has to play, and expects the
+        commands of the client to be sent in.  This way, the caller decides
+        how to wait for them (see `run_fast_forward`).
+        '''
+        self.registry.activate()
+        if self.scheduler is None:
+            self._init_fast_forward()
+        scheduler = self.scheduler
+        played = 0
+        while scheduler:
+            stage, payload = scheduler.pop()
+            self.clock = scheduler.now
+            if stage is Stage.spawn:
+                self.spawn(self.pending.pop())
+                if self.pending:
+                    scheduler.schedule(self.pending.peek().time, Stage.spawn)
+                process_events()
+            elif stage is Stage.lift:
+                lift, version = payload
+                if version != self._lift_versions[lift]:
+                    continue
+                self._advance(lift)
+                self._reschedule(lift)
+            elif stage is Stage.turn:
+                if played == turns:
+                    scheduler.schedule(self.clock, Stage.turn)
+                    return
+                if self.step_counter:
+                    self.end_turn()
+                if self.done:
+                    break
+                if self.overdue:
+                    log.error('Hard time limit hit')
+                    break
+                commands = []
+                if self.step_counter:
+                    commands = yield
+                    # Other simulations may have run in the meantime
+                    self.registry.activate()
+                # Lifts are brought up to the start of the turn before the
+                # commands change their course, so that idle time is never
+                # counted as travel
+                if self.fleet is None:
+                    for lift in self.lifts.values():
+                        self._advance(lift)
+                else:
+                    self._advance_fleet()
+                self.start_turn(commands)
+                played += 1
+                for lift in self.lifts.values():
+                    self._reschedule(lift)
+                scheduler.schedule(self.clock + self.turn_duration, Stage.turn)
+
+
+def interface_class_from(args):
+    '''Return the class of the interface asked for on the command line.'''
+    if args['--transport'] not in TRANSPORTS:
+        exit('Unknown transport "{}"'.format(args['--transport']))
+    interface_class = TRANSPORTS[args['--transport']]
+    if interface_class is ProcessInterface:
+        if not args['--client']:
+            exit('The stdio transport needs a --client')
+        interface_class = partial(ProcessInterface,
+                                  command=shlex.split(args['--client']))
+    return interface_class
 
 
 def main():
     args = docopt(__doc__, version='0.1')
+    if args['batch']:
+        from .batch import main as batch_main
+        batch_main(args)
+        return
+    if args['serve']:
+        from .server import main as server_main
+        server_main(args)
+        return
+    if args['replay']:
+        from .journal import replay
+        simulation, divergence = replay(args['<journal>'])
+        print(json.dumps(simulation.stats(), indent=2))
+        exit(1 if divergence else 0)
+    if args['shard']:
+        from .shards import main as shards_main
+        shards_main(args)
+        return
+    interface_dir = args['<file-interface-dir>'] or '/tmp/lifts'
+    interface_class = interface_class_from(args)
+    if args['restore']:
+        simulation = Simulation.load_checkpoint(
+            args['<checkpoint>'], interface_dir, interface_class)
+        simulation.run()
+        simulation.interface.close()
+        return
     simulation = Simulation(
-        sim_file=args['<sim-file>'],
-        interface_dir=args['<file-interface-dir>'])
-    simulation.run()
+        sim_file=args['<sim-file>'][0],
+        interface_dir=interface_dir,
+        interface_class=interface_class,
+        fast_forward=args['--fast-forward'],
+        profile=bool(args['--profile']),
+        stats_every=int(args['--stats-every'] or 0),
+        use_cache=not args['--no-cache'],
+        journal=args['--journal'],
+        compress_journal=not args['--raw-journal'],
+        shared_state=args['--shared-state'])
+    checkpoint_at = None
+    if args['--checkpoint']:
+        checkpoint_at = (int(args['--checkpoint-turn']), args['--checkpoint'])
+    if args['--profile']:
+        from .profiling import run_profiled
+        run_profiled(simulation, args['--profile'], checkpoint_at)
+    else:
+        simulation.run(checkpoint_at)
+    simulation.interface.close()
 
 if __name__ == '__main__':
     main()
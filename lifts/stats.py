@@ -0,0 +1,212 @@
+'''
+Streaming statistics of the simulation.
+
+Every figure is updated in constant time and memory as events happen, so that
+no per-person history has to be kept, however long the simulation runs.
+'''
+from bisect import bisect_left
+from math import sqrt
+
+from simpleactors import on, Actor
+
+# Upper bounds (in seconds) of the buckets of the latency histograms, the last
+# bucket taking whatever is above
+LATENCY_BOUNDS = (5, 10, 20, 30, 45, 60, 90, 120, 180, 300, 600)
+
+
+class Histogram:
+
+    '''
+    Counts of values falling in fixed buckets.
+
+    Arguments:
+        bounds: the sorted upper bounds (included) of the buckets
+    '''
+
+    def __init__(self, bounds=LATENCY_BOUNDS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+
+    def add(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+
+    def merge(self, other):
+        '''Add the counts of a histogram with the same buckets.'''
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+
+    def report(self):
+        return {'bounds': list(self.bounds), 'counts': list(self.counts)}
+
+
+class RunningStats:
+
+    '''
+    Count, extremes, mean and variance of a stream of values.
+
+    The mean and variance are updated with Welford's algorithm, which is
+    numerically stable.  A histogram of the values is kept too.
+
+    Arguments:
+        bounds: the upper bounds of the buckets of the histogram
+    '''
+
+    def __init__(self, bounds=LATENCY_BOUNDS):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0  # Sum of the squared differences from the mean
+        self.min = self.max = None
+        self.histogram = Histogram(bounds)
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        self.histogram.add(value)
+
+    def add_many(self, values):
+        for value in values:
+            self.add(float(value))
+
+    def merge(self, other):
+        '''Add the values of another `RunningStats`, as if added one by one.
+
+        Means and variances are combined as per Chan et al.
+        '''
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * (other.count / count)
+        self.count = count
+        if self.min is None or other.min < self.min:
+            self.min = other.min
+        if self.max is None or other.max > self.max:
+            self.max = other.max
+        self.histogram.merge(other.histogram)
+
+    @property
+    def variance(self):
+        '''Return the population variance of the values so far.'''
+        return self._m2 / self.count if self.count else 0.0
+
+    @property
+    def stdev(self):
+        '''Return the population standard deviation of the values so far.'''
+        return sqrt(self.variance)
+
+    def report(self):
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'stdev': self.stdev,
+            'min': self.min,
+            'max': self.max,
+            'histogram': self.histogram.report(),
+        }
+
+
+class StatsCollector(Actor):
+
+    '''
+    Listen to the simulation events, and keep statistics about them.
+
+    Times are tracked for waiting (from calling a lift to boarding one),
+    riding (from boarding to alighting) and whole journeys (from entering the
+    simulation to reaching the destination).  For each lift, the floors
+    travelled and the number of starts and stops are counted, starts being
+    what costs the most energy.
+
+    People stored as actors report one event at a time, while the arrays
+    backend reports the times of all the people concerned at once.
+
+    Arguments:
+        clock: a callable returning the current simulation time
+    '''
+
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+        self.wait = RunningStats()
+        self.ride = RunningStats()
+        self.journey = RunningStats()
+        self.lifts = {}
+        # Only for people currently in the building
+        self._entered = {}
+        self._since = {}  # When they started waiting or riding
+        self._moving = set()
+
+    def _lift(self, lift):
+        try:
+            return self.lifts[lift.id]
+        except KeyError:
+            entry = {'floors_travelled': 0, 'starts': 0, 'stops': 0}
+            return self.lifts.setdefault(lift.id, entry)
+
+    def _move(self, lift, floors=1):
+        '''Account for a lift having moved some floors.'''
+        entry = self._lift(lift)
+        entry['floors_travelled'] += floors
+        if lift not in self._moving:
+            self._moving.add(lift)
+            entry['starts'] += 1
+        return entry
+
+    @on('person.enter')
+    def on_person_enter(self, person):
+        self._entered[person] = self._since[person] = self.clock()
+
+    @on('person.lift.on')
+    def on_person_lift_on(self, person, lift):
+        now = self.clock()
+        self.wait.add(now - self._since[person])
+        self._since[person] = now
+
+    @on('person.lift.off')
+    def on_person_lift_off(self, person, lift):
+        now = self.clock()
+        self.ride.add(now - self._since[person])
+        self._since[person] = now
+
+    @on('person.arrived')
+    def on_person_arrived(self, person):
+        self.journey.add(self.clock() - self._entered.pop(person))
+        del self._since[person]
+
+    @on('people.lift.on')
+    def on_people_lift_on(self, lift, waits):
+        self.wait.add_many(waits)
+
+    @on('people.lift.off')
+    def on_people_lift_off(self, lift, rides):
+        self.ride.add_many(rides)
+
+    @on('people.arrived')
+    def on_people_arrived(self, journeys):
+        self.journey.add_many(journeys)
+
+    @on('lift.transit')
+    def on_lift_transit(self, lift, floor, start=None):
+        if start is None:
+            self._move(lift)
+        else:
+            self._move(lift, abs(floor.level - start.level) + 1)
+
+    @on('lift.arrive')
+    def on_lift_arrive(self, lift, floor):
+        self._move(lift)['stops'] += 1
+        self._moving.discard(lift)
+
+    def report(self):
+        '''Return the statistics so far.'''
+        return {
+            'wait': self.wait.report(),
+            'ride': self.ride.report(),
+            'journey': self.journey.report(),
+            'lifts': {lid: dict(entry) for lid, entry in self.lifts.items()},
+        }
@@ -0,0 +1,330 @@
+'''
+Transports for the text protocol, other than regular files.
+
+Regular files have to be polled, and every line written hits the file system.
+The transports here exchange the very same lines over named pipes, a Unix
+domain socket or the standard streams of the client process, and wait for the
+client with a selector: the engine wakes up as soon as a line comes in.
+'''
+import errno
+import os
+import selectors
+import socket
+import subprocess
+from time import sleep, time
+
+from simpleactors import Actor
+
+from .common import log
+from .interface import FileInterface, block_size
+
+READ_SIZE = 1 << 16
+CLIENT_CONNECT_TIMEOUT = 10  # in seconds
+CLIENT_CONNECT_POLL = 0.01  # in seconds
+CLIENT_EXIT_GRACE_PERIOD = 5  # in seconds
+
+
+class StreamInterface(FileInterface):
+
+    '''
+    A player interface over a byte stream, waited on with a selector.
+
+    Subclasses provide the stream, implementing `fileno` (the descriptor to
+    wait on, None if there is none yet), `receive` (the bytes available, b''
+    at the end of the stream, None if there are none right now) and `send`.
+    '''
+
+    def __init__(self):
+        Actor.__init__(self)
+        self._buffer = b''
+        self._eof = False
+        self._selector = selectors.DefaultSelector()
+        self._watched = None
+
+    def fileno(self):
+        raise NotImplementedError
+
+    def receive(self):
+        raise NotImplementedError
+
+    def send(self, data):
+        raise NotImplementedError
+
+    def _fill(self, size=None):
+        '''Receive data until a line (or `size` bytes) is buffered.'''
+        while not self._eof:
+            if size is None and b'\n' in self._buffer:
+                break
+            if size is not None and len(self._buffer) >= size:
+                break
+            data = self.receive()
+            if data is None:
+                break
+            if not data:
+                log.debug('The client closed the connection')
+                self._eof = True
+            self._buffer += data
+
+    def read(self):
+        if self._block:
+            return self._block.popleft()
+        if self.codec is not None:
+            self._fill(self.codec.size)
+            if len(self._buffer) < self.codec.size:
+                return None
+            record = self._buffer[:self.codec.size]
+            self._buffer = self._buffer[self.codec.size:]
+            return record
+        self._fill()
+        if b'\n' in self._buffer:
+            line, rest = self._buffer.split(b'\n', 1)
+        elif self._eof and self._buffer:
+            line, rest = self._buffer, b''
+        else:
+            return None
+        size = block_size(line.decode('utf-8'))
+        if size is None:
+            self._buffer = rest
+            return line.decode('utf-8').strip()  # Takes care of empty lines
+        start = len(line) + 1
+        self._fill(start + size)
+        if len(self._buffer) < start + size:  # Not completely received yet
+            return None
+        block = self._buffer[start:start + size]
+        self._buffer = self._buffer[start + size:]
+        self.unpack_block(block.decode('utf-8'))
+        return self.read()
+
+    def write(self, line):
+        self.send(line.strip().encode('utf-8') + b'\n')
+
+    def write_bytes(self, data):
+        self.send(data)
+
+    def open_binary(self):
+        # Streams are binary already
+        pass
+
+    def wait(self, timeout):
+        '''Wait at most `timeout` seconds for lines from the client.'''
+        fileno = self.fileno()
+        if self._eof or fileno is None:
+            sleep(max(timeout, 0))
+            return
+        if fileno != self._watched:
+            if self._watched is not None:
+                self._selector.unregister(self._watched)
+            self._selector.register(fileno, selectors.EVENT_READ)
+            self._watched = fileno
+        self._selector.select(max(timeout, 0))
+
+    def close(self):
+        self._selector.close()
+
+
+class FifoInterface(StreamInterface):
+
+    '''
+    A player interface using named pipes.
+
+    The pipes are named as the files of `FileInterface`, so that clients
+    reading and writing them line by line work unchanged.
+
+    Arguments:
+        directory: the directory where to create the named pipes
+    '''
+
+    def __init__(self, directory):
+        super().__init__()
+        directory = os.path.realpath(directory)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.in_name = os.path.join(directory, 'lifts.in')
+        self.out_name = os.path.join(directory, 'lifts.out')
+        self.cleanup()
+        os.mkfifo(self.in_name)
+        os.mkfifo(self.out_name)
+        self._in = os.open(self.in_name, os.O_RDONLY | os.O_NONBLOCK)
+        # Holding a writing end ourselves, the pipe never reaches its end,
+        # even before the client opens it: no spurious wake-ups
+        self._keep_open = os.open(self.in_name, os.O_WRONLY | os.O_NONBLOCK)
+        self._out = None
+
+    def fileno(self):
+        return self._in
+
+    def receive(self):
+        try:
+            return os.read(self._in, READ_SIZE)
+        except BlockingIOError:
+            return None
+
+    def _connect(self, timeout):
+        '''Open the client pipe, once the client has opened it to read.'''
+        deadline = time() + timeout
+        while True:
+            try:
+                # Opening a pipe nobody reads fails rather than block
+                self._out = os.open(self.out_name,
+                                    os.O_WRONLY | os.O_NONBLOCK)
+            except OSError as error:
+                if error.errno != errno.ENXIO:
+                    raise
+                if time() > deadline:
+                    raise ConnectionError('The client never opened the pipe')
+                sleep(CLIENT_CONNECT_POLL)
+                continue
+            os.set_blocking(self._out, True)
+            return
+
+    def send(self, data):
+        if self._out is None:
+            self._connect(CLIENT_CONNECT_TIMEOUT)
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self._out, view):]
+
+    def close(self):
+        super().close()
+        for fd in (self._in, self._keep_open, self._out):
+            if fd is not None:
+                os.close(fd)
+        self.cleanup()
+
+
+class SocketInterface(StreamInterface):
+
+    '''
+    A player interface using a Unix domain socket, `lifts.sock`.
+
+    The client connects to the socket, and exchanges lines over it both ways.
+
+    Arguments:
+        directory: the directory where to create the socket
+    '''
+
+    def __init__(self, directory):
+        super().__init__()
+        directory = os.path.realpath(directory)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.sock_name = os.path.join(directory, 'lifts.sock')
+        self.cleanup()
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.sock_name)
+        self._server.listen(1)
+        self._server.setblocking(False)
+        self._connection = None
+
+    def cleanup(self):
+        try:
+            os.remove(self.sock_name)
+        except FileNotFoundError:
+            pass
+
+    def _accept(self, timeout=0):
+        '''Accept the client connection, if it is there within `timeout`.'''
+        self._server.settimeout(timeout)
+        try:
+            self._connection, _ = self._server.accept()
+        except (BlockingIOError, socket.timeout):
+            return False
+        self._connection.setblocking(False)
+        return True
+
+    def fileno(self):
+        # Until the client connects, wait for it to do so
+        if self._connection is None:
+            return self._server.fileno()
+        return self._connection.fileno()
+
+    def receive(self):
+        if self._connection is None and not self._accept():
+            return None
+        try:
+            return self._connection.recv(READ_SIZE)
+        except BlockingIOError:
+            return None
+
+    def send(self, data):
+        if self._connection is None and \
+                not self._accept(CLIENT_CONNECT_TIMEOUT):
+            raise ConnectionError('The client never connected')
+        self._connection.setblocking(True)
+        try:
+            self._connection.sendall(data)
+        finally:
+            self._connection.setblocking(False)
+
+    def close(self):
+        super().close()
+        if self._connection is not None:
+            self._connection.close()
+        self._server.close()
+        self.cleanup()
+
+
+class ProcessInterface(StreamInterface):
+
+    '''
+    A player interface talking to a client process over its standard streams.
+
+    The client is launched by the interface, and reads messages from its
+    standard input and writes commands to its standard output.
+
+    Arguments:
+        directory: the working directory of the client
+        command: the command line of the client, as a list
+    '''
+
+    def __init__(self, directory, command):
+        super().__init__()
+        directory = os.path.realpath(directory)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.process = subprocess.Popen(command, cwd=directory,
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE)
+        self._out = self.process.stdout.fileno()
+        os.set_blocking(self._out, False)
+
+    def cleanup(self):
+        pass
+
+    def fileno(self):
+        return self._out
+
+    def receive(self):
+        try:
+            return os.read(self._out, READ_SIZE)
+        except BlockingIOError:
+            return None
+
+    def send(self, data):
+        try:
+            self.process.stdin.write(data)
+            self.process.stdin.flush()
+        except BrokenPipeError:
+            log.debug('The client is gone')
+            self._eof = True
+
+    def close(self):
+        super().close()
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        try:
+            self.process.wait(CLIENT_EXIT_GRACE_PERIOD)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process.stdout.close()
+
+
+TRANSPORTS = {
+    'file': FileInterface,
+    'fifo': FifoInterface,
+    'socket': SocketInterface,
+    'stdio': ProcessInterface,
+}
@@ -0,0 +1,166 @@
+'''
+Many episodes of a simulation, stepped in lockstep with batched arrays.
+
+`VectorEnvironment` runs N independent episodes of the same simulation file,
+each with its own seed.  Observations are NumPy arrays with the episodes along
+the first axis, and actions are an array of one code per lift:
+
+- `NOOP`: leave the lift alone
+- `CLOSE`: close the doors
+- `OPEN_UP`, `OPEN_DOWN`, `OPEN`: open the doors, promising to go up, down or
+  nowhere in particular
+- `GOTO + n`: go to the n-th floor
+
+Floors are counted from the bottom one (`levels` holds their numbers), and
+lifts are in the order of the simulation file.  Episodes that end are started
+again right away, with the next seed: the observation returned is the one of
+the new episode, and the info of the finished one holds its statistics.
+
+NumPy is needed (`pip install lifts[arrays]`).
+'''
+import marshal
+
+import numpy as np
+
+from .common import Command, Direction
+from .env import Environment
+
+NOOP, CLOSE, OPEN_UP, OPEN_DOWN, OPEN, GOTO = range(6)
+OPEN_INTENTS = {OPEN_UP: Direction.up, OPEN_DOWN: Direction.down,
+                OPEN: Direction.none}
+DIRECTION_SIGNS = {Direction.up: 1, Direction.down: -1, Direction.none: 0}
+
+
+class VectorEnvironment:
+
+    '''
+    Independent episodes of a simulation, advanced together.
+
+    Arguments:
+        sim_file: the master TOML file describing the simulation
+        size: the number of episodes played at once
+        use_cache: if False, parse the simulation file even if a cached
+            expansion of it is available
+    '''
+
+    def __init__(self, sim_file, size, use_cache=True):
+        first = Environment(sim_file, use_cache)
+        description = marshal.loads(first._description)
+        self.envs = [first] + [Environment(None, description=description)
+                               for _ in range(size - 1)]
+        self.size = size
+        self.lift_ids = [lift['lid'] for lift in description['lifts']]
+        self.levels = sorted(floor['level'] for floor in
+                             description['building'])
+        self._floor_index = {level: n for n, level in enumerate(self.levels)}
+        self.action_count = GOTO + len(self.levels)
+        shape = (size, len(self.lift_ids))
+        self.observation = {
+            'turn': np.zeros(size, dtype=np.int32),
+            'location': np.zeros(shape, dtype=np.int32),
+            'direction': np.zeros(shape, dtype=np.int8),
+            'open_doors': np.zeros(shape, dtype=bool),
+            'load': np.zeros(shape, dtype=np.int32),
+            'calls': np.zeros((size, len(self.levels), 2), dtype=bool),
+            'queues': np.zeros((size, len(self.levels)), dtype=np.int32),
+        }
+        self._next_seed = 0
+
+    def _start(self, index):
+        '''Start a new episode in the `index`-th environment.'''
+        self.envs[index].reset(self._next_seed)
+        self._next_seed += 1
+
+    def _observe(self, index):
+        '''Write the state of the `index`-th episode in the observation.'''
+        simulation = self.envs[index].simulation
+        observation = self.observation
+        floor_index = self._floor_index
+        observation['turn'][index] = simulation.step_counter
+        location = observation['location'][index]
+        direction = observation['direction'][index]
+        open_doors = observation['open_doors'][index]
+        load = observation['load'][index]
+        fleet = simulation.fleet
+        if fleet is not None:
+            # Rows of the fleet are in the order of the simulation file, and
+            # its floors are counted from the bottom one too
+            location[:] = fleet.position
+            open_doors[:] = fleet.open_doors
+            load[:] = fleet.load
+            for n, lift in enumerate(fleet.lifts):
+                direction[n] = DIRECTION_SIGNS[lift.direction]
+        else:
+            for n, lid in enumerate(self.lift_ids):
+                lift = simulation.lifts[lid]
+                location[n] = floor_index[lift.location.level]
+                direction[n] = DIRECTION_SIGNS[lift.direction]
+                open_doors[n] = lift.open_doors
+                load[n] = lift.load
+        calls = observation['calls'][index]
+        queues = observation['queues'][index]
+        for n, level in enumerate(self.levels):
+            lit = simulation.floors[level].requested_directions
+            calls[n, 0] = Direction.up in lit
+            calls[n, 1] = Direction.down in lit
+            queues[n] = simulation.queue_length(level)
+
+    def _commands(self, index, actions):
+        '''Return the commands for the actions of the `index`-th episode.'''
+        simulation = self.envs[index].simulation
+        levels = self.levels
+        commands = []
+        for n in np.flatnonzero(actions).tolist():
+            lift = simulation.lifts[self.lift_ids[n]]
+            action = int(actions[n])
+            if action == CLOSE:
+                commands.append((Command.close, lift))
+            elif action in OPEN_INTENTS:
+                commands.append((Command.open, lift, OPEN_INTENTS[action]))
+            else:
+                commands.append((Command.goto, lift,
+                                 simulation.floors[levels[action - GOTO]]))
+        return commands
+
+    def reset(self, seed=None):
+        '''Start all the episodes, and return the first observation.
+
+        Episodes get consecutive seeds, starting from `seed` (or 0).
+        '''
+        if seed is not None:
+            self._next_seed = seed
+        for index in range(self.size):
+            self._start(index)
+            self._observe(index)
+        return self.observation
+
+    def step(self, actions):
+        '''Play a turn of every episode, with an array of actions.
+
+        Return the observation, the rewards (as per `Environment.step`), the
+        terminated and truncated flags, and a list with the info of each
+        episode.  The observation arrays are updated in place.
+        '''
+        actions = np.asarray(actions)
+        if actions.shape != (self.size, len(self.lift_ids)):
+            raise ValueError('Expected actions of shape {}, got {}'.format(
+                (self.size, len(self.lift_ids)), actions.shape))
+        if actions.min(initial=0) < 0 or \
+                actions.max(initial=0) >= self.action_count:
+            raise ValueError('Actions out of range')
+        rewards = np.zeros(self.size)
+        terminated = np.zeros(self.size, dtype=bool)
+        truncated = np.zeros(self.size, dtype=bool)
+        infos = [{} for _ in range(self.size)]
+        for index, env in enumerate(self.envs):
+            over = env.play(self._commands(index, actions[index]))
+            simulation = env.simulation
+            simulation.interface.collect()  # Nobody reads the messages
+            rewards[index] = -simulation.in_building
+            if over:
+                terminated[index] = simulation.done
+                truncated[index] = not simulation.done
+                infos[index]['stats'] = simulation.stats()
+                self._start(index)
+            self._observe(index)
+        return self.observation, rewards, terminated, truncated, infos
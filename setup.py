@@ -43,6 +43,7 @@ setup(
     # Dependencies
     install_requires=['simpleactors', 'Logbook', 'toml', 'docopt'],
     extras_require={
+        'arrays': ['numpy'],
         'dev': ['pypandoc', 'wheel>=0.24.0', 'twine'],
         'test': ['nose', 'rednose', 'coverage'],
     },
@@ -50,6 +51,7 @@ setup(
     entry_points={
         'console_scripts': [
             'lifts=lifts.simulation:main',
+            'lifts-benchmark=lifts.benchmark:main',
         ],
     },
 
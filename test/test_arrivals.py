@@ -0,0 +1,72 @@
+'''
+Test suite for the arrivals module.
+'''
+
+import unittest
+from random import seed
+from statistics import mean, stdev
+
+from lifts.arrivals import Arrivals
+
+
+class TestArrivals(unittest.TestCase):
+
+    '''Tests for the Arrivals class.'''
+
+    def setUp(self):
+        seed(42)
+        self.arrivals = Arrivals(1000, 600, [0, 1, 2, 3], [0], [0])
+
+    def test_length(self):
+        '''The number of arrivals shrinks as they are consumed.'''
+        self.assertEqual(1000, len(self.arrivals))
+        self.arrivals.pop()
+        self.assertEqual(999, len(self.arrivals))
+
+    def test_peek(self):
+        '''Peeking does not consume the arrival.'''
+        arrival = self.arrivals.peek()
+        self.assertIs(arrival, self.arrivals.peek())
+        self.assertIs(arrival, self.arrivals.pop())
+        self.assertIsNot(arrival, self.arrivals.peek())
+
+    def test_exhausted(self):
+        '''Nothing is left once everybody arrived.'''
+        arrivals = list(self.arrivals.pop_due(600))
+        self.assertEqual(1000, len(arrivals))
+        self.assertFalse(self.arrivals)
+        self.assertIsNone(self.arrivals.peek())
+        self.assertRaises(IndexError, self.arrivals.pop)
+
+    def test_chronological(self):
+        '''Arrivals come in chronological order, within the duration.'''
+        times = [arrival.time for arrival in self.arrivals.pop_due(600)]
+        self.assertEqual(sorted(times), times)
+        self.assertTrue(0 <= times[0] and times[-1] <= 600)
+
+    def test_distribution(self):
+        '''Arrival times are normally distributed around mid-simulation.'''
+        times = [arrival.time for arrival in self.arrivals.pop_due(600)]
+        self.assertAlmostEqual(300, mean(times), delta=10)
+        self.assertAlmostEqual(100, stdev(times), delta=10)
+
+    def test_pop_due(self):
+        '''Only arrivals due by a given time are consumed.'''
+        due = list(self.arrivals.pop_due(300))
+        self.assertTrue(all(arrival.time <= 300 for arrival in due))
+        self.assertTrue(self.arrivals.peek().time > 300)
+
+    def test_unique_pids(self):
+        '''Every person gets its own pid.'''
+        pids = {arrival.pid for arrival in self.arrivals.pop_due(600)}
+        self.assertEqual(1000, len(pids))
+
+    def test_entries_and_exits(self):
+        '''People either enter from an entry or leave from an exit.'''
+        for arrival in self.arrivals.pop_due(600):
+            self.assertTrue(arrival.origin == 0 or arrival.destination == 0)
+
+    def test_zero_duration(self):
+        '''Everybody shows up at once, in a simulation with no duration.'''
+        arrivals = Arrivals(10, 0, [0, 1], [0], [0])
+        self.assertEqual([0] * 10, [a.time for a in arrivals.pop_due(0)])
@@ -0,0 +1,113 @@
+'''
+Test suite for the batch module.
+'''
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+from lifts import batch
+
+SIM_DIR = os.path.join(os.path.dirname(__file__), '..', 'lifts',
+                       'simulations')
+# A client that never moves the lifts, and concludes every turn at once
+IDLE_CLIENT = '''
+import sys, time
+with open(sys.argv[1]) as fin, open(sys.argv[2], 'w') as fout:
+    while True:
+        line = fin.readline()
+        if not line:
+            time.sleep(0.001)
+            continue
+        if line.startswith(('WORLD', 'READY')):
+            print('READY', file=fout, flush=True)
+        if line.startswith('STATS'):
+            break
+'''
+
+
+class TestParseSeeds(unittest.TestCase):
+
+    '''Tests for the parse_seeds function.'''
+
+    def test_none(self):
+        '''No seeds means the seed of the simulation file.'''
+        self.assertEqual([None], batch.parse_seeds(None))
+
+    def test_range(self):
+        '''Ranges include both ends.'''
+        self.assertEqual([3, 4, 5], batch.parse_seeds('3-5'))
+
+    def test_list(self):
+        '''Lists are comma separated.'''
+        self.assertEqual([1, 7], batch.parse_seeds('1,7'))
+
+    def test_single(self):
+        '''A single number is a single seed.'''
+        self.assertEqual([42], batch.parse_seeds('42'))
+
+
+class TestSummarise(unittest.TestCase):
+
+    '''Tests for the summarise function.'''
+
+    def test_aggregates(self):
+        '''Numeric stats are aggregated, failures counted.'''
+        results = [{'stats': {'turns': 10, 'id': 'x'}},
+                   {'stats': {'turns': 20, 'id': 'y'}},
+                   {'stats': None, 'error': 'boom'}]
+        summary = batch.summarise(results)
+        self.assertEqual(3, summary['runs'])
+        self.assertEqual(1, summary['failures'])
+        self.assertEqual({'mean': 15, 'min': 10, 'max': 20, 'stdev': 5},
+                         summary['stats']['turns'])
+        self.assertNotIn('id', summary['stats'])
+
+    def test_nested(self):
+        '''Nested stats are aggregated under their dotted names.'''
+        results = [{'stats': {'wait': {'mean': 4, 'histogram': [1, 2]},
+                              'lifts': {'main': {'stops': 3}}}},
+                   {'stats': {'wait': {'mean': 6, 'histogram': [3, 0]},
+                              'lifts': {'main': {'stops': 5}}}}]
+        stats = batch.summarise(results)['stats']
+        self.assertEqual(5, stats['wait.mean']['mean'])
+        self.assertEqual(3, stats['lifts.main.stops']['min'])
+        self.assertNotIn('wait.histogram', stats)
+
+
+class TestRunBatch(unittest.TestCase):
+
+    '''Tests running actual simulations in a process pool.'''
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        client_fname = os.path.join(self.directory.name, 'client.py')
+        with open(client_fname, 'w') as file_:
+            file_.write(IDLE_CLIENT)
+        self.client = '{} {}'.format(sys.executable, client_fname)
+        self.output = os.path.join(self.directory.name, 'results.jsonl')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_streams_one_line_per_run(self):
+        '''Every simulation file and seed combination gets a result line.'''
+        sim_files = batch.expand_sim_files([os.path.join(SIM_DIR, 'b*.toml')])
+        summary = batch.run_batch(self.client, sim_files, [1, 2], self.output,
+                                  workers=2)
+        with open(self.output) as file_:
+            results = [json.loads(line) for line in file_]
+        self.assertEqual({1, 2}, {result['seed'] for result in results})
+        self.assertEqual(2, summary['runs'])
+        self.assertEqual(0, summary['failures'])
+        for result in results:
+            self.assertEqual(5, result['stats']['population'])
+        self.assertIn('wait.mean', summary['stats'])
+
+    def test_failures_are_reported(self):
+        '''A run that cannot start is recorded, not raised.'''
+        result = batch.run_one((self.client, '/nonexistent.toml', 0, True))
+        self.assertIsNone(result['stats'])
+        self.assertIn('FileNotFoundError', result['error'])
@@ -0,0 +1,120 @@
+'''
+Test suite for the benchmark module.
+'''
+
+import unittest
+
+import simpleactors
+
+from lifts import benchmark, common
+from lifts.common import reset
+
+TINY = benchmark._scenario(floors=5, lifts=2, people=30)
+
+
+class Spam:
+
+    def eggs(self, value):
+        return value * 2
+
+
+class TestProbe(unittest.TestCase):
+
+    '''Tests for the Probe class.'''
+
+    def test_counts_calls(self):
+        '''Calls are counted and timed while the probe is active.'''
+        with benchmark.Probe([('eggs', Spam, 'eggs')]) as probe:
+            self.assertEqual(4, Spam().eggs(2))
+            Spam().eggs(3)
+        report = probe.report()
+        self.assertEqual(2, report['eggs']['calls'])
+        self.assertGreaterEqual(report['eggs']['seconds'], 0)
+
+    def test_restores(self):
+        '''Probed functions are restored once the probe is over.'''
+        original = Spam.eggs
+        with benchmark.Probe([('eggs', Spam, 'eggs')]):
+            self.assertIsNot(original, Spam.eggs)
+        self.assertIs(original, Spam.eggs)
+
+
+class TestRunScenario(unittest.TestCase):
+
+    '''Tests for running a scenario in-process.'''
+
+    def tearDown(self):
+        reset()
+
+    def test_measurements(self):
+        '''A scenario reports throughput, memory and function timings.'''
+        result = benchmark.run_scenario('tiny', TINY)
+        self.assertEqual('tiny', result['scenario'])
+        self.assertGreater(result['turns_per_second'], 0)
+        self.assertGreater(result['events'], 0)
+        self.assertGreater(result['commands_per_second'], 0)
+        self.assertGreater(result['peak_rss_kb'], 0)
+        functions = result['functions']
+        self.assertGreater(functions['Lift.consume_seconds']['calls'], 0)
+        self.assertGreater(functions['FileInterface.send_message']['calls'],
+                           0)
+
+    def test_controller_delivers(self):
+        '''The scripted controller brings people to their destination.'''
+        result = benchmark.run_scenario('tiny', TINY)
+        self.assertEqual(30, result['delivered'])
+
+
+class TestMeasureFootprint(unittest.TestCase):
+
+    '''Tests for measuring the memory of the entities.'''
+
+    def tearDown(self):
+        reset()
+
+    def test_footprint(self):
+        '''Bytes per entity are measured, without touching the registry.'''
+        registry = common.active_registry
+        footprint = benchmark.measure_footprint(count=100)
+        self.assertGreater(footprint['bytes_per_person'], 0)
+        self.assertGreater(footprint['bytes_per_lift'], 0)
+        self.assertIs(registry, common.active_registry)
+        self.assertFalse(simpleactors.global_actors)
+
+
+class TestCompare(unittest.TestCase):
+
+    '''Tests for the compare function.'''
+
+    def setUp(self):
+        self.baseline = {'results': [
+            {'scenario': 'spam', 'turns_per_second': 100,
+             'events_per_second': 1000, 'peak_rss_kb': 1000}]}
+
+    def test_no_regression(self):
+        '''Changes within tolerance are not regressions.'''
+        results = [{'scenario': 'spam', 'turns_per_second': 95,
+                    'events_per_second': 1200, 'peak_rss_kb': 1050}]
+        self.assertEqual([], benchmark.compare(results, self.baseline, 0.1))
+
+    def test_regressions(self):
+        '''Slower throughput and higher memory are regressions.'''
+        results = [{'scenario': 'spam', 'turns_per_second': 50,
+                    'events_per_second': 1000, 'peak_rss_kb': 2000}]
+        regressions = benchmark.compare(results, self.baseline, 0.1)
+        self.assertEqual({'turns_per_second', 'peak_rss_kb'},
+                         {regression['metric'] for regression in regressions})
+
+    def test_footprint(self):
+        '''Bigger entities are regressions.'''
+        self.baseline['footprint'] = {'bytes_per_person': 100,
+                                      'bytes_per_lift': 1000}
+        footprint = {'bytes_per_person': 200, 'bytes_per_lift': 1000}
+        regressions = benchmark.compare([], self.baseline, 0.1, footprint)
+        self.assertEqual(['bytes_per_person'],
+                         [regression['metric'] for regression in regressions])
+
+    def test_new_scenarios(self):
+        '''Scenarios missing from the baseline are ignored.'''
+        results = [{'scenario': 'eggs', 'turns_per_second': 1}]
+        self.assertEqual([], benchmark.compare(results, self.baseline, 0.1))
@@ -0,0 +1,156 @@
+'''
+Test suite for the binary module.
+'''
+
+import os
+import sys
+import tempfile
+import unittest
+
+from lifts import binary
+from lifts.benchmark import ScriptedController
+from lifts.common import Command, Direction, Message, reset
+from lifts.interface import COMMAND_SCHEMA, MESSAGE_SCHEMA
+from lifts.simulation import Simulation
+from lifts.transports import ProcessInterface
+
+SIM_FILE = os.path.join(os.path.dirname(__file__), '..', 'lifts',
+                        'simulations', 'basic.toml')
+# A client on its standard streams, idle, in binary mode
+BINARY_CLIENT = '''
+import struct, sys
+RECORD = struct.Struct('<BBHi')
+READY, STATS = {ready}, {stats}
+print('READY BINARY', flush=True)
+sys.stdin.buffer.readline()  # WORLD
+while True:
+    code, direction, lift, number = RECORD.unpack(
+        sys.stdin.buffer.read(RECORD.size))
+    if code == READY:
+        sys.stdout.buffer.write(RECORD.pack({command_ready}, 0, 0, 0))
+        sys.stdout.buffer.flush()
+    elif code == STATS:
+        sys.exit(0 if sys.stdin.buffer.read(number).startswith(b'{{') else 1)
+'''
+
+
+def command_code(name):
+    return [command for command, _ in COMMAND_SCHEMA].index(name)
+
+
+def message_code(name):
+    return [message for message, _ in MESSAGE_SCHEMA].index(name)
+
+
+class TestBinaryCodec(unittest.TestCase):
+
+    '''Tests for the BinaryCodec class.'''
+
+    def setUp(self):
+        self.sim = Simulation(SIM_FILE, interface_class=ScriptedController,
+                              use_cache=False)
+        self.codec = binary.BinaryCodec(['main'])
+
+    def tearDown(self):
+        reset()
+
+    def test_encode_lift_message(self):
+        '''Lifts are encoded by position, floors by number.'''
+        record = self.codec.encode(Message.transit, 'main', 2)
+        self.assertEqual(binary.RECORD.pack(message_code('TRANSIT'), 0, 0, 2),
+                         record)
+
+    def test_encode_extra_numbers(self):
+        '''The numbers after the first follow the record.'''
+        record = self.codec.encode(Message.transits, 'main', 3, 5, 4.5)
+        size = binary.RECORD.size
+        self.assertEqual((message_code('TRANSITS'), 0, 0, 3),
+                         binary.RECORD.unpack(record[:size]))
+        self.assertEqual(b'\x05\x00\x00\x00', record[size:size + 4])
+        self.assertEqual(4.5, binary.EXTRA_NUMBERS[float].unpack(
+            record[size + 4:])[0])
+
+    def test_encode_direction(self):
+        '''Directions are encoded by position.'''
+        record = self.codec.encode(Message.lift_call, 3, '-')
+        self.assertEqual((message_code('LIFT_CALL'), 0, 0, 3),
+                         binary.RECORD.unpack(record))
+        record = self.codec.encode(Message.lift_call, 3, 'DOWN')
+        self.assertEqual(2, binary.RECORD.unpack(record)[1])
+
+    def test_encode_text(self):
+        '''Texts follow the record, that holds their size.'''
+        record = self.codec.encode(Message.stats, '{"turns": 1}')
+        header, text = record[:binary.RECORD.size], \
+            record[binary.RECORD.size:]
+        self.assertEqual(12, binary.RECORD.unpack(header)[3])
+        self.assertEqual(b'{"turns": 1}', text)
+
+    def test_decode(self):
+        '''Commands are decoded to the entities they refer to.'''
+        record = binary.RECORD.pack(command_code('OPEN'), 1, 0, 0)
+        self.assertEqual(
+            [Command.open, self.sim.lifts['main'], Direction.up],
+            self.codec.decode(record))
+        record = binary.RECORD.pack(command_code('GOTO'), 0, 0, 3)
+        self.assertEqual([Command.goto, self.sim.lifts['main'],
+                          self.sim.floors[3]], self.codec.decode(record))
+
+    def test_decode_invalid(self):
+        '''Unknown commands, lifts and floors are invalid.'''
+        for fields in ((99, 0, 0, 0),
+                       (command_code('CLOSE'), 0, 5, 0),
+                       (command_code('GOTO'), 0, 0, 42)):
+            self.assertIsNone(self.codec.decode(binary.RECORD.pack(*fields)))
+
+    def test_render(self):
+        '''Records are rendered as text lines, for the journal.'''
+        record = binary.RECORD.pack(command_code('GOTO'), 0, 0, 3)
+        self.assertEqual('GOTO main 3', self.codec.render(record))
+
+
+class TestBinaryProtocol(unittest.TestCase):
+
+    '''Tests for interfaces using the binary protocol.'''
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+        reset()
+
+    def test_file_interface(self):
+        '''Records are exchanged through the interface files.'''
+        sim = Simulation(SIM_FILE, self.directory.name, use_cache=False)
+        interface = sim.interface
+        with open(interface.in_name, 'ab') as file_:
+            file_.write(b'READY BINARY\n')
+            file_.write(binary.RECORD.pack(command_code('GOTO'), 0, 0, 3))
+        self.assertEqual([[Command.ready],
+                          [Command.goto, sim.lifts['main'], sim.floors[3]]],
+                         list(interface.get_commands()))
+        interface.send_message(Message.turn, 1)
+        interface.send_message(Message.ready)
+        with open(interface.out_name, 'rb') as file_:
+            self.assertEqual(
+                binary.RECORD.pack(message_code('TURN'), 0, 0, 1) +
+                binary.RECORD.pack(message_code('READY'), 0, 0, 0),
+                file_.read())
+        interface.close()
+
+    def test_run(self):
+        '''A whole simulation runs with a binary client.'''
+        client = os.path.join(self.directory.name, 'client.py')
+        with open(client, 'w') as file_:
+            file_.write(BINARY_CLIENT.format(
+                ready=message_code('READY'), stats=message_code('STATS'),
+                command_ready=command_code('READY')))
+        sim = Simulation(SIM_FILE, self.directory.name, fast_forward=True,
+                         interface_class=lambda directory: ProcessInterface(
+                             directory, [sys.executable, client]))
+        sim.run()
+        sim.interface.close()
+        self.assertIsNotNone(sim.interface.codec)
+        self.assertEqual(0, sim.interface.process.returncode)
+        self.assertGreater(sim.step_counter, 1)
@@ -0,0 +1,96 @@
+'''
+Test suite for the cache module.
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+import unittest.mock as mock
+
+from lifts import cache
+from lifts.simulation import Simulation
+
+SIM_DIR = os.path.join(os.path.dirname(__file__), '..', 'lifts',
+                       'simulations')
+
+
+class TestLoad(unittest.TestCase):
+
+    '''Tests for loading descriptions through the cache.'''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.sim_dir = os.path.join(self.directory, 'simulations')
+        shutil.copytree(SIM_DIR, self.sim_dir)
+        self.sim_fname = os.path.join(self.sim_dir, 'basic.toml')
+        environ = {'LIFTS_CACHE_DIR': os.path.join(self.directory, 'cache')}
+        self.patcher = mock.patch.dict(os.environ, environ)
+        self.patcher.start()
+        self.expand = mock.Mock(side_effect=Simulation._expand_sim_file)
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.directory)
+
+    def test_first_load_expands(self):
+        '''Without an entry, the simulation file is expanded and stored.'''
+        description = cache.load(self.sim_fname, self.expand)
+        self.assertEqual(1, self.expand.call_count)
+        self.assertEqual('Basic', description['id'])
+        self.assertEqual(1, len(os.listdir(cache.cache_dir())))
+
+    def test_second_load_is_cached(self):
+        '''Unchanged files are not parsed again.'''
+        first = cache.load(self.sim_fname, self.expand)
+        second = cache.load(self.sim_fname, self.expand)
+        self.assertEqual(1, self.expand.call_count)
+        self.assertEqual(first, second)
+        self.assertIsNot(first, second)
+
+    def test_included_file_changed(self):
+        '''Changing any of the included files invalidates the entry.'''
+        cache.load(self.sim_fname, self.expand)
+        lift_fname = os.path.join(self.sim_dir, 'lifts',
+                                  'residential-slow.toml')
+        with open(lift_fname, 'a') as file_:
+            file_.write('\n# A comment changes the digest too\n')
+        cache.load(self.sim_fname, self.expand)
+        self.assertEqual(2, self.expand.call_count)
+
+    def test_corrupted_entry(self):
+        '''A corrupted entry is ignored and replaced.'''
+        cache.load(self.sim_fname, self.expand)
+        directory = cache.cache_dir()
+        for fname in os.listdir(directory):
+            with open(os.path.join(directory, fname), 'wb') as file_:
+                file_.write(b'garbage')
+        description = cache.load(self.sim_fname, self.expand)
+        self.assertEqual(2, self.expand.call_count)
+        self.assertEqual('Basic', description['id'])
+
+    def test_load_description(self):
+        '''Descriptions are the same, whether they come from the cache.'''
+        uncached = Simulation.load_description(self.sim_fname, False)
+        self.assertFalse(os.path.exists(cache.cache_dir()))
+        cached = Simulation.load_description(self.sim_fname)
+        self.assertEqual(1, len(os.listdir(cache.cache_dir())))
+        self.assertEqual(uncached, cached)
+
+
+class TestExpandSimFile(unittest.TestCase):
+
+    '''Tests for the expansion of simulation files.'''
+
+    def test_lift_models_parsed_once(self):
+        '''Every file is parsed once, however many lifts use it.'''
+        sim_fname = os.path.realpath(os.path.join(SIM_DIR, 'basic.toml'))
+        with mock.patch('lifts.simulation.toml.loads',
+                        wraps=__import__('toml').loads) as mock_loads:
+            description, digests = Simulation._expand_sim_file(sim_fname)
+        self.assertEqual(3, mock_loads.call_count)
+        self.assertEqual(3, len(digests))
+        lift = description['lifts'][0]
+        self.assertEqual('main', lift['lid'])
+        self.assertEqual((0, 3), (lift['bottom_floor_number'],
+                                  lift['top_floor_number']))
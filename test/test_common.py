@@ -3,10 +3,31 @@ Test suite for the common module.
 '''
 
 import unittest
+import unittest.mock as mock
 
 import simpleactors as sa
 
-from lifts.common import LiftsActor
+import lifts.common as common
+from lifts.common import (LiftsActor, on_target, subscribe, unsubscribe,
+                          post, process_events, reset,
+                          enable_profiling)
+
+
+class Dummy(LiftsActor):
+
+    '''A minimal concrete actor.'''
+
+    __slots__ = ('received', )
+
+    numeric_location = 0
+
+    def __init__(self, uid):
+        self.received = []
+        super().__init__(uid=uid)
+
+    @on_target('dummy.poke')
+    def poked(self, *args):
+        self.received.append(args)
 
 
 class TestLiftsActor(unittest.TestCase):
@@ -14,8 +35,120 @@ class TestLiftsActor(unittest.TestCase):
     '''Tests for the LiftsActor class.'''
 
     def tearDown(self):
-        sa.reset()
+        reset()
 
     def test_numeric_location(self):
         '''The `numeric_location` must be overridden in child classes.'''
-        self.assertRaises(NotImplementedError, LiftsActor)
+        with self.assertRaises(NotImplementedError):
+            class Nowhere(LiftsActor):
+                pass
+
+    def test_slotted(self):
+        '''Actors have no attributes but the ones in their slots.'''
+        with self.assertRaises(AttributeError):
+            Dummy('foo').spam = 42
+
+    def test_targeted_delivery(self):
+        '''A targeted message only reaches the actor it is addressed to.'''
+        foo, bar = Dummy('foo'), Dummy('bar')
+        post('dummy.poke', foo, 42)
+        process_events()
+        self.assertEqual([(42, )], foo.received)
+        self.assertEqual([], bar.received)
+
+    def test_emit_to(self):
+        '''Actors can emit messages addressed to another entity.'''
+        foo, bar = Dummy('foo'), Dummy('bar')
+        foo.emit_to(bar, 'dummy.poke', 'spam')
+        process_events()
+        self.assertEqual([('spam', )], bar.received)
+
+    def test_unplug_removes_routes(self):
+        '''An unplugged actor is not reachable any more.'''
+        foo = Dummy('foo')
+        foo.unplug()
+        post('dummy.poke', foo, 42)
+        process_events()
+        self.assertEqual([], foo.received)
+        self.assertNotIn(foo, common.global_routes['dummy.poke'])
+
+    def test_kill(self):
+        '''A killed actor is removed from all the registries.'''
+        foo = Dummy('foo')
+        foo.emit(sa.KILL, foo)
+        process_events()
+        self.assertNotIn(foo, sa.global_actors)
+        self.assertIsNone(sa.get_by_id(Dummy, 'foo'))
+
+
+class TestRouting(unittest.TestCase):
+
+    '''Tests for the routing index.'''
+
+    def tearDown(self):
+        reset()
+
+    def test_subscribe(self):
+        '''Subscribed callbacks receive messages for their target.'''
+        callback = mock.MagicMock()
+        subscribe('spam', 'target', callback)
+        post('spam', 'target', 1, foo=2)
+        process_events()
+        callback.assert_called_once_with(1, foo=2)
+
+    def test_unsubscribe(self):
+        '''Unsubscribing prunes empty entries from the index.'''
+        callback = mock.MagicMock()
+        subscribe('spam', 'target', callback)
+        unsubscribe('spam', 'target', callback)
+        self.assertEqual({}, common.global_routes['spam'])
+
+    def test_unsubscribe_unknown(self):
+        '''Unsubscribing something never subscribed is harmless.'''
+        unsubscribe('spam', 'target', mock.MagicMock())
+
+    def test_broadcast(self):
+        '''Non-targeted messages are broadcast as usual.'''
+        callback = mock.MagicMock()
+        sa.global_callbacks['spam'].add(callback)
+        sa.global_event_queue.append(('spam', None, (1, ), {}))
+        process_events()
+        callback.assert_called_once_with(1)
+
+
+class TestProfiling(unittest.TestCase):
+
+    '''Tests for the timing of event handlers.'''
+
+    def tearDown(self):
+        reset()
+
+    def test_disabled_by_default(self):
+        '''Handlers are not timed unless asked to.'''
+        self.assertIsNone(common.handler_stats)
+
+    def test_counts_per_message_and_handler(self):
+        '''Timings are recorded per message, and per handler class.'''
+        stats = enable_profiling()
+        foo, bar = Dummy('foo'), Dummy('bar')
+        post('dummy.poke', foo)
+        post('dummy.poke', bar)
+        process_events()
+        report = stats.report()
+        self.assertEqual(2, report['messages']['dummy.poke']['calls'])
+        self.assertEqual(2, report['handlers']['Dummy.poked']['calls'])
+        self.assertGreaterEqual(report['handlers']['Dummy.poked']['seconds'],
+                                0)
+
+    def test_handler_name_partial(self):
+        '''Partials are named after the function they wrap.'''
+        from functools import partial
+        callback = partial(Dummy.poked, None)
+        self.assertEqual('Dummy.poked',
+                         common.HandlerStats.handler_name(callback))
+
+    def test_reset_disables(self):
+        '''Resetting the registries stops the profiling.'''
+        enable_profiling()
+        reset()
+        self.assertIsNone(common.handler_stats)
@@ -0,0 +1,71 @@
+'''
+Test suite for the env module.
+'''
+
+import os
+import unittest
+
+from lifts.common import Command, Direction, Message, reset
+from lifts.env import Environment
+
+SIM_FILE = os.path.join(os.path.dirname(__file__), '..', 'lifts',
+                        'simulations', 'basic.toml')
+
+
+def idle(events, observation):
+    '''A controller that never moves the lifts.'''
+    return []
+
+
+class TestEnvironment(unittest.TestCase):
+
+    '''Tests for playing episodes in-process.'''
+
+    def setUp(self):
+        self.env = Environment(SIM_FILE, use_cache=False)
+
+    def tearDown(self):
+        reset()
+
+    def test_reset(self):
+        '''An episode starts at the first turn the controller plays.'''
+        observation, info = self.env.reset(seed=1)
+        self.assertEqual(1, observation['turn'])
+        self.assertEqual(['main'], list(observation['lifts']))
+        self.assertEqual((Message.ready, ), info['events'][-1])
+        self.assertIn('building', info['world'])
+
+    def test_step(self):
+        '''Commands take lift ids and floor numbers.'''
+        self.env.reset(seed=1)
+        observation, reward, terminated, truncated, info = self.env.step(
+            [(Command.goto, 'main', 3)])
+        lift = observation['lifts']['main']
+        self.assertEqual(3, lift['destination'])
+        self.assertIs(Direction.up, lift['direction'])
+        self.assertEqual(2, observation['turn'])
+        self.assertLessEqual(reward, 0)
+        self.assertFalse(terminated or truncated)
+        self.assertEqual([(Message.turn, 2), (Message.ready, )],
+                         info['events'])
+
+    def test_invalid_commands(self):
+        '''Invalid commands are reported as errors, and not played.'''
+        self.env.reset(seed=1)
+        *_, info = self.env.step([(Command.open, 'nope', 'UP'),
+                                  (Command.close, )])
+        errors = [event for event in info['events']
+                  if event[0] is Message.error]
+        self.assertEqual(2, len(errors))
+
+    def test_run(self):
+        '''Episodes with the same seed play the same.'''
+        stats = self.env.run(idle, seed=1)
+        self.assertEqual(stats, self.env.run(idle, seed=1))
+        self.assertGreater(stats['turns'], 1)
+
+    def test_episode_over(self):
+        '''Finished episodes have to be reset.'''
+        self.env.run(idle)
+        with self.assertRaises(RuntimeError):
+            self.env.step([])
@@ -0,0 +1,102 @@
+'''
+Test suite for the fleet module.
+'''
+
+import unittest
+from pickle import dumps, loads
+
+from simpleactors import get_by_id
+
+from lifts.common import Direction, broadcast, process_events, reset
+from lifts.floor import Floor
+from lifts.lift import Lift
+import lifts.fleet as lfl
+
+
+def description(lid, bottom=0, top=9):
+    return {'lid': lid, 'capacity': 4, 'transit_time': 2, 'accel_time': 5,
+            'bottom_floor_number': bottom, 'top_floor_number': top}
+
+
+class TestFleet(unittest.TestCase):
+
+    '''Tests for the Fleet class.'''
+
+    def setUp(self):
+        self.floors = {level: Floor(level) for level in range(10)}
+        for level in range(9):
+            self.floors[level].above = self.floors[level + 1]
+            self.floors[level + 1].below = self.floors[level]
+        self.fleet = lfl.Fleet(self.floors, 2)
+        self.up = self.fleet.add(description('up'), self.floors[0])
+        self.down = self.fleet.add(description('down'), self.floors[9])
+
+    def tearDown(self):
+        reset()
+
+    def test_columns(self):
+        '''The state of the lifts is in the arrays of the fleet.'''
+        self.up.destination = self.floors[4]
+        self.up.load = 3
+        self.assertEqual([0, 9], self.fleet.position.tolist())
+        self.assertEqual([4, lfl.NO_DESTINATION],
+                         self.fleet.destination.tolist())
+        self.assertEqual([3, 0], self.fleet.load.tolist())
+        self.assertIs(self.floors[4], self.up.destination)
+        self.assertIsNone(self.down.destination)
+        self.assertIs(Direction.up, self.up.direction)
+
+    def test_lookup(self):
+        '''Lifts of a fleet are found by id as lifts.'''
+        self.assertIs(self.up, get_by_id(Lift, 'up'))
+
+    def test_move(self):
+        '''All the lifts travelling move at once.'''
+        self.up.destination = self.floors[9]
+        self.down.destination = self.floors[0]
+        self.assertEqual([], self.fleet.move(1))
+        moves = self.fleet.move([5, 3])
+        self.assertEqual([(self.up, 3, False), (self.down, 2, False)], moves)
+        self.assertEqual([3, 7], self.fleet.position.tolist())
+        self.assertEqual([0, 0], self.fleet.carry.tolist())
+
+    def test_arrive(self):
+        '''Lifts stop at the floor before their destination to arrive.'''
+        self.up.destination = self.floors[2]
+        self.fleet.take_turn(4)
+        process_events()
+        self.assertIs(self.floors[1], self.up.location)
+        self.fleet.take_turn(4)
+        process_events()
+        self.assertIs(self.floors[2], self.up.location)
+        self.assertIsNone(self.up.destination)
+        self.assertEqual(0, self.up._carry_seconds)
+
+    def test_moved_by_fleet_only(self):
+        '''Lifts of a fleet do not listen to turn.start: the fleet moves them.'''
+        self.up.destination = self.floors[9]
+        broadcast('turn.start', 4)
+        process_events()
+        self.assertIs(self.floors[2], self.up.location)
+
+    def test_same_as_lift(self):
+        '''A lift moves the same in a fleet or on its own.'''
+        self.up.destination = self.floors[9]
+        alone = Lift(description('alone'), self.floors[0])
+        alone.destination = self.floors[9]
+        for seconds in (1, 3, 6, 2, 7, 1):
+            self.fleet.take_turn(seconds)
+            alone.take_turn(seconds)
+            process_events()
+            self.assertIs(alone.location, self.up.location)
+            self.assertIs(alone.destination, self.up.destination)
+            self.assertEqual(alone._carry_seconds, self.up._carry_seconds)
+
+    def test_pickle(self):
+        '''Lifts are pickled along with the arrays of their fleet.'''
+        self.up.destination = self.floors[5]
+        fleet = loads(dumps(self.fleet))
+        up = fleet.lifts[0]
+        self.assertIs(fleet, up.fleet)
+        self.assertEqual(0, up.location.level)
+        self.assertEqual(5, up.destination.level)
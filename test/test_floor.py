@@ -5,10 +5,8 @@ Test suite for the floor module.
 import unittest
 import unittest.mock as mock
 
-import simpleactors as sa
-
 from lifts.floor import Floor
-from lifts.common import Direction
+from lifts.common import Direction, post, process_events, reset
 
 
 class MockActor:
@@ -17,17 +15,45 @@ class MockActor:
         self.location = location
 
 
+class MockPerson:
+
+    def __init__(self, compass):
+        self.compass = compass
+        self.lift = None
+
+    def _should_get_on(self, lift):
+        return not lift.full and lift.direction in (self.compass,
+                                                    Direction.none)
+
+    def board(self, lift):
+        self.lift = lift
+        lift.boarded.append(self)
+
+
+class MockLift:
+
+    def __init__(self, direction, capacity=10):
+        self.direction = direction
+        self.capacity = capacity
+        self.boarded = []
+
+    @property
+    def full(self):
+        return len(self.boarded) >= self.capacity
+
+
 class TestFloor(unittest.TestCase):
 
     '''Tests for the Floor class.'''
 
     def setUp(self):
         self.floor = Floor(level=0, is_exit=True, is_entry=True)
-        self.mock_emit = mock.MagicMock()
-        self.floor.emit = self.mock_emit
+        patcher = mock.patch.object(Floor, 'emit')
+        self.mock_emit = patcher.start()
+        self.addCleanup(patcher.stop)
 
     def tearDown(self):
-        sa.reset()
+        reset()
 
     def test_string(self):
         '''The string representation of a Floor is its level.'''
@@ -39,8 +65,17 @@ class TestFloor(unittest.TestCase):
 
     def test_call_wrong_floor(self):
         '''A call is ignored if it does not happen at the concerned floor.'''
-        self.floor.push_button(MockActor('not-here'), Direction.up)
-        self.assertFalse(self.mock_emit.called)
+        post('person.lift.call', 'not-here', MockActor('not-here'),
+             Direction.up)
+        process_events()
+        self.assertEqual(set(), self.floor.requested_directions)
+
+    def test_call_routed(self):
+        '''A call happening at the floor reaches it.'''
+        post('person.lift.call', self.floor, MockActor(self.floor),
+             direction=Direction.up)
+        process_events()
+        self.assertIn(Direction.up, self.floor.requested_directions)
 
     def test_direction_already_booked(self):
         '''A call is ignored if the floor had already been requested.'''
@@ -55,8 +90,12 @@ class TestFloor(unittest.TestCase):
 
     def test_lift_close_wrong_floor(self):
         '''A close message is ignored if it dose not concern the floor.'''
-        self.floor.lift_has_closed(MockActor('not-here'))
-        self.assertFalse(self.mock_emit.called)
+        self.floor.requested_directions.add(Direction.up)
+        lift = MockActor('not-here')
+        lift.direction = Direction.up
+        post('lift.close', 'not-here', lift)
+        process_events()
+        self.assertIn(Direction.up, self.floor.requested_directions)
 
     def test_lift_close_reset_call(self):
         '''A requested direction is reset when the lift for that dir closes.'''
@@ -65,3 +104,58 @@ class TestFloor(unittest.TestCase):
         lift.direction = Direction.up
         self.floor.lift_has_closed(lift)
         self.assertNotIn(Direction.up, self.floor.requested_directions)
+
+    def test_queue_by_direction(self):
+        '''People calling a lift queue up by direction.'''
+        up, down = MockPerson(Direction.up), MockPerson(Direction.down)
+        self.floor.push_button(up, Direction.up)
+        self.floor.push_button(down, Direction.down)
+        self.assertEqual([up], [p for _, p in self.floor.waiting[Direction.up]])
+        self.assertEqual([down],
+                         [p for _, p in self.floor.waiting[Direction.down]])
+
+
+class TestFloorBoarding(unittest.TestCase):
+
+    '''Tests for people boarding lifts from a Floor.'''
+
+    def setUp(self):
+        self.floor = Floor(level=0)
+        self.people = []
+        for compass in (Direction.down, Direction.up, Direction.up,
+                        Direction.down):
+            person = MockPerson(compass)
+            self.floor.push_button(person, compass)
+            self.people.append(person)
+
+    def tearDown(self):
+        reset()
+
+    def test_board_fifo(self):
+        '''People going the lift's way board in the order they called.'''
+        lift = MockLift(Direction.up)
+        self.floor.lift_has_opened(lift)
+        self.assertEqual(self.people[1:3], lift.boarded)
+        self.assertFalse(self.floor.waiting[Direction.up])
+        self.assertEqual(2, len(self.floor.waiting[Direction.down]))
+
+    def test_board_no_direction(self):
+        '''A lift with no direction takes people either way, in order.'''
+        lift = MockLift(Direction.none)
+        self.floor.lift_has_opened(lift)
+        self.assertEqual(self.people, lift.boarded)
+
+    def test_board_until_full(self):
+        '''Boarding stops when the lift is full, the rest keep waiting.'''
+        lift = MockLift(Direction.none, capacity=3)
+        self.floor.lift_has_opened(lift)
+        self.assertEqual(self.people[:3], lift.boarded)
+        self.assertEqual([self.people[3]],
+                         [p for _, p in self.floor.waiting[Direction.down]])
+
+    def test_board_routed(self):
+        '''A lift opening at the floor makes people board.'''
+        lift = MockLift(Direction.down)
+        post('lift.open', self.floor, lift)
+        process_events()
+        self.assertEqual([self.people[0], self.people[3]], lift.boarded)
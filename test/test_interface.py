@@ -7,17 +7,20 @@ import shutil
 import unittest
 import unittest.mock as mock
 
-import simpleactors as sa
-
 import lifts.interface as lif
-from lifts.common import Message, Command, Direction
+from lifts.common import (Message, Command, Direction, broadcast,
+                          process_events, reset)
 from lifts.lift import Lift
 from lifts.floor import Floor
 
 
-def mock_get_by_id(class_, uid):
-    '''Mock simpleactors.get_by_id() by echoing it's call arguments.'''
-    return class_, uid
+def make_lift(lid='spam', floor=None):
+    '''Return a lift and the floor it is at, the ground floor by default.'''
+    floor = floor or Floor(0)
+    lift = Lift({'lid': lid, 'capacity': 4, 'transit_time': 1,
+                 'accel_time': 2, 'bottom_floor_number': 0,
+                 'top_floor_number': 1, 'directional': True}, floor)
+    return lift, floor
 
 
 class TestFileInterfaceInitiation(unittest.TestCase):
@@ -64,7 +67,7 @@ class TestCase(unittest.TestCase):
         self.iface = lif.FileInterface(self.test_folder)
 
     def tearDown(self):
-        sa.reset()
+        reset()
         shutil.rmtree(self.test_folder)
 
 
@@ -113,6 +116,20 @@ class TestInputOutput(TestCase):
         actual = list(self.iface.get_commands())
         self.assertEqual(expected, actual)
 
+    def test_get_turn_commands(self):
+        '''get_turn_commands() returns as soon as the client sends READY.'''
+        with open(self.iface.in_name, 'a') as file_:
+            print('close spam', file=file_)
+            print('ready', file=file_)
+            print('close eggs', file=file_)
+        lift, _ = make_lift()
+        actual = self.iface.get_turn_commands(10)
+        self.assertEqual([[Command.close, lift]], actual)
+
+    def test_get_turn_commands_timeout(self):
+        '''get_turn_commands() gives up on the client after the timeout.'''
+        self.assertEqual([], self.iface.get_turn_commands(0.01))
+
     def test_can_write(self):
         '''FileInterface can write the output file.'''
         self.iface.write('spam')
@@ -120,10 +137,145 @@ class TestInputOutput(TestCase):
         self.assertEqual('spam\n', actual)
 
 
+class TestFraming(TestCase):
+
+    '''Tests for the framed mode of FileInterface.'''
+
+    def test_negotiation(self):
+        '''READY FRAMED is a READY, switching to the framed mode.'''
+        self.assertFalse(self.iface.framed)
+        self.assertEqual([Command.ready],
+                         self.iface.process_line('READY framed'))
+        self.assertTrue(self.iface.framed)
+
+    def test_frames_end_with_ready(self):
+        '''The messages of a turn are written at once, at READY.'''
+        self.iface.start_framing()
+        self.iface.send_message(Message.turn, 1)
+        self.iface.send_message(Message.transit, 'main', 2)
+        self.assertEqual('', open(self.iface.out_name).read())
+        self.iface.send_message(Message.ready)
+        payload = 'TURN 1\nTRANSIT main 2\nREADY\n'
+        self.assertEqual('FRAME {}\n{}'.format(len(payload), payload),
+                         open(self.iface.out_name).read())
+
+    def test_flush(self):
+        '''Messages after the last READY are sent when flushed.'''
+        self.iface.start_framing()
+        self.iface.send_message(Message.end)
+        self.iface.flush()
+        self.assertEqual('FRAME 4\nEND\n', open(self.iface.out_name).read())
+
+    def test_read_block(self):
+        '''A command block is parsed at once, then read line by line.'''
+        lift, _ = make_lift()
+        with open(self.iface.in_name, 'a') as file_:
+            file_.write('FRAME 17\nCLOSE spam\nREADY\nfoo\n')
+        lines = [self.iface.read() for _ in range(4)]
+        self.assertEqual([('CLOSE spam', [Command.close, lift]),
+                          ('READY', [Command.ready]), 'foo', None], lines)
+        self.assertEqual([[Command.close, lift], [Command.ready], None],
+                         [self.iface.process_line(line) for line in lines[:3]])
+
+    def test_read_partial_block(self):
+        '''A block is not read until it has been completely written.'''
+        with open(self.iface.in_name, 'a') as file_:
+            file_.write('FRAME 17\nCLOSE spam\n')
+        self.assertIsNone(self.iface.read())
+        with open(self.iface.in_name, 'a') as file_:
+            file_.write('READY\n')
+        lines = [self.iface.read() for _ in range(3)]
+        self.assertEqual(['CLOSE spam', 'READY', None],
+                         [line and line[0] for line in lines])
+
+
+class TestSubscriptions(TestCase):
+
+    '''Tests for the messages clients subscribe to.'''
+
+    def output(self):
+        process_events()
+        return open(self.iface.out_name).read().splitlines()
+
+    def test_parse_options(self):
+        '''Options are flags, or settings with a list of values.'''
+        self.assertEqual(
+            [('start_framing', ()), ('subscribe', ('TRANSIT', 'ARRIVED')),
+             ('filter_lifts', ('Main', ))],
+            lif.parse_options(['framed', 'subscribe=transit,ARRIVED',
+                               'lifts=Main']))
+        for bits in (['SUBSCRIBE=TURN'], ['LIFTS='], ['FRAMED=1'],
+                     ['SPAM']):
+            self.assertIsNone(lif.parse_options(bits))
+
+    def test_subscribe(self):
+        '''Only the messages subscribed to are sent.'''
+        self.assertEqual([Command.ready],
+                         self.iface.process_line('READY SUBSCRIBE=ARRIVED'))
+        lift = mock.MagicMock(id='spam')
+        broadcast('lift.transit', lift, floor=Floor(3))
+        broadcast('lift.arrive', lift, floor=Floor(4))
+        self.assertEqual(['ARRIVED spam 4'], self.output())
+
+    def test_subscriptions_survive_plugging(self):
+        '''Subscriptions hold when the interface is plugged again.'''
+        self.iface.subscribe('ARRIVED')
+        self.iface.unplug()
+        self.iface.plug()
+        broadcast('floor.call', Floor(3), Direction.up)
+        self.assertEqual([], self.output())
+
+    def test_subscriptions_widen(self):
+        '''Subscribing again can relay messages muted before.'''
+        self.iface.subscribe('ARRIVED')
+        self.iface.subscribe('ARRIVED', 'LIFT_CALL')
+        broadcast('floor.call', Floor(3), Direction.up)
+        self.assertEqual(['LIFT_CALL 3 UP'], self.output())
+
+    def test_options_after_handshake(self):
+        '''Options are refused once the client has sent READY.'''
+        self.iface.process_line('READY')
+        self.assertEqual([Command.ready],
+                         self.iface.process_line('READY SUBSCRIBE=ARRIVED'))
+        self.assertIsNone(self.iface.subscriptions)
+        self.assertEqual(
+            ['ERROR Options can only be set with the first READY'],
+            self.output())
+
+    def test_lift_filter(self):
+        '''Clients can ask for the messages about some lifts only.'''
+        spam, floor = make_lift()
+        eggs, _ = make_lift('eggs', floor)
+        seven, _ = make_lift(7, floor)
+        self.iface.process_line('READY LIFTS=spam,7')
+        for lift in (eggs, spam, seven):
+            broadcast('lift.arrive', lift, floor=floor)
+        broadcast('floor.call', Floor(5), Direction.up)
+        self.assertEqual(['ARRIVED spam 0', 'ARRIVED 7 0', 'LIFT_CALL 5 UP'],
+                         self.output())
+
+    def test_unknown_lifts(self):
+        '''Lifts not in the world are reported, and ignored.'''
+        make_lift()
+        self.assertEqual([Command.ready],
+                         self.iface.process_line('READY LIFTS=spam,ham'))
+        self.assertEqual(frozenset(['spam']), self.iface.lift_filter)
+        self.assertEqual(['ERROR Unknown lifts: ham'], self.output())
+
+    def test_invalid_subscription(self):
+        '''Subscribing to unknown messages is not a valid READY.'''
+        self.assertIsNone(self.iface.process_line('READY SUBSCRIBE=SPAM'))
+        self.assertIsNone(self.iface.subscriptions)
+
+
 class TestParsing(TestCase):
 
     '''Tests fro the FileInterface parsing of commands.'''
 
+    def setUp(self):
+        super().setUp()
+        self.lift, self.floor = make_lift()
+
     @mock.patch.object(lif.FileInterface, 'send_message')
     def test_validation_empty_line(self, mock_sm):
         '''Validation fails for empty lines.'''
@@ -179,46 +331,143 @@ class TestParsing(TestCase):
         self.assertEqual(Message.error, code)
         self.assertTrue(message.startswith('Invalid parameters'))
 
-    @mock.patch.object(lif, 'get_by_id', new=mock_get_by_id)
     def test_parse_ready_command(self):
         '''Line is correctly parsed for READY.'''
         actual = self.iface.process_line('ready')
         expected = [Command.ready]
         self.assertEqual(expected, actual, open(self.iface.out_name).read())
 
-    @mock.patch.object(lif, 'get_by_id', new=mock_get_by_id)
     def test_parse_goto_command(self):
         '''Line is correctly parsed for GOTO.'''
         actual = self.iface.process_line('goto spam 0')
-        expected = [Command.goto, (Lift, 'spam'), (Floor, 0)]
+        expected = [Command.goto, self.lift, self.floor]
         self.assertEqual(expected, actual, open(self.iface.out_name).read())
 
-    @mock.patch.object(lif, 'get_by_id', new=mock_get_by_id)
     def test_parse_open_command(self):
         '''Line is correctly parsed for OPEN.'''
         actual = self.iface.process_line('open spam up')
-        expected = [Command.open, (Lift, 'spam'), Direction.up]
+        expected = [Command.open, self.lift, Direction.up]
         self.assertEqual(expected, actual, open(self.iface.out_name).read())
 
-    @mock.patch.object(lif, 'get_by_id', new=mock_get_by_id)
     def test_parse_open_command_no_direction(self):
         '''Line is correctly parsed for OPEN when given `none` as direction.'''
         actual = self.iface.process_line('open spam none')
-        expected = [Command.open, (Lift, 'spam'), Direction.none]
+        expected = [Command.open, self.lift, Direction.none]
+        self.assertEqual(expected, actual, open(self.iface.out_name).read())
+
+    def test_parse_open_command_dash(self):
+        '''Line is correctly parsed for OPEN when given `-` as direction.'''
+        actual = self.iface.process_line('open spam -')
+        expected = [Command.open, self.lift, Direction.none]
         self.assertEqual(expected, actual, open(self.iface.out_name).read())
 
-    @mock.patch.object(lif, 'get_by_id', new=mock_get_by_id)
     def test_parse_close_command(self):
         '''Line is correctly parsed for CLOSE.'''
         actual = self.iface.process_line('close spam')
-        expected = [Command.close, (Lift, 'spam')]
+        expected = [Command.close, self.lift]
         self.assertEqual(expected, actual, open(self.iface.out_name).read())
 
 
+class TestCommandParser(unittest.TestCase):
+
+    '''Tests for the CommandParser class.'''
+
+    def setUp(self):
+        self.lift, self.floor = make_lift('main')
+        self.parser = lif.CommandParser([self.lift], [self.floor])
+
+    def tearDown(self):
+        reset()
+
+    def test_entities(self):
+        '''Lifts and floors are resolved by the strings naming them.'''
+        self.assertEqual([Command.goto, self.lift, self.floor],
+                         self.parser.parse(['GOTO', 'main', '0'], ''))
+        self.assertEqual([Command.goto, self.lift, self.floor],
+                         self.parser.parse(['GOTO', 'main', '+00'], ''))
+
+    def test_case(self):
+        '''Commands and directions are case insensitive.'''
+        self.assertEqual([Command.open, self.lift, Direction.down],
+                         self.parser.parse(['Open', 'main', 'dOwN'], ''))
+
+    def test_unknown_entities(self):
+        '''Lifts and floors not in the world are invalid.'''
+        Floor(7)
+        for bits in (['CLOSE', 'spam'], ['GOTO', 'main', '7'],
+                     ['GOTO', 'main', 'x']):
+            with self.assertRaises(ValueError):
+                self.parser.parse(bits, '')
+
+    def test_block(self):
+        '''Blocks are parsed at once, invalid lines coming with their error.'''
+        lines = self.parser.parse_block('CLOSE main\n\nREADY\n')
+        self.assertEqual(['CLOSE main', '', 'READY'],
+                         [line for line, _ in lines])
+        self.assertEqual([Command.close, self.lift], lines[0][1])
+        self.assertIsInstance(lines[1][1], ValueError)
+        self.assertEqual([Command.ready], lines[2][1])
+
+
 class TestSendMessages(TestCase):
 
     '''Tests for the FileInterface send_message facility.'''
 
+    def output(self):
+        '''Return the lines written so far.'''
+        process_events()
+        return open(self.iface.out_name).read().splitlines()
+
+    def test_entity_zero(self):
+        '''Entities that are falsy (like the ground floor) are sent.'''
+        self.iface.send_message(Message.lift_call, 0, 'UP')
+        self.assertEqual(['LIFT_CALL 0 UP'], self.output())
+
+    def test_relay_floor_call(self):
+        '''Calls at a floor are relayed as LIFT_CALL.'''
+        broadcast('floor.call', Floor(3), Direction.down)
+        self.assertEqual(['LIFT_CALL 3 DOWN'], self.output())
+
+    def test_relay_floor_request(self):
+        '''Floor buttons in lifts are relayed as FLOOR_REQUEST.'''
+        lift = mock.MagicMock(id='spam')
+        broadcast('lift.floor_request', lift, floor=Floor(3))
+        self.assertEqual(['FLOOR_REQUEST spam 3'], self.output())
+
+    def test_relay_transit(self):
+        '''Lifts transiting are relayed as TRANSIT.'''
+        lift = mock.MagicMock(id='spam')
+        broadcast('lift.transit', lift, floor=Floor(3))
+        self.assertEqual(['TRANSIT spam 3'], self.output())
+
+    def test_relay_transits(self):
+        '''Lifts transiting through many floors at once get a TRANSIT each.'''
+        lift = mock.MagicMock(id='spam')
+        broadcast('lift.transit', lift, floor=Floor(3), start=Floor(5))
+        self.assertEqual(['TRANSIT spam 5', 'TRANSIT spam 4',
+                          'TRANSIT spam 3'], self.output())
+
+    def test_relay_transits_coalesced(self):
+        '''Clients in coalescing mode get a single TRANSITS instead.'''
+        self.assertEqual([Command.ready],
+                         self.iface.process_line('READY COALESCE'))
+        lift = mock.MagicMock(id='spam', transit_time=1.5)
+        broadcast('lift.transit', lift, floor=Floor(5), start=Floor(3))
+        broadcast('lift.transit', lift, floor=Floor(6))
+        self.assertEqual(['TRANSITS spam 3 5 4.5', 'TRANSITS spam 6 6 1.5'],
+                         self.output())
+
+    def test_relay_arrive(self):
+        '''Lifts arriving are relayed as ARRIVED.'''
+        lift = mock.MagicMock(id='spam')
+        broadcast('lift.arrive', lift, floor=Floor(3))
+        self.assertEqual(['ARRIVED spam 3'], self.output())
+
+    def test_relay_error(self):
+        '''Lift errors are relayed as ERROR.'''
+        broadcast('error.open.already_open')
+        self.assertEqual(['ERROR Doors already open'], self.output())
+
     def test_handle_(self):
         '''FileInterface can handle message X correctly.'''
         self.fail()
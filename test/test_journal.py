@@ -0,0 +1,118 @@
+'''
+Test suite for the journal module.
+'''
+
+import os
+import tempfile
+import unittest
+
+from lifts import journal
+from lifts.benchmark import ScriptedController
+from lifts.common import reset
+from lifts.simulation import Simulation
+
+SIM_FILE = os.path.join(os.path.dirname(__file__), '..', 'lifts',
+                        'simulations', 'basic.toml')
+
+
+class TestJournal(unittest.TestCase):
+
+    '''Tests for recording and replaying journals.'''
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.fname = os.path.join(self.directory.name, 'run.journal')
+
+    def tearDown(self):
+        self.directory.cleanup()
+        reset()
+
+    def record(self, fast_forward=True, **kwargs):
+        simulation = Simulation(SIM_FILE, fast_forward=fast_forward,
+                                interface_class=ScriptedController,
+                                journal=self.fname, use_cache=False,
+                                **kwargs)
+        simulation.paced = False
+        simulation.run()
+        return simulation
+
+    def test_records(self):
+        '''The header and both sides of the conversation are recorded.'''
+        simulation = self.record()
+        header, records = journal.read_journal(self.fname)
+        self.assertEqual(simulation.description, header['description'])
+        records = list(records)
+        self.assertEqual((journal.MESSAGE, 'WORLD'), (records[0][0],
+                                                      records[0][1][:5]))
+        self.assertEqual((journal.COMMAND, 'READY'), records[1])
+        self.assertTrue(records[-1][1].startswith('STATS '))
+
+    def test_replay_fast_forward(self):
+        '''A fast-forward run replays identically.'''
+        stats = self.record().stats()
+        reset()
+        simulation, divergence = journal.replay(self.fname)
+        self.assertIsNone(divergence)
+        self.assertEqual(stats, simulation.stats())
+
+    def test_replay_real_time(self):
+        '''A real time run replays identically, without pacing.'''
+        stats = self.record(fast_forward=False, stats_every=5).stats()
+        reset()
+        simulation, divergence = journal.replay(self.fname)
+        self.assertIsNone(divergence)
+        self.assertEqual(stats, simulation.stats())
+
+    def test_raw(self):
+        '''Uncompressed journals are read just the same.'''
+        self.record(compress_journal=False)
+        header, records = journal.read_journal(self.fname)
+        self.assertTrue(list(records))
+        with open(self.fname, 'rb') as file_:
+            self.assertIn(b'WORLD', file_.read())
+
+    def test_truncated(self):
+        '''A truncated journal yields the records written in full.'''
+        self.record(compress_journal=False)
+        _, records = journal.read_journal(self.fname)
+        count = len(list(records))
+        with open(self.fname, 'r+b') as file_:
+            file_.truncate(os.path.getsize(self.fname) - 3)
+        _, records = journal.read_journal(self.fname)
+        self.assertEqual(count - 1, len(list(records)))
+
+    def test_not_a_journal(self):
+        '''Other files are rejected.'''
+        with open(self.fname, 'wb') as file_:
+            file_.write(b'WORLD {}\n')
+        with self.assertRaises(ValueError):
+            journal.read_journal(self.fname)
+
+
+class TestFirstDivergence(unittest.TestCase):
+
+    '''Tests for the first_divergence function.'''
+
+    def test_same(self):
+        '''Identical messages do not diverge.'''
+        messages = [['WORLD {}'], ['TURN 1', 'READY']]
+        self.assertIsNone(journal.first_divergence(messages, messages))
+
+    def test_different_line(self):
+        '''The first different line is reported, with its turn.'''
+        expected = [['WORLD {}'], ['TURN 1', 'TRANSIT main 1', 'READY']]
+        actual = [['WORLD {}'], ['TURN 1', 'TRANSIT main 2', 'READY']]
+        self.assertEqual((1, 'TRANSIT main 1', 'TRANSIT main 2'),
+                         journal.first_divergence(expected, actual))
+
+    def test_missing_turn(self):
+        '''Turns missing from either side are a divergence.'''
+        expected = [['WORLD {}'], ['TURN 1', 'READY']]
+        self.assertEqual((1, 'TURN 1', None),
+                         journal.first_divergence(expected, expected[:1]))
+
+    def test_profile_ignored(self):
+        '''Handler timings in the statistics are not a divergence.'''
+        expected = [['STATS {"turns": 1, "profile": {"a": 1}}']]
+        actual = [['STATS {"turns": 1, "profile": {"a": 2}}']]
+        self.assertIsNone(journal.first_divergence(expected, actual))
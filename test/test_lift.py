@@ -6,10 +6,8 @@ import unittest
 import unittest.mock as mock
 from pickle import dumps
 
-import simpleactors as sa
-
 from lifts.lift import Lift
-from lifts.common import Direction
+from lifts.common import Direction, Targeted, post, process_events, reset
 
 
 class MockFloor:
@@ -18,6 +16,20 @@ class MockFloor:
         self.numeric_location = numeric_location
 
 
+class MockPerson:
+
+    def __init__(self, destination, get_off):
+        self.destination = destination
+        self.get_off = get_off
+        self.alighted = False
+
+    def _should_get_off(self, lift):
+        return self.get_off
+
+    def alight(self, lift):
+        self.alighted = True
+
+
 class TestLiftParams(unittest.TestCase):
 
     '''Tests for the validation of the parameters passed to the Lift class.'''
@@ -34,6 +46,9 @@ class TestLiftParams(unittest.TestCase):
             top_floor_number=top_floor_number)
         Lift(description, MockFloor(location))
 
+    def tearDown(self):
+        reset()
+
     def test_integer(self):
         '''Capacity and shaft limits for a lift must be integers.'''
         self.assertRaises(ValueError, self.init_lift, capacity=1.5)
@@ -81,7 +96,7 @@ class TestLift(unittest.TestCase):
         self.maxDiff = None
 
     def tearDown(self):
-        sa.reset()
+        reset()
 
     def test_numeric_location(self):
         '''The numeric location of a lift is the current floor number.'''
@@ -103,121 +118,170 @@ class TestLift(unittest.TestCase):
     def test_full(self):
         '''A lift can detect if it is full.'''
         for n in range(self.lift.capacity):
-            self.lift.passengers.add(object())
+            self.lift.add_passenger(MockPerson(self.top_floor, False))
         self.assertTrue(self.lift.full)
 
     def test_is_moving(self):
         '''A lift can detect if it is moving.'''
-        self.lift.goto(self.lift, self.top_floor)
+        self.lift.goto(self.top_floor)
         self.assertTrue(self.lift.is_moving)
 
     def test_goto_ignore(self):
         '''A goto command is ignored if not specifically addressed to self.'''
-        self.lift.goto('<some-other-lift>', MockFloor(5))
+        post('command.goto', '<some-other-lift>', MockFloor(5))
+        process_events()
         self.assertFalse(self.lift.is_moving)
 
+    def test_goto_routed(self):
+        '''A goto command addressed to the lift reaches it.'''
+        post('command.goto', self.lift, self.top_floor)
+        process_events()
+        self.assertEqual(self.top_floor, self.lift.destination)
+
     def test_goto_error_out_of_boundaries(self):
         '''A goto command will fail with destination out of top-bottom.'''
         err_msg = 'error.destination.out_of_boundaries'
-        with mock.patch.object(self.lift, 'emit') as mock_emit:
-            self.lift.goto(self.lift, MockFloor(11))
+        with mock.patch.object(Lift, 'emit') as mock_emit:
+            self.lift.goto(MockFloor(11))
             mock_emit.assert_called_once_with(err_msg)
-        with mock.patch.object(self.lift, 'emit') as mock_emit:
-            self.lift.goto(self.lift, MockFloor(-1))
+        with mock.patch.object(Lift, 'emit') as mock_emit:
+            self.lift.goto(MockFloor(-1))
             mock_emit.assert_called_once_with(err_msg)
 
     def test_goto_error_wrong_direction(self):
         '''A goto command will fail with lift moving in opposite direction.'''
         err_msg = 'error.destination.conflicting_direction'
         self.lift.location = MockFloor(5)
-        with mock.patch.object(self.lift, 'emit') as mock_emit:
+        with mock.patch.object(Lift, 'emit') as mock_emit:
             self.lift.destination = self.ground_floor
-            self.lift.goto(self.lift, self.top_floor)
+            self.lift.goto(self.top_floor)
             mock_emit.assert_called_once_with(err_msg)
-        with mock.patch.object(self.lift, 'emit') as mock_emit:
+        with mock.patch.object(Lift, 'emit') as mock_emit:
             self.lift.destination = self.top_floor
-            self.lift.goto(self.lift, self.ground_floor)
+            self.lift.goto(self.ground_floor)
             mock_emit.assert_called_once_with(err_msg)
 
     def test_goto_error_already_still(self):
         '''A goto command will fail if the lift is still at its destination.'''
-        with mock.patch.object(self.lift, 'emit') as mock_emit:
-            self.lift.goto(self.lift, self.ground_floor)
+        with mock.patch.object(Lift, 'emit') as mock_emit:
+            self.lift.goto(self.ground_floor)
             mock_emit.assert_called_once_with('error.goto.already_there')
 
     def test_goto_error_doors_open(self):
         '''A goto command will fail if doors are open.'''
-        self.lift.open(self.lift)
-        self.lift.goto(self.lift, self.top_floor)
-        with mock.patch.object(self.lift, 'emit') as mock_emit:
-            self.lift.goto(self.lift, self.top_floor)
+        self.lift.open()
+        self.lift.goto(self.top_floor)
+        with mock.patch.object(Lift, 'emit') as mock_emit:
+            self.lift.goto(self.top_floor)
             mock_emit.assert_called_once_with('error.goto.doors_are_open')
 
     def test_goto_success_from_still(self):
         '''A goto command will succeed for a lift that is still.'''
-        self.lift.goto(self.lift, self.top_floor)
+        self.lift.goto(self.top_floor)
         self.assertTrue(self.lift.is_moving)
         self.assertEqual(self.top_floor, self.lift.destination)
 
     def test_goto_success_update(self):
         '''A goto command can be overridden with new one in same direction.'''
         middle_floor = MockFloor(5)
-        self.lift.goto(self.lift, self.top_floor)
-        self.lift.goto(self.lift, middle_floor)
+        self.lift.goto(self.top_floor)
+        self.lift.goto(middle_floor)
         self.assertTrue(self.lift.is_moving)
         self.assertEqual(middle_floor, self.lift.destination)
 
     def test_open_ignore(self):
         '''An open command is ignored if it does not concern self.'''
-        self.lift.open('<some-other-lift>')
+        post('command.open', '<some-other-lift>')
+        process_events()
         self.assertFalse(self.lift.open_doors)
 
+    def test_open_notify(self):
+        '''Opening the doors is notified to passengers and to the floor.'''
+        with mock.patch.object(Lift, 'emit') as mock_emit:
+            self.lift.open()
+            expected = (
+                ((Targeted('lift.open', self.lift), ), {}),
+                ((Targeted('lift.open', self.ground_floor), self.lift), {}))
+            self.assertSequenceEqual(expected, mock_emit.call_args_list)
+
     def test_open_moving(self):
         '''An open command fails if the lift is still moving.'''
-        self.lift.goto(self.lift, self.top_floor)
-        with mock.patch.object(self.lift, 'emit') as mock_emit:
-            self.lift.open(self.lift)
+        self.lift.goto(self.top_floor)
+        with mock.patch.object(Lift, 'emit') as mock_emit:
+            self.lift.open()
             mock_emit.assert_called_once_with('error.open.still_moving')
 
     def test_open_already_open(self):
         '''An open command will fail for an already open lift.'''
-        self.lift.open(self.lift)
-        with mock.patch.object(self.lift, 'emit') as mock_emit:
-            self.lift.open(self.lift)
+        self.lift.open()
+        with mock.patch.object(Lift, 'emit') as mock_emit:
+            self.lift.open()
             mock_emit.assert_called_once_with('error.open.already_open')
 
     def test_open_success(self):
         '''A lift can open upon command.'''
-        self.lift.open(self.lift)
+        self.lift.open()
         self.assertTrue(self.lift.open_doors)
 
     def test_open_with_intent(self):
         '''It is possible to "promise" a direction when opening doors.'''
-        self.lift.open(self.lift, intent=Direction.up)
+        self.lift.open(intent=Direction.up)
         self.assertEqual(self.lift.direction, Direction.up)
 
+    def test_add_passenger(self):
+        '''Passengers are indexed by their destination.'''
+        foo = MockPerson(self.top_floor, False)
+        bar = MockPerson(self.floors[5], False)
+        spam = MockPerson(self.top_floor, False)
+        for person in (foo, bar, spam):
+            self.lift.add_passenger(person)
+        expected = {self.top_floor: [foo, spam], self.floors[5]: [bar]}
+        self.assertEqual(expected, self.lift.passengers)
+        self.assertEqual(3, self.lift.load)
+
+    def test_unload(self):
+        '''Only passengers who should get off step off the lift.'''
+        foo = MockPerson(self.top_floor, False)
+        bar = MockPerson(self.floors[5], True)
+        for person in (foo, bar):
+            self.lift.add_passenger(person)
+        self.lift.unload()
+        self.assertTrue(bar.alighted)
+        self.assertFalse(foo.alighted)
+        self.assertEqual({self.top_floor: [foo]}, self.lift.passengers)
+        self.assertEqual(1, self.lift.load)
+
+    def test_unload_on_open(self):
+        '''Passengers get the chance to step off when the doors open.'''
+        person = MockPerson(self.floors[5], True)
+        self.lift.add_passenger(person)
+        self.lift.open()
+        process_events()
+        self.assertTrue(person.alighted)
+
     def test_close_ignore(self):
         '''An close command is ignored if it does not concern self.'''
         self.lift.open_doors = True
-        self.lift.close('<some-other-lift>')
+        post('command.close', '<some-other-lift>')
+        process_events()
         self.assertTrue(self.lift.open_doors)
 
     def test_close_already_closed(self):
         '''A close command will raies if the lift is already closed.'''
-        with mock.patch.object(self.lift, 'emit') as mock_emit:
-            self.lift.close(self.lift)
+        with mock.patch.object(Lift, 'emit') as mock_emit:
+            self.lift.close()
             mock_emit.assert_called_once_with('error.close.already_closed')
 
     def test_close_success(self):
         '''A lift can close upon command.'''
-        self.lift.open(self.lift)
-        self.lift.close(self.lift)
+        self.lift.open()
+        self.lift.close()
         self.assertFalse(self.lift.open_doors)
 
     def test_close_reset_intention(self):
         '''Closing the doors reset the intentions.'''
-        self.lift.open(self.lift, intent=Direction.up)
-        self.lift.close(self.lift)
+        self.lift.open(intent=Direction.up)
+        self.lift.close()
         self.assertEqual(Direction.none, self.lift.direction)
 
     def test_arrive_status(self):
@@ -226,11 +290,18 @@ class TestLift(unittest.TestCase):
         self.lift.arrive()
         self.assertIsNone(self.lift.destination)
 
+    def test_arrive_location(self):
+        '''A lift is at its destination upon arrival.'''
+        self.lift.destination = self.top_floor
+        self.lift.arrive()
+        self.assertEqual(self.top_floor, self.lift.location)
+
     def test_arrive_message(self):
         '''A lift notify its arrival with a message.'''
-        with mock.patch.object(self.lift, 'emit') as mock_emit:
+        with mock.patch.object(Lift, 'emit') as mock_emit:
             self.lift.arrive()
-            mock_emit.assert_called_once_with('lift.arrive', floor=None)
+            mock_emit.assert_called_once_with('lift.arrive', self.lift,
+                                              floor=None)
 
     def test_turn_action_no_action(self):
         '''A lift will stay still during a turn if no destination.'''
@@ -242,45 +313,100 @@ class TestLift(unittest.TestCase):
     def test_turn_action_update_position_up(self):
         '''A lift will update its position during its turn [up].'''
         self.lift.destination = self.top_floor
-        with mock.patch.object(self.lift, 'emit') as mock_emit:
+        with mock.patch.object(Lift, 'emit') as mock_emit:
             self.lift.take_turn(4)
-            mock_emit.assert_called_once_with('lift.transit',
+            mock_emit.assert_called_once_with('lift.transit', self.lift,
                                               floor=self.ground_floor.above)
 
     def test_turn_action_update_position_down(self):
         '''A lift will update its position during its turn [down].'''
         self.lift.destination = self.ground_floor
         self.lift.location = self.top_floor
-        with mock.patch.object(self.lift, 'emit') as mock_emit:
+        with mock.patch.object(Lift, 'emit') as mock_emit:
             self.lift.take_turn(4)
-            mock_emit.assert_called_once_with('lift.transit',
+            mock_emit.assert_called_once_with('lift.transit', self.lift,
                                               floor=self.top_floor.below)
 
     def test_turn_action_reach_destination(self):
         '''A lift will stop and change its status if reach destination.'''
         self.lift.destination = self.floors[1]
-        with mock.patch.object(self.lift, 'emit') as mock_emit:
+        with mock.patch.object(Lift, 'emit') as mock_emit:
             self.lift.take_turn(7)
-            mock_emit.assert_called_once_with('lift.arrive',
+            mock_emit.assert_called_once_with('lift.arrive', self.lift,
                                               floor=self.ground_floor.above)
         self.assertFalse(self.lift.is_moving)
 
+    def test_turn_exact_transit(self):
+        '''A lift transits a floor in exactly `transit_time` seconds.'''
+        self.lift.destination = self.top_floor
+        self.lift.take_turn(3)
+        self.assertEqual(self.floors[1], self.lift.location)
+
+    def test_seconds_to_next_stage_still(self):
+        '''A lift not travelling has no next stage.'''
+        self.assertIsNone(self.lift.seconds_to_next_stage)
+
+    def test_seconds_to_next_stage_transit(self):
+        '''The next stage of a travelling lift can be its next transit.'''
+        self.lift.destination = self.top_floor
+        self.lift.take_turn(1)
+        self.assertEqual(2, self.lift.seconds_to_next_stage)
+
+    def test_seconds_to_next_stage_arrival(self):
+        '''The next stage of a travelling lift can be its arrival.'''
+        self.lift.destination = self.floors[1]
+        self.lift.take_turn(1)
+        self.assertEqual(5, self.lift.seconds_to_next_stage)
+
+    def test_seconds_to_next_stage_reached(self):
+        '''Waiting for the next stage makes the lift reach it.'''
+        self.lift.destination = self.floors[2]
+        self.lift.take_turn(0.1)
+        self.lift.take_turn(self.lift.seconds_to_next_stage)
+        self.assertEqual(self.floors[1], self.lift.location)
+        self.lift.take_turn(self.lift.seconds_to_next_stage)
+        self.assertEqual(self.floors[2], self.lift.location)
+        self.assertIsNone(self.lift.destination)
+
     def test_turn_multiple_transit_updates(self):
         '''A lift updates position multiple times in one turn if needed.'''
         self.lift.destination = self.top_floor
-        with mock.patch.object(self.lift, 'emit') as mock_emit:
+        with mock.patch.object(Lift, 'emit') as mock_emit:
             self.lift.take_turn(7)
             expected = (
-                (('lift.transit', ), {'floor': self.floors[1]}),
-                (('lift.transit', ), {'floor': self.floors[2]}))
+                (('lift.transit', self.lift),
+                 {'floor': self.floors[2], 'start': self.floors[1]}), )
+            self.assertSequenceEqual(expected, mock_emit.call_args_list)
+
+    def test_turn_long_journey(self):
+        '''Long turns land the lift on the right floor at once.'''
+        self.lift.destination = self.top_floor
+        self.lift.take_turn(3 * 8 + 1)
+        self.assertEqual(self.floors[8], self.lift.location)
+        self.assertEqual(1, self.lift._carry_seconds)
+        # One more floor, then the time to stop
+        self.lift.take_turn(2 + 6)
+        self.assertEqual(self.top_floor, self.lift.location)
+        self.assertIsNone(self.lift.destination)
+
+    def test_turn_long_journey_down(self):
+        '''Lifts going down land on the right floor too.'''
+        self.lift.location = self.floors[9]
+        self.lift.destination = self.floors[1]
+        with mock.patch.object(Lift, 'emit') as mock_emit:
+            self.lift.take_turn(100)
+            expected = (
+                (('lift.transit', self.lift),
+                 {'floor': self.floors[2], 'start': self.floors[8]}),
+                (('lift.arrive', self.lift), {'floor': self.floors[1]}))
             self.assertSequenceEqual(expected, mock_emit.call_args_list)
 
     def test_turn_multiple_transit_updates_and_arrive(self):
         '''A lift can transit and arrive during the same turn.'''
         self.lift.destination = self.floors[2]
-        with mock.patch.object(self.lift, 'emit') as mock_emit:
+        with mock.patch.object(Lift, 'emit') as mock_emit:
             self.lift.take_turn(10)
             expected = (
-                (('lift.transit', ), {'floor': self.floors[1]}),
-                (('lift.arrive', ), {'floor': self.floors[2]}))
+                (('lift.transit', self.lift), {'floor': self.floors[1]}),
+                (('lift.arrive', self.lift), {'floor': self.floors[2]}))
             self.assertSequenceEqual(expected, mock_emit.call_args_list)
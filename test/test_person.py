@@ -7,7 +7,7 @@ import unittest.mock as mock
 
 import simpleactors as sa
 
-from lifts.common import Direction
+from lifts.common import Direction, Targeted, reset
 from lifts.person import Person
 
 
@@ -25,12 +25,15 @@ class MockLift:
         self.full = full
         self.at_top = False
         self.at_bottom = False
-        self.passengers = set()
+        self.passengers = []
 
     @property
     def numeric_location(self):
         return self.location.numeric_location
 
+    def add_passenger(self, person):
+        self.passengers.append(person)
+
 
 class TestPersonIn(unittest.TestCase):
 
@@ -44,7 +47,7 @@ class TestPersonIn(unittest.TestCase):
         self.person = Person('Foo', self.ground_floor, self.top_floor)
 
     def tearDown(self):
-        sa.reset()
+        reset()
 
     def test_string(self):
         '''The string representation of a Person is its pid.'''
@@ -62,44 +65,49 @@ class TestPersonIn(unittest.TestCase):
         Person('Spam', self.ground_floor, self.ground_floor)
         mock_arrive.assert_called_once_with()
 
+    def test_call_at_location(self):
+        '''A person calls a lift at the floor it is at.'''
+        with mock.patch.object(Person, 'emit') as mock_emit:
+            self.person.call_lift()
+            mock_emit.assert_called_once_with(
+                Targeted('person.lift.call', self.ground_floor), self.person,
+                direction=Direction.up)
+
     def test_no_in_when_full(self):
         '''A person does not step in a full lift.'''
         self.lift.full = True
-        with mock.patch.object(self.person, 'emit') as mock_emit:
-            self.person.on_lift_open('lift.open', self.lift)
-            self.assertFalse(mock_emit.called)
+        self.assertFalse(self.person._should_get_on(self.lift))
 
     def test_no_in_wrong_dir(self):
         '''A person does not step in a lift going the wrong direction.'''
         self.lift.direction = Direction.down
-        with mock.patch.object(self.person, 'emit') as mock_emit:
-            self.person.on_lift_open('lift.open', self.lift)
-            self.assertFalse(mock_emit.called)
+        self.assertFalse(self.person._should_get_on(self.lift))
 
     def test_in_good_dir(self):
         '''A person step in a lift with correct direction.'''
         self.lift.direction = Direction.up  # Redoundant, but make test clearer
-        with mock.patch.object(self.person, 'emit') as mock_emit:
-            self.person.on_lift_open('lift.open', self.lift)
-            mock_emit.assert_called_once_with('person.lift.on', self.lift)
+        self.assertTrue(self.person._should_get_on(self.lift))
 
     def test_in_no_dir(self):
         '''A person step in a lift with no direction.'''
         self.lift.direction = Direction.none
-        with mock.patch.object(self.person, 'emit') as mock_emit:
-            self.person.on_lift_open('lift.open', self.lift)
-            mock_emit.assert_called_once_with('person.lift.on', self.lift)
+        self.assertTrue(self.person._should_get_on(self.lift))
+
+    def test_board_message(self):
+        '''A person notifies its boarding a lift.'''
+        with mock.patch.object(Person, 'emit') as mock_emit:
+            self.person.board(self.lift)
+            mock_emit.assert_called_once_with('person.lift.on', self.person,
+                                              self.lift)
 
     def test_in_add_passenger(self):
         '''The passenger list get updated on a person walking in.'''
-        self.lift.direction = Direction.up  # Redoundant, but make test clearer
-        self.person.on_lift_open('lift.open', self.lift)
-        self.assertEqual({self.person}, self.lift.passengers)
+        self.person.board(self.lift)
+        self.assertEqual([self.person], self.lift.passengers)
 
     def test_in_change_location_to_lift(self):
         '''A passenger's location changes when getting in a lift.'''
-        self.lift.direction = Direction.up  # Redoundant, but make test clearer
-        self.person.on_lift_open('lift.open', self.lift)
+        self.person.board(self.lift)
         self.assertEqual(self.lift, self.person.location)
 
 
@@ -112,45 +120,29 @@ class TestPersonOut(unittest.TestCase):
         self.top_floor = MockFloor(10)
         self.lift = MockLift(self.ground_floor, Direction.up, False)
         self.person = Person('Bar', self.lift, self.top_floor)
-        self.lift.passengers = {self.person}
 
     def tearDown(self):
-        sa.reset()
+        reset()
 
     def test_out_correct_floor(self):
         '''A person step out of a lift at the correct floor.'''
         self.lift.location = self.top_floor
-        with mock.patch.object(self.person, 'emit') as mock_emit:
-            self.person.on_lift_open('lift.open', self.lift)
-            expected = ('person.lift.off', self.lift)
-            actual = mock_emit.mock_calls[0][1]
-            self.assertEqual(expected, actual)
+        self.assertTrue(self.person._should_get_off(self.lift))
 
     def test_out_wrong_dir(self):
         '''A person step out of a lift going the wrong way.'''
         self.lift.direction = Direction.down
-        with mock.patch.object(self.person, 'emit') as mock_emit:
-            self.person.on_lift_open('lift.open', self.lift)
-            expected = ('person.lift.off', self.lift)
-            actual = mock_emit.mock_calls[0][1]
-            self.assertEqual(expected, actual)
+        self.assertTrue(self.person._should_get_off(self.lift))
 
     def test_out_no_more_up(self):
         '''A person step out of a lift at top limit to go further up.'''
         self.lift.at_top = True
-        with mock.patch.object(self.person, 'emit') as mock_emit:
-            self.person.on_lift_open('lift.open', self.lift)
-            expected = ('person.lift.off', self.lift)
-            actual = mock_emit.mock_calls[0][1]
-            self.assertEqual(expected, actual)
+        self.assertTrue(self.person._should_get_off(self.lift))
 
     def test_no_out_intermediate_stop(self):
         '''A person does not step out at an intermediate stop.'''
         self.lift.location = MockFloor(5)
-        with mock.patch.object(self.person, 'emit') as mock_emit:
-            self.person.on_lift_open('lift.open', self.lift)
-            print(mock_emit.mock_calls)
-            self.assertFalse(mock_emit.called)
+        self.assertFalse(self.person._should_get_off(self.lift))
 
     def test_out_no_more_down(self):
         '''A person step out of a lift at bottom limit to go further down.'''
@@ -158,32 +150,36 @@ class TestPersonOut(unittest.TestCase):
         self.lift.direction = Direction.down
         self.lift.location = self.top_floor
         self.person.destination = self.ground_floor
-        with mock.patch.object(self.person, 'emit') as mock_emit:
-            self.person.on_lift_open('lift.open', self.lift)
-            expected = ('person.lift.off', self.lift)
-            actual = mock_emit.mock_calls[0][1]
-            self.assertEqual(expected, actual)
+        self.assertTrue(self.person._should_get_off(self.lift))
 
-    def test_out_remove_passenger(self):
-        '''The passenger list get updated on a person walking out.'''
+    def test_alight_message(self):
+        '''A person notifies its stepping off a lift.'''
         self.lift.location = self.top_floor
-        self.lift.passengers = {self.person}
-        self.person.on_lift_open('lift.open', self.lift)
-        self.assertEqual(set(), self.lift.passengers)
+        with mock.patch.object(Person, 'emit') as mock_emit:
+            self.person.alight(self.lift)
+            expected = ('person.lift.off', self.person, self.lift)
+            actual = mock_emit.mock_calls[0][1]
+            self.assertEqual(expected, actual)
 
     def test_out_change_location_to_floor(self):
-        '''A passenger's location changes when getting in a lift.'''
-        self.lift.location = self.top_floor
-        self.lift.passengers = {self.person}
-        self.person.on_lift_open('lift.open', self.lift)
+        '''A passenger's location changes when getting off a lift.'''
+        self.lift.location = MockFloor(5)
+        self.person.alight(self.lift)
         self.assertEqual(self.person.location, self.lift.location)
 
+    def test_out_at_destination(self):
+        '''A passenger stepping off at destination arrives.'''
+        self.lift.location = self.top_floor
+        with mock.patch.object(Person, 'arrive') as mock_arrive:
+            self.person.alight(self.lift)
+            mock_arrive.assert_called_once_with()
+
     def test_arrived(self):
         '''A person emits `person.arrived` and KILL when at destination.'''
         self.lift.location = self.top_floor
-        with mock.patch.object(self.person, 'emit') as mock_emit:
+        with mock.patch.object(Person, 'emit') as mock_emit:
             self.person.arrive()
-            expected = ('person.arrived', )
+            expected = ('person.arrived', self.person)
             actual = mock_emit.mock_calls[0][1]
             self.assertEqual(expected, actual)
             expected = (sa.KILL, self.person)
@@ -192,7 +188,7 @@ class TestPersonOut(unittest.TestCase):
 
     def test_off_call_again(self):
         '''A person stepping off mid-trip will call a new lift.'''
-        self.lift.at_top = True
-        with mock.patch.object(self.person, 'call_lift') as mock_call:
-            self.person.on_lift_open('lift.open', self.lift)
+        self.lift.location = MockFloor(5)
+        with mock.patch.object(Person, 'call_lift') as mock_call:
+            self.person.alight(self.lift)
             mock_call.assert_called_once_with()
@@ -0,0 +1,217 @@
+'''
+Test suite for the population module.
+'''
+
+import unittest
+from random import Random
+
+from lifts.common import Direction, process_events, reset
+from lifts.floor import Floor
+from lifts.lift import Lift
+from lifts.person import Person
+from lifts.arrivals import Arrival
+import lifts.population as lpo
+
+
+class MockLift:
+
+    def __init__(self, location, direction, capacity=100):
+        self.location = location
+        self.direction = direction
+        self.capacity = capacity
+        self.load = 0
+        self.at_top = False
+        self.at_bottom = False
+
+    @property
+    def numeric_location(self):
+        return self.location.numeric_location
+
+    @property
+    def full(self):
+        return self.load >= self.capacity
+
+
+class TestPopulation(unittest.TestCase):
+
+    '''Tests for the Population class.'''
+
+    def setUp(self):
+        self.floors = {level: Floor(level) for level in range(5)}
+        self.lift = MockLift(self.floors[0], Direction.up)
+        self.now = 0
+        # Two people going up from the ground floor, then one going nowhere
+        self.arrivals = [Arrival(0, None, 0, 3), Arrival(0, None, 0, 4),
+                         Arrival(0, None, 2, 2)]
+        self.population = lpo.Population(
+            self.floors, [self.lift], len(self.arrivals), lambda: self.now)
+
+    def tearDown(self):
+        reset()
+
+    def spawn(self, count):
+        '''Spawn `count` people.'''
+        for arrival in self.arrivals[:count]:
+            self.population.spawn(arrival)
+
+    def test_pending(self):
+        '''People are not in the building until they spawn.'''
+        self.assertEqual(3, len(self.population))
+        self.assertEqual(0, self.population.in_building)
+        self.assertTrue((self.population.state == lpo.PENDING).all())
+
+    def test_spawn_call(self):
+        '''A spawning person waits and calls a lift.'''
+        self.now = 7
+        self.spawn(1)
+        self.assertEqual(lpo.WAITING, self.population.state[0])
+        self.assertEqual(7, self.population.spawn_time[0])
+        self.assertEqual(3, self.population.destination[0])
+        self.assertEqual({Direction.up}, self.floors[0].requested_directions)
+
+    def test_spawn_at_destination(self):
+        '''A person spawning at destination immediately arrives.'''
+        self.spawn(3)
+        self.assertEqual(lpo.ARRIVED, self.population.state[2])
+        self.assertEqual(2, self.population.in_building)
+
+    def test_rows_recycled(self):
+        '''People arriving give their row to the next ones entering.'''
+        for _ in range(3):
+            self.population.spawn(self.arrivals[2])
+        self.spawn(1)
+        self.assertEqual([lpo.WAITING, lpo.PENDING, lpo.PENDING],
+                         self.population.state.tolist())
+
+    def test_rows_grow(self):
+        '''The arrays grow when more people are inside than they have rows.'''
+        self.spawn(2)
+        self.spawn(2)
+        self.assertEqual(3, len(self.population))
+        self.assertEqual([lpo.WAITING] * 4 + [lpo.PENDING] * 2,
+                         self.population.state.tolist())
+        self.assertEqual([3, 4, 3, 4, 0, 0],
+                         self.population.destination.tolist())
+
+    def test_board(self):
+        '''People going the lift's way board it.'''
+        self.spawn(2)
+        self.now = 5
+        self.population.board(self.lift)
+        self.assertEqual([lpo.RIDING] * 2, self.population.state[:2].tolist())
+        self.assertEqual([5, 5], self.population.board_time[:2].tolist())
+        self.assertEqual(2, self.lift.load)
+
+    def test_board_wrong_direction(self):
+        '''People do not board a lift going the wrong way.'''
+        self.spawn(2)
+        self.lift.direction = Direction.down
+        self.population.board(self.lift)
+        self.assertEqual(0, self.lift.load)
+
+    def test_board_capacity(self):
+        '''People board in calling order, until the lift is full.'''
+        self.spawn(2)
+        self.lift.capacity = 1
+        self.population.board(self.lift)
+        self.assertEqual([lpo.RIDING, lpo.WAITING],
+                         self.population.state[:2].tolist())
+
+    def test_alight(self):
+        '''Riders at destination step off and arrive.'''
+        self.spawn(2)
+        self.population.board(self.lift)
+        self.lift.location = self.floors[3]
+        self.now = 9
+        self.population.alight(0)
+        self.assertEqual([lpo.ARRIVED, lpo.RIDING],
+                         self.population.state[:2].tolist())
+        self.assertEqual(9, self.population.alight_time[0])
+        self.assertEqual(1, self.lift.load)
+
+    def test_alight_transfer(self):
+        '''Riders stepping off mid-trip queue up and call again.'''
+        self.spawn(2)
+        self.population.board(self.lift)
+        self.lift.location = self.floors[2]
+        self.lift.at_top = True
+        self.population.alight(0)
+        process_events()
+        self.assertEqual([lpo.WAITING] * 2, self.population.state[:2].tolist())
+        self.assertEqual([2, 2], self.population.location[:2].tolist())
+        self.assertEqual({Direction.up}, self.floors[2].requested_directions)
+
+    def test_alight_transfer_no_board(self):
+        '''Riders forced off do not board again the lift they just left.'''
+        self.spawn(2)
+        self.population.board(self.lift)
+        self.lift.location = self.floors[2]
+        self.lift.direction = Direction.none
+        self.population.alight(0)
+        self.population.board(self.lift)
+        process_events()
+        self.assertEqual(0, self.lift.load)
+        self.assertEqual(2, self.population.queue_length(2))
+
+    def test_alight_by_destination(self):
+        '''Riders step off by destination, the one requested first first.'''
+        self.arrivals = [Arrival(0, None, 0, 4), Arrival(0, None, 0, 3),
+                         Arrival(0, None, 0, 4)]
+        self.spawn(3)
+        self.population.board(self.lift)
+        self.lift.location = self.floors[2]
+        self.lift.at_top = True
+        self.population.alight(0)
+        process_events()
+        self.assertEqual([0, 2, 1], self.population._waiting[2])
+
+
+class TestSameRules(unittest.TestCase):
+
+    '''The vectorised decisions match those of Person.'''
+
+    def tearDown(self):
+        reset()
+
+    def test_random_situations(self):
+        '''Boarding and alighting decisions match Person's, at random.'''
+        rng = Random(42)
+        floors = {level: Floor(level) for level in range(6)}
+        for floor in floors.values():
+            floor.above = floors.get(floor.level + 1)
+            floor.below = floors.get(floor.level - 1)
+        description = dict(lid='L', capacity=1000, transit_time=1,
+                           accel_time=2, bottom_floor_number=0,
+                           top_floor_number=5)
+        for trial in range(200):
+            lift = Lift(description, floors[rng.randrange(6)])
+            lift.intent = rng.choice(list(Direction))
+            here = lift.numeric_location
+            destinations = [rng.randrange(6) for _ in range(10)]
+            # What the actors would do
+            people = [Person('#{}'.format(n), lift, floors[dest])
+                      for n, dest in enumerate(destinations)]
+            gets_off = [p._should_get_off(lift) for p in people]
+            waiting = [Person('@{}'.format(n), floors[here], floors[dest])
+                       for n, dest in enumerate(destinations) if dest != here]
+            gets_on = [p._should_get_on(lift) for p in waiting]
+            # What the arrays do
+            arrivals = [Arrival(0, None, here, dest) for dest in destinations
+                        if dest != here]
+            population = lpo.Population(floors, [lift], len(destinations),
+                                        lambda: 0)
+            for arrival in arrivals:
+                population.spawn(arrival)
+            population.board(lift)
+            boarded = population.state[:len(arrivals)] == lpo.RIDING
+            self.assertEqual(gets_on, boarded.tolist())
+            population.destination[:] = destinations
+            population.state[:] = lpo.RIDING
+            population.location[:] = 0
+            population._riders[0] = list(range(len(destinations)))
+            population._waiting = {level: [] for level in floors}
+            population.alight(0)
+            process_events()
+            alighted = population.state != lpo.RIDING
+            self.assertEqual(gets_off, alighted.tolist())
+            reset()
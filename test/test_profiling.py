@@ -0,0 +1,70 @@
+'''
+Test suite for the profiling module.
+'''
+
+import os
+import pstats
+import sys
+import tempfile
+import time
+import unittest
+
+from lifts import profiling
+
+
+class FakeSimulation:
+
+    '''Something that takes some time to run.'''
+
+    checkpoint_at = None
+
+    def run(self, checkpoint_at=None):
+        self.checkpoint_at = checkpoint_at
+        deadline = time.time() + 0.05
+        while time.time() < deadline:
+            pass
+
+
+class TestStackSampler(unittest.TestCase):
+
+    '''Tests for the StackSampler class.'''
+
+    def test_collapse(self):
+        '''Stacks are collapsed from the outermost to the innermost frame.'''
+        stack = profiling.StackSampler.collapse(sys._getframe())
+        self.assertTrue(stack.endswith(
+            'test_profiling.py:TestStackSampler.test_collapse'))
+
+    def test_samples(self):
+        '''The sampled thread is sampled while it runs.'''
+        sampler = profiling.StackSampler()
+        sampler.start()
+        FakeSimulation().run()
+        sampler.stop()
+        self.assertTrue(any('FakeSimulation.run' in stack
+                            for stack in sampler.samples))
+
+
+class TestRunProfiled(unittest.TestCase):
+
+    '''Tests for the run_profiled function.'''
+
+    def test_writes_files(self):
+        '''Both the pstats and the collapsed stacks are written.'''
+        with tempfile.TemporaryDirectory() as directory:
+            prefix = os.path.join(directory, 'run')
+            profiling.run_profiled(FakeSimulation(), prefix)
+            stats = pstats.Stats(prefix + '.pstats')
+            self.assertTrue(stats.total_calls)
+            with open(prefix + '.folded') as file_:
+                stack, count = file_.readline().rsplit(' ', 1)
+            self.assertIn('FakeSimulation.run', stack)
+            self.assertGreater(int(count), 0)
+
+    def test_checkpoint(self):
+        '''The simulation still saves the checkpoint it is asked for.'''
+        simulation = FakeSimulation()
+        with tempfile.TemporaryDirectory() as directory:
+            prefix = os.path.join(directory, 'run')
+            profiling.run_profiled(simulation, prefix, (10, 'sim.ckpt'))
+        self.assertEqual((10, 'sim.ckpt'), simulation.checkpoint_at)
@@ -0,0 +1,55 @@
+'''
+Test suite for the scheduler module.
+'''
+
+import unittest
+
+from lifts.scheduler import Scheduler, Stage
+
+
+class TestScheduler(unittest.TestCase):
+
+    '''Tests for the Scheduler class.'''
+
+    def setUp(self):
+        self.scheduler = Scheduler()
+
+    def test_empty(self):
+        '''A new scheduler has no events.'''
+        self.assertEqual(0, len(self.scheduler))
+        self.assertIsNone(self.scheduler.peek())
+
+    def test_time_order(self):
+        '''Events are popped in chronological order.'''
+        self.scheduler.schedule(5, Stage.turn, 'late')
+        self.scheduler.schedule(2, Stage.turn, 'early')
+        self.assertEqual(2, self.scheduler.peek())
+        self.assertEqual((Stage.turn, 'early'), self.scheduler.pop())
+        self.assertEqual((Stage.turn, 'late'), self.scheduler.pop())
+
+    def test_clock(self):
+        '''Popping an event advances the clock to its time.'''
+        self.scheduler.schedule(3.5, Stage.spawn)
+        self.scheduler.pop()
+        self.assertEqual(3.5, self.scheduler.now)
+
+    def test_stage_order(self):
+        '''Simultaneous events are processed by stage.'''
+        self.scheduler.schedule(1, Stage.turn)
+        self.scheduler.schedule(1, Stage.spawn)
+        self.scheduler.schedule(1, Stage.lift)
+        stages = [self.scheduler.pop()[0] for _ in range(3)]
+        self.assertEqual([Stage.lift, Stage.spawn, Stage.turn], stages)
+
+    def test_fifo(self):
+        '''Simultaneous events of the same stage keep scheduling order.'''
+        for payload in range(5):
+            self.scheduler.schedule(1, Stage.spawn, payload)
+        payloads = [self.scheduler.pop()[1] for _ in range(5)]
+        self.assertEqual(list(range(5)), payloads)
+
+    def test_no_past(self):
+        '''Events cannot be scheduled before the current time.'''
+        self.scheduler.schedule(3, Stage.spawn)
+        self.scheduler.pop()
+        self.assertRaises(ValueError, self.scheduler.schedule, 2, Stage.turn)
@@ -0,0 +1,106 @@
+'''
+Test suite for the server module.
+'''
+
+import asyncio
+import json
+import marshal
+import os
+import tempfile
+import unittest
+
+from lifts import server
+from lifts.common import reset
+
+SIM_FILE = os.path.join(os.path.dirname(__file__), '..', 'lifts',
+                        'simulations', 'basic.toml')
+
+
+async def idle_client(path, stall=None):
+    '''Play a simulation without moving the lifts, return its STATS.
+
+    If `stall` is not None, stop answering after the first turn, until it is
+    set.
+    '''
+    reader, writer = await asyncio.open_unix_connection(path)
+    stats = None
+    while stats is None:
+        line = (await reader.readline()).decode()
+        if not line:
+            break
+        if line.startswith('WORLD'):
+            writer.write(b'READY\n')
+        elif line.startswith('READY'):
+            if stall is not None:
+                await stall.wait()
+                stall = None
+            writer.write(b'READY\n')
+        elif line.startswith('STATS'):
+            stats = json.loads(line[len('STATS '):])
+    writer.close()
+    return stats
+
+
+class TestSimulationServer(unittest.TestCase):
+
+    '''Tests for serving many simulations at once.'''
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'lifts.sock')
+
+    def tearDown(self):
+        self.directory.cleanup()
+        reset()
+
+    def serve(self, clients, fast_forward=True, clocking=None):
+        '''Serve the `clients` coroutine function, return what it returns.'''
+        sim_server = server.SimulationServer(SIM_FILE, fast_forward,
+                                             use_cache=False)
+        if clocking is not None:
+            description = marshal.loads(sim_server._description)
+            description['clocking'].update(clocking)
+            sim_server._description = marshal.dumps(description)
+
+        async def main():
+            listener = await sim_server.start(self.path)
+            async with listener:
+                return await clients()
+        return sim_server, asyncio.run(main())
+
+    def test_many_clients(self):
+        '''Each client gets a simulation of its own.'''
+        async def clients():
+            return await asyncio.gather(
+                *(idle_client(self.path) for _ in range(5)))
+        sim_server, results = self.serve(clients)
+        self.assertEqual(5, sim_server.finished)
+        self.assertEqual(0, sim_server.running)
+        for stats in results:
+            self.assertEqual(results[0], stats)
+
+    def test_slow_client(self):
+        '''A stalled client does not hold the other simulations back.'''
+        async def clients():
+            stall = asyncio.Event()
+            slow = asyncio.ensure_future(idle_client(self.path, stall))
+            fast = await asyncio.gather(
+                *(idle_client(self.path) for _ in range(3)))
+            done_while_stalled = not slow.done()
+            stall.set()
+            await slow
+            return done_while_stalled, fast
+        sim_server, (done_while_stalled, fast) = self.serve(clients)
+        self.assertTrue(done_while_stalled)
+        self.assertEqual(3, len([stats for stats in fast if stats]))
+        self.assertEqual(4, sim_server.finished)
+
+    def test_real_time(self):
+        '''Simulations can be paced on the wall clock too.'''
+        async def clients():
+            return await asyncio.gather(
+                *(idle_client(self.path) for _ in range(2)))
+        clocking = {'total_ticks': 10, 'client_turn_ms': 1}
+        sim_server, results = self.serve(clients, False, clocking)
+        self.assertEqual(2, sim_server.finished)
+        self.assertEqual(results[0]['turns'], results[1]['turns'])
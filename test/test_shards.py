@@ -0,0 +1,100 @@
+'''
+Test suite for the shards module.
+'''
+
+import tempfile
+import unittest
+from copy import deepcopy
+
+from lifts import benchmark
+from lifts.common import reset
+from lifts.simulation import Simulation
+import lifts.shards as lsh
+
+
+def describe(ranges, floors=None, people=40):
+    '''Return the description of a building with lifts spanning `ranges`.'''
+    floors = floors or max(top for _, top in ranges) + 1
+    scenario = benchmark._scenario(floors, len(ranges), people)
+    with tempfile.TemporaryDirectory() as directory:
+        sim_file = benchmark.write_scenario(directory, 'zones', scenario)
+        description = Simulation.load_description(sim_file, use_cache=False)
+    for lift, (bottom, top) in zip(description['lifts'], ranges):
+        lift['bottom_floor_number'], lift['top_floor_number'] = bottom, top
+        lift['location'] = bottom
+    return description
+
+
+def run(simulation):
+    '''Run `simulation` with the scripted controller, return its stats.'''
+    try:
+        simulation.run()
+        return simulation.stats()
+    finally:
+        if isinstance(simulation, lsh.ShardedSimulation):
+            simulation.close()
+
+
+class TestPartition(unittest.TestCase):
+
+    '''Tests for the partition and zone_for functions.'''
+
+    def test_zones(self):
+        '''Lifts overlapping by more than a floor are in the same zone.'''
+        zones = lsh.partition(describe([(10, 20), (0, 10), (0, 5), (10, 15)]))
+        self.assertEqual([lsh.Zone(0, 10, ('L1', 'L2')),
+                          lsh.Zone(10, 20, ('L0', 'L3'))],
+                         [zone._replace(lifts=tuple(sorted(zone.lifts)))
+                          for zone in zones])
+
+    def test_unserved(self):
+        '''Every floor must be served by a lift.'''
+        with self.assertRaises(ValueError):
+            lsh.partition(describe([(0, 5), (5, 8)], floors=10))
+
+    def test_disconnected(self):
+        '''Consecutive zones must share a floor.'''
+        with self.assertRaises(ValueError):
+            lsh.partition(describe([(0, 4), (5, 9)]))
+
+    def test_zone_for(self):
+        '''People enter the zone that takes them closest to destination.'''
+        zones = [lsh.Zone(0, 10, ()), lsh.Zone(10, 20, ()),
+                 lsh.Zone(20, 30, ())]
+        self.assertEqual(0, lsh.zone_for(zones, 0, 5))
+        self.assertEqual(0, lsh.zone_for(zones, 0, 25))
+        self.assertEqual(1, lsh.zone_for(zones, 10, 25))
+        self.assertEqual(0, lsh.zone_for(zones, 10, 0))
+        self.assertEqual(1, lsh.zone_for(zones, 20, 5))
+
+
+class TestShardedSimulation(unittest.TestCase):
+
+    '''Tests for the ShardedSimulation class.'''
+
+    def tearDown(self):
+        reset()
+
+    def test_single_zone(self):
+        '''A building in a single zone is simulated as in a single process.'''
+        description = describe([(0, 7), (0, 7)])
+        sharded = run(lsh.ShardedSimulation(
+            None, fast_forward=True, description=deepcopy(description),
+            interface_class=benchmark.ScriptedController))
+        self.assertEqual([[0, 7]], sharded.pop('zones'))
+        reset()
+        simulation = Simulation(None, description=deepcopy(description),
+                                interface_class=benchmark.ScriptedController)
+        simulation.paced = False
+        self.assertEqual(run(simulation), sharded)
+
+    def test_transfers(self):
+        '''People change lift at the sky lobbies to reach their floor.'''
+        description = describe([(0, 6), (6, 12)], people=30)
+        stats = run(lsh.ShardedSimulation(
+            None, fast_forward=True, description=description,
+            interface_class=benchmark.ScriptedController))
+        self.assertEqual([[0, 6], [6, 12]], stats['zones'])
+        self.assertEqual(30, stats['delivered'])
+        self.assertEqual(30, stats['journey']['count'])
+        self.assertEqual({'L0', 'L1'}, set(stats['lifts']))
@@ -0,0 +1,93 @@
+'''
+Test suite for the shared module.
+'''
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from lifts import shared
+from lifts.benchmark import ScriptedController
+from lifts.common import Direction, reset
+from lifts.simulation import Simulation
+
+SIM_FILE = os.path.join(os.path.dirname(__file__), '..', 'lifts',
+                        'simulations', 'basic.toml')
+
+
+class TestStateBlock(unittest.TestCase):
+
+    '''Tests for publishing and reading the shared state.'''
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.fname = os.path.join(self.directory.name, 'lifts.state')
+
+    def tearDown(self):
+        self.directory.cleanup()
+        reset()
+
+    def test_size(self):
+        '''The block has a header, and a record per lift and per floor.'''
+        sim = Simulation(SIM_FILE, interface_class=ScriptedController,
+                         use_cache=False, shared_state=self.fname)
+        self.assertEqual(
+            shared.block_size(len(sim.lifts), len(sim.floors)),
+            os.path.getsize(self.fname))
+        sim.shared_state.close()
+
+    def test_publish(self):
+        '''Readers see the lifts and the floors as they are.'''
+        sim = Simulation(SIM_FILE, interface_class=ScriptedController,
+                         use_cache=False, shared_state=self.fname)
+        lift = sim.lifts['main']
+        lift.open_doors = True
+        lift.load = 3
+        bottom = min(sim.floors)
+        sim.floors[bottom].requested_directions.add(Direction.up)
+        sim.shared_state.publish(7)
+        view = shared.StateView(self.fname)
+        state = view.snapshot()
+        self.assertEqual(7, state['turn'])
+        self.assertEqual(2, state['sequence'])
+        self.assertEqual(
+            {'location': lift.location.level, 'destination': None,
+             'direction': 0, 'open_doors': True, 'load': 3,
+             'capacity': lift.capacity}, state['lifts'][0])
+        self.assertEqual({'level': bottom, 'up': True, 'down': False},
+                         state['floors'][0])
+        self.assertEqual(sorted(sim.floors),
+                         [floor['level'] for floor in state['floors']])
+        view.close()
+        sim.shared_state.close()
+
+    def test_stalled_writer(self):
+        '''Readers give up on a block the engine never finishes writing.'''
+        block = shared.StateBlock(self.fname, [], [])
+        shared.SEQUENCE.pack_into(block.map, shared.SEQUENCE_OFFSET, 1)
+        view = shared.StateView(self.fname)
+        with mock.patch.object(shared, 'SNAPSHOT_ATTEMPTS', 5):
+            with self.assertRaises(TimeoutError):
+                view.snapshot()
+        view.close()
+        block.close()
+
+    def test_not_a_block(self):
+        '''Other files are refused.'''
+        with open(self.fname, 'wb') as file_:
+            file_.write(b'\0' * shared.HEADER.size)
+        with self.assertRaises(ValueError):
+            shared.StateView(self.fname)
+
+    def test_run(self):
+        '''The state is published once per turn.'''
+        sim = Simulation(SIM_FILE, fast_forward=True, use_cache=False,
+                         interface_class=ScriptedController,
+                         shared_state=self.fname)
+        sim.run()
+        view = shared.StateView(self.fname)
+        state = view.snapshot()
+        self.assertEqual(sim.step_counter, state['turn'])
+        self.assertEqual(2 * sim.step_counter, state['sequence'])
+        view.close()
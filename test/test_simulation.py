@@ -2,13 +2,18 @@
 Test suite for the simulation module.
 '''
 
+import os
+import random
+import tempfile
 import unittest
 import unittest.mock as mock
 
 import simpleactors as sa
 
 import lifts.simulation as simulation
+from lifts.common import Command, Direction, Message, reset
 from lifts.floor import Floor
+from lifts.lift import Lift
 
 
 TEST_DESCRIPTION = {
@@ -18,7 +23,8 @@ TEST_DESCRIPTION = {
                  {'is_entry': True, 'is_exit': True, 'level': 0}],
     'clocking': {'client_turn_ms': 50, 'ticks_per_turn': 1, 'total_ticks': 10},
     'id': 'Basic',
-    'lifts': [{'accel_time': 6,
+    'lifts': [{'lid': 'main',
+               'accel_time': 6,
                'bottom_floor_number': 0,
                'capacity': 4,
                'directional': True,
@@ -39,9 +45,10 @@ class TestSimulation(unittest.TestCase):
                                return_value=None):
             self.sim = simulation.Simulation()
         self.sim.description = TEST_DESCRIPTION
+        self.sim.rng = random.Random()
 
     def tearDown(self):
-        sa.reset()
+        reset()
 
     def test_load_sim_file(self):
         '''A simulation file is loaded correctly.'''
@@ -69,3 +76,457 @@ class TestSimulation(unittest.TestCase):
             # http://bugs.python.org/issue19438
             expected = Floor if nl > 0 else type(None)
             self.assertTrue(isinstance(floor.below, expected))
+
+    def test_init_lifts(self):
+        '''_init_lifts create lifts at their initial floor.'''
+        self.sim._init_floors()
+        self.sim._init_lifts()
+        lift = self.sim.lifts['main']
+        self.assertIsInstance(lift, Lift)
+        self.assertIs(self.sim.floors[0], lift.location)
+
+    def test_init_people(self):
+        '''_init_people plans the arrival of the whole population.'''
+        self.sim._init_clocking()
+        self.sim._init_floors()
+        self.sim._init_people()
+        self.assertEqual(5, len(self.sim.pending))
+        times = [arrival.time for arrival in self.sim.pending.pop_due(1e9)]
+        self.assertEqual(5, len(times))
+        for time in times:
+            self.assertTrue(0 <= time <= self.sim.duration)
+
+
+class FakeInterface:
+
+    '''An in-memory interface, driving lifts with a trivial strategy.'''
+
+    def __init__(self, directory=None):
+        self.sim = None
+        self.messages = []
+        self.events = []
+
+    def send_message(self, message, entity=None, *args):
+        self.messages.append(message)
+        self.events.append((message, entity) + args)
+
+    def get_commands(self):
+        return iter(self.get_turn_commands(0))
+
+    def get_turn_commands(self, timeout):
+        commands = []
+        for lift in self.sim.lifts.values():
+            if lift.open_doors:
+                commands.append([Command.close, lift])
+                continue
+            if lift.destination is not None:
+                continue
+            targets = list(lift.passengers) or [
+                floor for floor in self.sim.floors.values()
+                if any(floor.waiting.values())]
+            if not targets:
+                continue
+            here = lift.numeric_location
+            target = min(targets, key=lambda f: abs(f.level - here))
+            if target is lift.location:
+                commands.append([Command.open, lift, Direction.none])
+            else:
+                commands.append([Command.goto, lift, target])
+        return commands
+
+
+class SweepInterface(FakeInterface):
+
+    '''An in-memory interface, having lifts stop at each floor in turn.'''
+
+    def __init__(self, directory=None):
+        super().__init__()
+        self.heading = {}
+        self.opened = set()
+
+    def get_turn_commands(self, timeout):
+        commands = []
+        for lift in self.sim.lifts.values():
+            heading = self.heading.setdefault(lift, Direction.up)
+            if lift.at_top:
+                heading = self.heading[lift] = Direction.down
+            elif lift.at_bottom:
+                heading = self.heading[lift] = Direction.up
+            if lift.open_doors:
+                commands.append([Command.close, lift])
+            elif lift.destination is not None:
+                continue
+            elif lift not in self.opened:
+                self.opened.add(lift)
+                commands.append([Command.open, lift, heading])
+            else:
+                floor = lift.location.above if heading is Direction.up \
+                    else lift.location.below
+                self.opened.discard(lift)
+                commands.append([Command.goto, lift, floor])
+        return commands
+
+
+class AimlessSweepInterface(SweepInterface):
+
+    '''A sweep that opens without intent at the second floor, going up.'''
+
+    def get_turn_commands(self, timeout):
+        commands = super().get_turn_commands(timeout)
+        for command in commands:
+            if command[0] is Command.open and command[2] is Direction.up and \
+                    command[1].location.level == 2:
+                command[2] = Direction.none
+        return commands
+
+
+class ActorsSimulation(simulation.Simulation):
+
+    '''A simulation with a sizeable population.'''
+
+    backend = 'actors'
+    topology = 'linked'
+
+    def _load_sim_file(self, sim_file):
+        description = super()._load_sim_file(sim_file)
+        description['topology'] = self.topology
+        description['people']['backend'] = self.backend
+        description['people']['population'] = 40
+        return description
+
+
+class ArraysSimulation(ActorsSimulation):
+
+    '''A simulation using the arrays backend for its population.'''
+
+    backend = 'arrays'
+
+
+class FleetSimulation(ActorsSimulation):
+
+    '''A simulation keeping the state of its lifts in arrays.'''
+
+    topology = 'arrays'
+
+
+class TestSimulationRun(unittest.TestCase):
+
+    '''Tests for running a whole simulation.'''
+
+    sim_file = os.path.join(os.path.dirname(simulation.__file__),
+                            'simulations', 'basic.toml')
+
+    def setUp(self):
+        self.interface = FakeInterface()
+        with mock.patch.object(simulation, 'FileInterface',
+                               return_value=self.interface):
+            self.sim = simulation.Simulation(self.sim_file)
+        self.interface.sim = self.sim
+
+    def tearDown(self):
+        reset()
+
+    def test_real_time_step(self):
+        '''A turn in real time moves the clock by one turn duration.'''
+        self.sim.step()
+        self.assertEqual(self.sim.turn_duration, self.sim.clock)
+        self.assertEqual([Message.turn, Message.ready],
+                         self.interface.messages)
+
+    def test_fast_forward_completes(self):
+        '''Fast-forward runs until everybody reached their destination.'''
+        with mock.patch.object(simulation, 'sleep') as mock_sleep:
+            self.sim.run_fast_forward()
+            self.assertFalse(mock_sleep.called)
+        self.assertTrue(self.sim.done)
+        self.assertFalse(self.sim.overdue)
+
+    def test_fast_forward_time_limit(self):
+        '''Fast-forward stops at the hard time limit, if nobody moves.'''
+        self.interface.get_turn_commands = lambda timeout: []
+        self.sim.run_fast_forward()
+        self.assertFalse(self.sim.done)
+        self.assertTrue(self.sim.overdue)
+
+    def test_people_dropped(self):
+        '''People are actors only while in the building.'''
+        interface = SweepInterface()
+        with mock.patch.object(simulation, 'FileInterface',
+                               return_value=interface):
+            self.sim = ActorsSimulation(self.sim_file)
+        interface.sim = self.sim
+        self.assertFalse(sa.global_actors_by_id[simulation.Person])
+        self.sim.run_fast_forward(turns=150)
+        self.assertTrue(self.sim.in_building)
+        self.assertEqual(self.sim.in_building,
+                         len(sa.global_actors_by_id[simulation.Person]))
+        self.sim.run_fast_forward()
+        self.assertTrue(self.sim.done)
+        self.assertFalse(sa.global_actors_by_id[simulation.Person])
+        self.assertFalse([actor for actor in sa.global_actors
+                          if isinstance(actor, simulation.Person)])
+
+    def test_stats_snapshots(self):
+        '''Statistics are sent every so many turns, if asked to.'''
+        self.sim.stats_every = 10
+        self.sim.run_fast_forward()
+        snapshots = self.interface.messages.count(Message.stats)
+        self.assertEqual(self.sim.step_counter // 10, snapshots)
+
+    def test_stats_are_streamed(self):
+        '''Everybody's journey is accounted for, without keeping it.'''
+        self.sim.run_fast_forward()
+        stats = self.sim.stats()
+        self.assertEqual(stats['population'], stats['journey']['count'])
+        self.assertEqual(stats['wait']['count'], stats['ride']['count'])
+        self.assertFalse(self.sim.collector._entered)
+        lift = stats['lifts']['main']
+        self.assertEqual(lift['starts'], lift['stops'])
+
+    def test_profile_in_stats(self):
+        '''Handler timings are part of the statistics, when profiling.'''
+        self.assertNotIn('profile', self.sim.stats())
+        with mock.patch.object(simulation, 'FileInterface',
+                               return_value=self.interface):
+            self.sim = simulation.Simulation(self.sim_file, profile=True)
+        self.interface.sim = self.sim
+        self.sim.run_fast_forward()
+        handlers = self.sim.stats()['profile']['handlers']
+        self.assertGreater(handlers['Floor.push_button']['calls'], 0)
+
+    def test_commands_with_ready(self):
+        '''Commands sent along with the first READY are played first.'''
+        for fast_forward in (False, True):
+            reset()
+            with tempfile.TemporaryDirectory() as directory:
+                self.sim = simulation.Simulation(
+                    self.sim_file, interface_dir=directory)
+                with open(self.sim.interface.in_name, 'w') as file_:
+                    file_.write('READY\nGOTO main 3\n')
+                self.assertTrue(next(self.sim.check_client_is_ready()))
+                if fast_forward:
+                    self.sim.run_fast_forward(turns=1)
+                else:
+                    self.sim.step()
+                lift = self.sim.lifts['main']
+                self.assertEqual(3, lift.destination.level)
+                self.sim.interface.cleanup()
+
+    def test_fast_forward_matches_real_time(self):
+        '''Both engines play the same turns, with the same events.'''
+        self.sim.run_fast_forward()
+        fast_forward = self.sim.step_counter, self.sim.clock, \
+            self.interface.events
+        self.setUp()
+        while not self.sim.done and not self.sim.overdue:
+            self.sim.step()
+        self.assertEqual(fast_forward, (self.sim.step_counter, self.sim.clock,
+                                        self.interface.events))
+
+
+class TestCheckpoints(unittest.TestCase):
+
+    '''Tests for saving, restoring and forking simulations.'''
+
+    def setUp(self):
+        with mock.patch.object(simulation, 'FileInterface', FakeInterface):
+            self.sim = ActorsSimulation(TestSimulationRun.sim_file)
+        self.sim.interface.sim = self.sim
+        self.sim.run_fast_forward(turns=50)
+
+    def tearDown(self):
+        reset()
+
+    def restore(self, data):
+        sim = simulation.Simulation.from_checkpoint(
+            data, interface_class=FakeInterface)
+        sim.interface.sim = sim
+        return sim
+
+    def finish(self, sim):
+        sim.run_fast_forward()
+        return sim.clock, sim.stats()
+
+    def test_pause(self):
+        '''A fast-forward run can be paused and resumed.'''
+        self.assertEqual(50, self.sim.step_counter)
+        paused = self.finish(self.sim)
+        with mock.patch.object(simulation, 'FileInterface', FakeInterface):
+            sim = ActorsSimulation(TestSimulationRun.sim_file)
+        sim.interface.sim = sim
+        self.assertEqual(paused, self.finish(sim))
+
+    def test_restore(self):
+        '''A restored simulation continues exactly like the original.'''
+        data = self.sim.checkpoint()
+        restored = self.restore(data)
+        self.assertEqual(50, restored.step_counter)
+        self.assertEqual(self.finish(restored), self.finish(self.sim))
+
+    def test_restore_file(self):
+        '''Checkpoints can be saved to and loaded from files.'''
+        with tempfile.TemporaryDirectory() as directory:
+            fname = os.path.join(directory, 'checkpoint')
+            self.sim.save_checkpoint(fname)
+            restored = simulation.Simulation.load_checkpoint(
+                fname, interface_class=FakeInterface)
+        restored.interface.sim = restored
+        self.assertEqual(self.sim.clock, restored.clock)
+        self.assertEqual(self.sim.description, restored.description)
+
+    def test_state(self):
+        '''Lifts, floors and people are restored with all their state.'''
+        restored = self.restore(self.sim.checkpoint())
+        for lid, lift in self.sim.lifts.items():
+            twin = restored.lifts[lid]
+            self.assertIsNot(lift, twin)
+            self.assertEqual(lift._carry_seconds, twin._carry_seconds)
+            self.assertEqual(lift.numeric_location, twin.numeric_location)
+            self.assertEqual(lift.load, twin.load)
+        for level, floor in self.sim.floors.items():
+            self.assertEqual(floor.requested_directions,
+                             restored.floors[level].requested_directions)
+        self.assertEqual(self.sim.rng.getstate(), restored.rng.getstate())
+        self.assertEqual(len(self.sim.registry.actors_by_id[simulation.Person]),
+                         len(restored.registry.actors_by_id[simulation.Person]))
+
+    def test_fork(self):
+        '''Forks continue independently from the same point.'''
+        fork = self.sim.fork(None)
+        fork.interface.sim = fork
+        forked = self.finish(fork)
+        self.assertEqual(50, self.sim.step_counter)
+        other = self.sim.fork(None)
+        other.interface.sim = other
+        self.assertEqual(forked, self.finish(other))
+        self.assertEqual(forked, self.finish(self.sim))
+
+    def test_arrays_backend(self):
+        '''The arrays backend can be checkpointed too.'''
+        with mock.patch.object(simulation, 'FileInterface', SweepInterface):
+            sim = ArraysSimulation(TestSimulationRun.sim_file)
+        sim.interface.sim = sim
+        sim.run_fast_forward(turns=50)
+        fork = sim.fork(None)
+        fork.interface = sim.interface.__class__()
+        fork.interface.sim = fork
+        fork.interface.heading = {fork.lifts[lift.id]: heading for lift,
+                                  heading in sim.interface.heading.items()}
+        fork.interface.opened = {fork.lifts[lift.id]
+                                 for lift in sim.interface.opened}
+        self.assertEqual(self.finish(sim), self.finish(fork))
+
+
+class TestArraysBackend(unittest.TestCase):
+
+    '''Tests for running a simulation with the arrays backend.'''
+
+    def setUp(self):
+        self.interface = SweepInterface()
+        with mock.patch.object(simulation, 'FileInterface',
+                               return_value=self.interface):
+            self.sim = ArraysSimulation(TestSimulationRun.sim_file)
+        self.interface.sim = self.sim
+
+    def tearDown(self):
+        reset()
+
+    def test_no_actors(self):
+        '''People are rows of the population, not actors.'''
+        self.assertEqual(40, len(self.sim.population))
+        self.sim.run_fast_forward()
+        self.assertFalse(sa.global_actors_by_id[simulation.Person])
+
+    def test_everybody_arrives(self):
+        '''Everybody reaches their destination.'''
+        self.sim.run_fast_forward()
+        self.assertTrue(self.sim.done)
+        self.assertEqual(40, self.sim.population.arrived)
+
+    def assertSameAsActors(self, interface_class):
+        '''Assert both backends play the same with a client.'''
+        runs = []
+        for simulation_class in (ArraysSimulation, ActorsSimulation):
+            interface = interface_class()
+            with mock.patch.object(simulation, 'FileInterface',
+                                   return_value=interface):
+                sim = simulation_class(TestSimulationRun.sim_file)
+            interface.sim = sim
+            sim.run_fast_forward()
+            self.assertTrue(sim.done)
+            stats = sim.stats()
+            runs.append((sim.clock, interface.events, [
+                stats[key] for key in ('wait', 'ride', 'journey', 'lifts')]))
+            reset()
+        self.assertEqual(*runs)
+
+    def test_same_as_actors(self):
+        '''The arrays backend behaves exactly like the actors one.'''
+        self.assertSameAsActors(SweepInterface)
+
+    def test_same_as_actors_without_intent(self):
+        '''Riders forced off by an OPEN without intent do not board again.'''
+        self.assertSameAsActors(AimlessSweepInterface)
+
+
+class TestArraysTopology(unittest.TestCase):
+
+    '''Tests for running a simulation with the arrays topology.'''
+
+    def setUp(self):
+        self.interface = SweepInterface()
+        with mock.patch.object(simulation, 'FileInterface',
+                               return_value=self.interface):
+            self.sim = FleetSimulation(TestSimulationRun.sim_file)
+        self.interface.sim = self.sim
+
+    def tearDown(self):
+        reset()
+
+    def linked(self):
+        '''Return a simulation like the one tested, with linked topology.'''
+        reset()
+        interface = SweepInterface()
+        with mock.patch.object(simulation, 'FileInterface',
+                               return_value=interface):
+            sim = ActorsSimulation(TestSimulationRun.sim_file)
+        interface.sim = sim
+        return sim
+
+    def test_fleet(self):
+        '''Lifts are rows of the fleet, and can be looked up as lifts.'''
+        lift = self.sim.lifts['main']
+        self.assertIs(lift, sa.get_by_id(simulation.Lift, 'main'))
+        self.assertIs(lift, self.sim.fleet.lifts[0])
+        self.assertIsNone(self.linked().fleet)
+
+    def test_same_as_linked_fast_forward(self):
+        '''Lifts in arrays behave exactly like linked ones.'''
+        self.sim.run_fast_forward()
+        stats = self.sim.stats()
+        sim = self.linked()
+        sim.run_fast_forward()
+        self.assertTrue(sim.done)
+        self.assertEqual(self.sim.clock, sim.clock)
+        self.assertEqual(stats, sim.stats())
+
+    def test_same_as_linked_real_time(self):
+        '''Lifts in arrays move at each turn exactly like linked ones.'''
+        for _ in range(100):
+            self.sim.step()
+        stats = self.sim.stats()
+        sim = self.linked()
+        for _ in range(100):
+            sim.step()
+        self.assertEqual(stats, sim.stats())
+
+    def test_checkpoint(self):
+        '''The arrays topology can be checkpointed too.'''
+        self.sim.run_fast_forward(turns=50)
+        fork = self.sim.fork(None)
+        lift, forked = self.sim.lifts['main'], fork.lifts['main']
+        self.assertIs(fork.fleet, forked.fleet)
+        self.assertEqual(lift.location.level, forked.location.level)
+        self.assertEqual(lift.direction, forked.direction)
+        self.assertEqual(self.sim.fleet.carry.tolist(),
+                         fork.fleet.carry.tolist())
@@ -0,0 +1,123 @@
+'''
+Test suite for the stats module.
+'''
+
+import random
+import statistics
+import unittest
+
+from lifts.common import process_events, reset
+from lifts.floor import Floor
+from lifts.stats import Histogram, RunningStats, StatsCollector
+
+
+class MockLift:
+
+    def __init__(self, lid):
+        self.id = lid
+
+
+class TestHistogram(unittest.TestCase):
+
+    '''Tests for the Histogram class.'''
+
+    def test_buckets(self):
+        '''Values go in the first bucket whose bound is not below them.'''
+        histogram = Histogram((10, 20))
+        for value in (0, 10, 10.5, 20, 21, 1000):
+            histogram.add(value)
+        self.assertEqual([2, 2, 2], histogram.counts)
+
+
+class TestRunningStats(unittest.TestCase):
+
+    '''Tests for the RunningStats class.'''
+
+    def test_empty(self):
+        '''No values, no variance.'''
+        stats = RunningStats()
+        self.assertEqual(0, stats.count)
+        self.assertEqual(0, stats.variance)
+        self.assertIsNone(stats.min)
+
+    def test_matches_batch(self):
+        '''Streaming mean and variance match the ones of the whole sample.'''
+        values = [random.expovariate(0.1) for _ in range(1000)]
+        stats = RunningStats()
+        stats.add_many(values)
+        self.assertEqual(1000, stats.count)
+        self.assertAlmostEqual(statistics.mean(values), stats.mean)
+        self.assertAlmostEqual(statistics.pstdev(values), stats.stdev)
+        self.assertEqual(min(values), stats.min)
+        self.assertEqual(max(values), stats.max)
+        self.assertEqual(1000, sum(stats.histogram.counts))
+
+    def test_merge(self):
+        '''Merged statistics match the ones of the concatenated samples.'''
+        values = [random.expovariate(0.1) for _ in range(1000)]
+        whole, left, right = RunningStats(), RunningStats(), RunningStats()
+        whole.add_many(values)
+        left.add_many(values[:300])
+        right.add_many(values[300:])
+        left.merge(right)
+        left.merge(RunningStats())
+        self.assertEqual(whole.count, left.count)
+        self.assertAlmostEqual(whole.mean, left.mean)
+        self.assertAlmostEqual(whole.variance, left.variance)
+        self.assertEqual(whole.min, left.min)
+        self.assertEqual(whole.max, left.max)
+        self.assertEqual(whole.histogram.counts, left.histogram.counts)
+
+
+class TestStatsCollector(unittest.TestCase):
+
+    '''Tests for the StatsCollector class.'''
+
+    def setUp(self):
+        self.now = 0
+        self.collector = StatsCollector(lambda: self.now)
+        self.lift = MockLift('main')
+
+    def tearDown(self):
+        reset()
+
+    def emit(self, *args, at=None):
+        if at is not None:
+            self.now = at
+        self.collector.emit(*args)
+        process_events()
+
+    def test_person_times(self):
+        '''Waiting, riding and journey times are tracked per person.'''
+        person = object()
+        self.emit('person.enter', person, at=10)
+        self.emit('person.lift.on', person, self.lift, at=15)
+        self.emit('person.lift.off', person, self.lift, at=35)
+        self.emit('person.arrived', person)
+        self.assertEqual(5, self.collector.wait.mean)
+        self.assertEqual(20, self.collector.ride.mean)
+        self.assertEqual(25, self.collector.journey.mean)
+        self.assertFalse(self.collector._since)
+        self.assertFalse(self.collector._entered)
+
+    def test_people_times(self):
+        '''The arrays backend reports many times at once.'''
+        self.emit('people.lift.on', self.lift, [1, 3])
+        self.emit('people.arrived', [7])
+        self.assertEqual(2, self.collector.wait.count)
+        self.assertEqual(2, self.collector.wait.mean)
+        self.assertEqual(7, self.collector.journey.mean)
+
+    def test_lift_starts_and_stops(self):
+        '''Floors travelled, starts and stops are counted per lift.'''
+        for message in ('lift.transit', 'lift.transit', 'lift.arrive',
+                        'lift.arrive'):
+            self.emit(message, self.lift, None)
+        expected = {'floors_travelled': 4, 'starts': 2, 'stops': 2}
+        self.assertEqual(expected, self.collector.report()['lifts']['main'])
+
+    def test_lift_transits(self):
+        '''Floors transited at once are all counted.'''
+        self.emit('lift.transit', self.lift, Floor(2), Floor(6))
+        expected = {'floors_travelled': 5, 'starts': 1, 'stops': 0}
+        self.assertEqual(expected, self.collector.report()['lifts']['main'])
@@ -0,0 +1,246 @@
+'''
+Test suite for the transports module.
+'''
+
+import os
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+from time import time
+from unittest import mock
+
+from lifts import transports
+from lifts.benchmark import ScriptedController
+from lifts.common import Command, reset
+from lifts.simulation import Simulation
+
+SIM_FILE = os.path.join(os.path.dirname(__file__), '..', 'lifts',
+                        'simulations', 'basic.toml')
+# A client on its standard streams, that never moves the lifts
+IDLE_CLIENT = '''
+import sys
+for line in sys.stdin:
+    if line.startswith(('WORLD', 'READY')):
+        print('READY', flush=True)
+'''
+
+
+# The same, in framed mode
+FRAMED_CLIENT = '''
+import sys
+print('READY FRAMED', flush=True)
+frames = 0
+while True:
+    header = sys.stdin.buffer.readline()
+    if not header.startswith(b'FRAME '):
+        continue
+    payload = sys.stdin.buffer.read(int(header.split()[1]))
+    frames += 1
+    if payload.endswith(b'READY\\n'):
+        sys.stdout.write('FRAME 6\\nREADY\\n')
+        sys.stdout.flush()
+    else:
+        break
+sys.exit(0 if payload.startswith(b'END\\nSTATS ') else 1)
+'''
+
+
+class TestCase(unittest.TestCase):
+
+    '''Base TestCase class for transport tests.'''
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.interface.close()
+        self.directory.cleanup()
+        reset()
+
+
+class TestFifoInterface(TestCase):
+
+    '''Tests for the FifoInterface class.'''
+
+    def setUp(self):
+        super().setUp()
+        self.interface = transports.FifoInterface(self.directory.name)
+        self.client_out = open(self.interface.in_name, 'w')
+
+    def tearDown(self):
+        self.client_out.close()
+        super().tearDown()
+
+    def test_read(self):
+        '''Lines are read one at a time, None when there are none.'''
+        self.client_out.write('READY\nGOTO main 3\nCLOSE')
+        self.client_out.flush()
+        self.assertEqual('READY', self.interface.read())
+        self.assertEqual('GOTO main 3', self.interface.read())
+        self.assertIsNone(self.interface.read())  # Incomplete line
+        self.client_out.write(' main\n')
+        self.client_out.flush()
+        self.assertEqual('CLOSE main', self.interface.read())
+
+    def test_write(self):
+        '''Lines are written to the client pipe, once it is open.'''
+        lines = []
+
+        def client():
+            with open(self.interface.out_name) as file_:
+                lines.append(file_.readline())
+        thread = threading.Thread(target=client)
+        thread.start()
+        self.interface.write('TURN 1')
+        thread.join()
+        self.assertEqual(['TURN 1\n'], lines)
+
+    def test_write_not_connected(self):
+        '''Writing fails if the client never opens its pipe.'''
+        with mock.patch.object(transports, 'CLIENT_CONNECT_TIMEOUT', 0.05):
+            with self.assertRaises(ConnectionError):
+                self.interface.write('TURN 1')
+
+    def test_wait_wakes_up(self):
+        '''Waiting returns as soon as a line comes in.'''
+        timer = threading.Timer(0.05, lambda: (
+            self.client_out.write('READY\n'), self.client_out.flush()))
+        timer.start()
+        start = time()
+        commands = self.interface.get_turn_commands(5)
+        self.assertLess(time() - start, 1)
+        self.assertEqual([], commands)
+        timer.join()
+
+    def test_wait_times_out(self):
+        '''Waiting without any line lasts the whole timeout.'''
+        start = time()
+        self.interface.wait(0.05)
+        self.assertGreaterEqual(time() - start, 0.04)
+
+
+class TestSocketInterface(TestCase):
+
+    '''Tests for the SocketInterface class.'''
+
+    def setUp(self):
+        super().setUp()
+        self.interface = transports.SocketInterface(self.directory.name)
+        self.client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    def tearDown(self):
+        self.client.close()
+        super().tearDown()
+
+    def test_not_connected(self):
+        '''Nothing is read before the client connects.'''
+        self.assertIsNone(self.interface.read())
+
+    def test_round_trip(self):
+        '''Lines go both ways over the socket.'''
+        self.client.connect(self.interface.sock_name)
+        self.interface.write('TURN 1')
+        self.assertEqual(b'TURN 1\n', self.client.recv(100))
+        self.client.sendall(b'READY\n')
+        self.interface.wait(1)
+        self.assertEqual('READY', self.interface.read())
+
+
+class TestProcessInterface(TestCase):
+
+    '''Tests for the ProcessInterface class.'''
+
+    def setUp(self):
+        super().setUp()
+        client = os.path.join(self.directory.name, 'client.py')
+        with open(client, 'w') as file_:
+            file_.write(IDLE_CLIENT)
+        self.command = [sys.executable, client]
+        self.interface = transports.ProcessInterface(self.directory.name,
+                                                     self.command)
+
+    def test_round_trip(self):
+        '''The client answers on its standard output.'''
+        self.interface.write('READY')
+        deadline = time() + 5
+        while time() < deadline:
+            self.interface.wait(1)
+            line = self.interface.read()
+            if line is not None:
+                break
+        self.assertEqual('READY', line)
+
+    def test_run(self):
+        '''A whole simulation runs with a client on the standard streams.'''
+        self.interface.close()
+        sim = Simulation(SIM_FILE, self.directory.name, fast_forward=True,
+                         interface_class=lambda directory: transports.
+                         ProcessInterface(directory, self.command))
+        self.interface = sim.interface
+        sim.run()
+        self.assertTrue(sim.overdue)
+        self.interface.close()
+        self.assertEqual(0, self.interface.process.returncode)
+
+
+    def test_run_framed(self):
+        '''A client can have turns framed, and send command blocks.'''
+        self.interface.close()
+        with open(self.command[1], 'w') as file_:
+            file_.write(FRAMED_CLIENT)
+        sim = Simulation(SIM_FILE, self.directory.name, fast_forward=True,
+                         interface_class=lambda directory: transports.
+                         ProcessInterface(directory, self.command))
+        self.interface = sim.interface
+        sim.run()
+        self.assertTrue(self.interface.framed)
+        self.interface.close()
+        self.assertEqual(0, self.interface.process.returncode)
+
+
+class TestStreamInterface(unittest.TestCase):
+
+    '''Tests for the protocol over a stream.'''
+
+    def test_parsing(self):
+        '''Lines received over a stream are parsed as usual.'''
+        class Stream(transports.StreamInterface):
+            def fileno(self):
+                return None
+
+            def receive(self):
+                return self.data.pop(0) if self.data else None
+        stream = Stream()
+        stream.data = [b'REA', b'DY\n']
+        self.assertEqual([[Command.ready]], list(stream.get_commands()))
+        reset()
+
+    def test_blocks(self):
+        '''Command blocks are read once completely received.'''
+        class Stream(transports.StreamInterface):
+            def fileno(self):
+                return None
+
+            def receive(self):
+                return self.data.pop(0) if self.data else None
+        stream = Stream()
+        stream.data = [b'FRAME 12\nREA', None, b'DY\nREADY\nREADY\n']
+        self.assertIsNone(stream.read())
+        lines = [stream.read() for _ in range(4)]
+        self.assertEqual([('READY', [Command.ready])] * 2 + ['READY', None],
+                         lines)
+        reset()
+
+
+class TestFileInterfaceParity(unittest.TestCase):
+
+    '''Tests that in-process interfaces still wait as files do.'''
+
+    def test_wait_is_bounded(self):
+        '''File interfaces poll, rather than sleeping for the timeout.'''
+        start = time()
+        ScriptedController().wait(5)
+        self.assertLess(time() - start, 1)
+        reset()
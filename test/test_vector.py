@@ -0,0 +1,77 @@
+'''
+Test suite for the vector module.
+'''
+
+import os
+import unittest
+
+import numpy as np
+
+from lifts import vector
+from lifts.common import reset
+
+SIM_FILE = os.path.join(os.path.dirname(__file__), '..', 'lifts',
+                        'simulations', 'basic.toml')
+
+
+class TestVectorEnvironment(unittest.TestCase):
+
+    '''Tests for stepping many episodes at once.'''
+
+    def setUp(self):
+        self.env = vector.VectorEnvironment(SIM_FILE, 3, use_cache=False)
+        self.idle = np.zeros((3, 1), dtype=np.int32)
+
+    def tearDown(self):
+        reset()
+
+    def test_reset(self):
+        '''Observations have the episodes along the first axis.'''
+        observation = self.env.reset()
+        self.assertEqual((3, 1), observation['location'].shape)
+        self.assertEqual((3, len(self.env.levels), 2),
+                         observation['calls'].shape)
+        self.assertEqual((3, len(self.env.levels)),
+                         observation['queues'].shape)
+        self.assertTrue((observation['turn'] == 1).all())
+
+    def test_actions(self):
+        '''Actions are translated to commands for each lift.'''
+        self.env.reset()
+        actions = np.array([[vector.GOTO + 3], [vector.OPEN_UP],
+                            [vector.NOOP]])
+        observation, *_ = self.env.step(actions)
+        # Open doors promise a direction
+        self.assertEqual([1, 1, 0], observation['direction'][:, 0].tolist())
+        self.assertEqual([False, True, False],
+                         observation['open_doors'][:, 0].tolist())
+
+    def test_invalid_actions(self):
+        '''Actions of the wrong shape or out of range are refused.'''
+        self.env.reset()
+        with self.assertRaises(ValueError):
+            self.env.step(np.zeros((2, 1), dtype=np.int32))
+        with self.assertRaises(ValueError):
+            self.env.step(np.full((3, 1), self.env.action_count))
+
+    def test_auto_reset(self):
+        '''Finished episodes start again, and report their statistics.'''
+        self.env.reset()
+        finished = []
+        while not finished:
+            observation, rewards, terminated, truncated, infos = \
+                self.env.step(self.idle)
+            finished = np.flatnonzero(terminated | truncated).tolist()
+        for index in finished:
+            self.assertIn('stats', infos[index])
+            self.assertEqual(1, observation['turn'][index])
+
+    def test_seeds(self):
+        '''Episodes with the same seed play the same.'''
+        self.env.reset(seed=5)
+        other = vector.VectorEnvironment(SIM_FILE, 1, use_cache=False)
+        other.reset(seed=5)
+        for _ in range(50):
+            _, rewards, *_ = self.env.step(self.idle)
+            _, other_rewards, *_ = other.step(self.idle[:1])
+            self.assertEqual(rewards[0], other_rewards[0])